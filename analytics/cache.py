@@ -0,0 +1,223 @@
+import functools
+import inspect
+import logging
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from collections import Counter, OrderedDict
+from datetime import date, datetime
+
+class MemoryBackend:
+    """Cache LRU in-process con TTL, condivisa tra i thread di un worker"""
+    name = 'memory'
+
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._version = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return False, None
+            value, expires_at = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return False, None
+            self._entries.move_to_end(key)
+            return True, value
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get_version(self):
+        return self._version
+
+    def bump_version(self):
+        with self._lock:
+            self._version += 1
+            self._entries.clear()
+
+    def size(self):
+        return len(self._entries)
+
+class SharedBackend:
+    """Cache su file SQLite locale, condivisa tra tutti i worker dello stesso host.
+
+    Anche la versione è salvata nel file, quindi una scrittura su un worker
+    invalida i risultati di tutti gli altri.
+    """
+    name = 'shared'
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        self._check_directory(os.path.dirname(os.path.abspath(path)))
+        with self._connection() as conn:
+            conn.execute('CREATE TABLE IF NOT EXISTS entries (key TEXT PRIMARY KEY, value BLOB, expires_at REAL)')
+            conn.execute('CREATE TABLE IF NOT EXISTS versions (name TEXT PRIMARY KEY, value INTEGER)')
+            conn.execute("INSERT OR IGNORE INTO versions (name, value) VALUES ('analytics', 0)")
+
+    @staticmethod
+    def _check_directory(directory):
+        """Crea la directory con permessi 0700 e rifiuta quelle scrivibili da altri utenti.
+
+        I valori sono letti con pickle.loads: chi può sostituire il file può
+        eseguire codice nell'applicazione.
+        """
+        os.makedirs(directory, mode=0o700, exist_ok=True)
+        info = os.stat(directory)
+        if info.st_uid != os.getuid() or info.st_mode & 0o022:
+            raise ValueError(
+                f'Directory della cache analytics non sicura: {directory} deve appartenere '
+                'all\'utente dell\'applicazione e non essere scrivibile da altri'
+            )
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            os.chmod(self.path, 0o600)
+            conn.execute('PRAGMA journal_mode=WAL')
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def get(self, key):
+        row = self._connection().execute(
+            'SELECT value FROM entries WHERE key = ? AND expires_at >= ?', (key, time.time())
+        ).fetchone()
+        if row is None:
+            return False, None
+        return True, pickle.loads(row[0])
+
+    def set(self, key, value, ttl):
+        conn = self._connection()
+        now = time.time()
+        conn.execute(
+            'INSERT OR REPLACE INTO entries (key, value, expires_at) VALUES (?, ?, ?)',
+            (key, pickle.dumps(value, pickle.HIGHEST_PROTOCOL), now + ttl)
+        )
+        conn.execute('DELETE FROM entries WHERE expires_at < ?', (now,))
+
+    def get_version(self):
+        return self._connection().execute("SELECT value FROM versions WHERE name = 'analytics'").fetchone()[0]
+
+    def bump_version(self):
+        conn = self._connection()
+        conn.execute("UPDATE versions SET value = value + 1 WHERE name = 'analytics'")
+        conn.execute('DELETE FROM entries')
+
+    def size(self):
+        return self._connection().execute('SELECT COUNT(*) FROM entries').fetchone()[0]
+
+def _normalize(value):
+    """Le date entrano nella chiave al giorno, la granularità usata dalle route"""
+    if isinstance(value, (datetime, date)):
+        return value.strftime('%Y-%m-%d')
+    return value
+
+class AnalyticsCache:
+    """Cache dei risultati di SalesAnalytics con invalidazione per versione.
+
+    La chiave è composta da metodo, versione corrente e argomenti
+    normalizzati; bump_version() rende irraggiungibili tutti i risultati
+    precedenti e va chiamata dalle route che modificano vendite, acquisti
+    e prodotti.
+    """
+
+    def __init__(self):
+        self.backend = None
+        self.logger = logging.getLogger(__name__)
+        self.default_ttl = 60
+        self.hits = Counter()
+        self.misses = Counter()
+        self._miss_hooks = []
+
+    def init_app(self, app):
+        backend = app.config.get('ANALYTICS_CACHE_BACKEND', 'memory')
+        self.default_ttl = app.config.get('ANALYTICS_CACHE_TTL', 60)
+        if backend == 'memory':
+            self.backend = MemoryBackend(app.config.get('ANALYTICS_CACHE_MAX_ENTRIES', 256))
+        elif backend == 'shared':
+            self.backend = SharedBackend(app.config['ANALYTICS_CACHE_PATH'])
+        elif backend == 'none':
+            self.backend = None
+        else:
+            raise ValueError(f'Backend cache analytics non valido: {backend}')
+        self.logger = app.logger
+        app.extensions['analytics_cache'] = self
+
+    def cached(self, ttl=None):
+        def decorator(func):
+            signature = inspect.signature(func)
+            name = func.__qualname__
+
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                if self.backend is None:
+                    self._run_miss_hooks()
+                    return func(*args, **kwargs)
+
+                bound = signature.bind(*args, **kwargs)
+                bound.apply_defaults()
+                params = ','.join(f'{k}={_normalize(v)!r}' for k, v in bound.arguments.items())
+                key = f'{name}:{self.backend.get_version()}:{params}'
+
+                found, value = self.backend.get(key)
+                if found:
+                    self.hits[name] += 1
+                    return value
+
+                self.misses[name] += 1
+                self._run_miss_hooks()
+                value = func(*args, **kwargs)
+                self.backend.set(key, value, ttl or self.default_ttl)
+                return value
+            return wrapper
+        return decorator
+
+    def on_miss(self, hook):
+        """Registra hook, chiamato prima di calcolare un risultato non in cache; può sollevare eccezioni"""
+        self._miss_hooks.append(hook)
+        return hook
+
+    def _run_miss_hooks(self):
+        for hook in self._miss_hooks:
+            hook()
+
+    def bump_version(self):
+        """Invalida i risultati in cache; va chiamata dopo il commit delle modifiche.
+
+        Un errore del backend (ad esempio il file SQLite bloccato) non deve
+        far fallire una scrittura già salvata: viene registrato e i risultati
+        vecchi scadono comunque dopo il TTL.
+        """
+        if self.backend is None:
+            return
+        try:
+            self.backend.bump_version()
+        except Exception as e:
+            self.logger.exception('Invalidazione della cache analytics non riuscita: %s', e)
+
+    def stats(self):
+        return {
+            'backend': self.backend.name if self.backend else None,
+            'entries': self.backend.size() if self.backend else 0,
+            'hits': sum(self.hits.values()),
+            'misses': sum(self.misses.values()),
+            'methods': {
+                name: {'hits': self.hits[name], 'misses': self.misses[name]}
+                for name in sorted(set(self.hits) | set(self.misses))
+            }
+        }
+
+analytics_cache = AnalyticsCache()
@@ -0,0 +1,123 @@
+from decimal import Decimal
+from sqlalchemy import text
+from sqlalchemy.dialects.postgresql import insert
+from extensions import db
+from models.sale import SaleStatus
+from models.sales_daily_item_agg import SalesDailyItemAgg, SaleStatusBucket, status_bucket
+
+MEASURES = ('quantity', 'revenue', 'order_count', 'line_count', 'unit_price_sum')
+
+def _accumulate(rows, day, status, lines, sign):
+    """Somma in rows il contributo di una vendita; lines è un iterabile di (item, quantity, unit_price, total_price)"""
+    bucket = status_bucket(status)
+    counted = set()
+    for item, quantity, unit_price, total_price in lines:
+        key = (day, item.company_id, item.id, bucket)
+        row = rows.get(key)
+        if row is None:
+            row = rows[key] = {
+                'day': day,
+                'company_id': item.company_id,
+                'item_id': item.id,
+                'status_bucket': bucket,
+                'quantity': 0,
+                'revenue': Decimal(0),
+                'order_count': 0,
+                'line_count': 0,
+                'unit_price_sum': Decimal(0)
+            }
+        if item.id not in counted:
+            counted.add(item.id)
+            row['order_count'] += sign
+        row['quantity'] += sign * quantity
+        row['revenue'] += sign * Decimal(str(total_price))
+        row['line_count'] += sign
+        row['unit_price_sum'] += sign * Decimal(str(unit_price))
+
+def _upsert(rows):
+    if not rows:
+        return
+
+    table = SalesDailyItemAgg.__table__
+    # Righe in ordine di chiave: transazioni concorrenti bloccano le stesse
+    # righe della rollup nello stesso ordine e non vanno in deadlock
+    stmt = insert(table).values([rows[key] for key in sorted(rows)])
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[table.c.day, table.c.company_id, table.c.item_id, table.c.status_bucket],
+        set_={measure: table.c[measure] + stmt.excluded[measure] for measure in MEASURES}
+    )
+    db.session.execute(stmt)
+
+def _lines(sale):
+    return [(si.item, si.quantity, si.unit_price, si.total_price) for si in sale.items]
+
+def apply_sale(sale, sign=1, status=None):
+    """Aggiunge (sign=1) o rimuove (sign=-1) il contributo di una vendita alla rollup.
+
+    Va chiamata nella stessa transazione che modifica la vendita, dopo il
+    flush (serve sale.date). status permette di usare lo stato precedente
+    quando la vendita cambia bucket.
+    """
+    rows = {}
+    _accumulate(rows, sale.date.date(), status or sale.status, _lines(sale), sign)
+    _upsert(rows)
+
+def apply_sales(sales):
+    """Aggiunge un lotto di nuove vendite con un solo statement; sales è un iterabile di (date, status, lines)"""
+    rows = {}
+    for date, status, lines in sales:
+        _accumulate(rows, date.date(), status, lines, 1)
+    _upsert(rows)
+
+def move_sale(sale, old_status, new_status):
+    """Sposta il contributo di una vendita quando il cambio di stato cambia bucket.
+
+    Vecchio e nuovo bucket sono aggiornati con un solo statement, quindi con
+    lo stesso ordine di lock delle altre scritture sulla rollup.
+    """
+    if status_bucket(old_status) != status_bucket(new_status):
+        rows = {}
+        _accumulate(rows, sale.date.date(), old_status, _lines(sale), -1)
+        _accumulate(rows, sale.date.date(), new_status, _lines(sale), 1)
+        _upsert(rows)
+
+def rebuild():
+    """Ricalcola da zero la rollup a partire da sales e sale_items.
+
+    Il lock esclusivo sulla tabella fa attendere le scritture concorrenti,
+    che applicano il loro delta dopo il commit della ricostruzione.
+    """
+    db.session.execute(text('LOCK TABLE sales_daily_item_agg IN EXCLUSIVE MODE'))
+    db.session.execute(text('DELETE FROM sales_daily_item_agg'))
+    result = db.session.execute(text("""
+        INSERT INTO sales_daily_item_agg (
+            day, company_id, item_id, status_bucket,
+            quantity, revenue, order_count, line_count, unit_price_sum
+        )
+        SELECT
+            CAST(s.date AS DATE) as day,
+            i.company_id,
+            si.item_id,
+            CASE
+                WHEN s.status = :status_cancelled THEN :cancelled
+                WHEN s.status = :status_pending THEN :pending
+                ELSE :confirmed
+            END as status_bucket,
+            SUM(si.quantity),
+            SUM(si.total_price),
+            COUNT(DISTINCT s.id),
+            COUNT(*),
+            SUM(si.unit_price)
+        FROM sales s
+        JOIN sale_items si ON s.id = si.sale_id
+        JOIN items i ON si.item_id = i.id
+        GROUP BY 1, 2, 3, 4
+    """), {
+        'status_cancelled': SaleStatus.CANCELLED,
+        'status_pending': SaleStatus.PENDING,
+        'cancelled': SaleStatusBucket.CANCELLED,
+        'pending': SaleStatusBucket.PENDING,
+        'confirmed': SaleStatusBucket.CONFIRMED
+    })
+    db.session.commit()
+    return result.rowcount
@@ -1,18 +1,41 @@
 import pandas as pd
+from collections import defaultdict
 from datetime import datetime, timedelta
+from flask import current_app
 from sqlalchemy import text
 from extensions import db
+from analytics.cache import analytics_cache
+from utils.metrics import stage, track_stages
 from models.sale import Sale, SaleItem
 from models.purchase import Purchase, PurchaseItem
 from models.company import Company
 from models.item import Item
 
+# Periodo usato quando la richiesta non indica start_date
+RECENT_PERIOD_DAYS = 30
+TREND_PERIOD_DAYS = 365
+
 class SalesAnalytics:
     @staticmethod
+    def _frame(query, params=None):
+        """Esegue la query e ne carica le righe in un DataFrame, misurando le due fasi"""
+        with stage('query'):
+            rows = db.session.execute(query, params).fetchall()
+        with stage('dataframe'):
+            return pd.DataFrame(rows)
+
+    @staticmethod
+    def _use_rollup():
+        """Indica se leggere le aggregazioni da sales_daily_item_agg invece delle righe di vendita"""
+        return current_app.config.get('ANALYTICS_USE_ROLLUP', False)
+
+    @staticmethod
+    @analytics_cache.cached()
+    @track_stages
     def get_sales_by_company(start_date=None, end_date=None):
         """Analisi delle vendite per fornitore"""
         if not start_date:
-            start_date = datetime.now() - timedelta(days=30)
+            start_date = datetime.now() - timedelta(days=RECENT_PERIOD_DAYS)
         if not end_date:
             end_date = datetime.now()
 
@@ -36,55 +59,112 @@ class SalesAnalytics:
             AND s.status != 'cancelled'
         """)
 
-        result = db.session.execute(query, {
+        df = SalesAnalytics._frame(query, {
             'start_date': start_date,
             'end_date': end_date
         })
-
-        df = pd.DataFrame(result.fetchall())
         if df.empty:
             return {
                 'message': 'Nessun dato disponibile per il periodo selezionato',
                 'data': {}
             }
 
-        company_analysis = {}
-        for company_id in df['company_id'].unique():
-            company_df = df[df['company_id'] == company_id]
-            company_name = company_df['company_name'].iloc[0]
-
-            analysis = {
-                'company_name': company_name,
-                'total_sales': float(company_df['total_price'].sum()),
-                'total_items_sold': int(company_df['quantity'].sum()),
-                'average_order_value': float(company_df['total_price'].mean()),
-                'items_analysis': [],
-                'daily_sales': SalesAnalytics._get_daily_sales(company_df),
-                'top_selling_items': SalesAnalytics._get_top_selling_items(company_df)
-            }
-
-            for item_id in company_df['item_id'].unique():
-                item_df = company_df[company_df['item_id'] == item_id]
-                item_analysis = {
-                    'item_name': item_df['item_name'].iloc[0],
-                    'sku': item_df['sku'].iloc[0],
-                    'total_quantity': int(item_df['quantity'].sum()),
-                    'total_revenue': float(item_df['total_price'].sum()),
-                    'average_price': float(item_df['unit_price'].mean())
-                }
-                analysis['items_analysis'].append(item_analysis)
-
-            company_analysis[int(company_id)] = analysis
-
         return {
             'period': {
                 'start_date': start_date.strftime('%Y-%m-%d'),
                 'end_date': end_date.strftime('%Y-%m-%d')
             },
-            'data': company_analysis
+            'data': SalesAnalytics._build_sales_by_company(df)
+        }
+
+    @staticmethod
+    def _build_sales_by_company(df):
+        """Aggrega le righe di vendita per azienda con un solo passaggio di groupby.
+
+        Le aziende e gli item mantengono l'ordine di prima apparizione nelle
+        righe, i top item sono ordinati per quantità con parità risolte per
+        (item_id, item_name, sku).
+        """
+        df = df.astype({'unit_price': float, 'total_price': float})
+
+        companies = df.groupby('company_id', sort=False).agg(
+            company_name=('company_name', 'first'),
+            total_sales=('total_price', 'sum'),
+            total_items_sold=('quantity', 'sum'),
+            average_order_value=('total_price', 'mean')
+        )
+
+        items = df.groupby(['company_id', 'item_id'], sort=False).agg(
+            item_name=('item_name', 'first'),
+            sku=('sku', 'first'),
+            total_quantity=('quantity', 'sum'),
+            total_revenue=('total_price', 'sum'),
+            average_price=('unit_price', 'mean')
+        ).reset_index()
+
+        daily = df.groupby(['company_id', 'sale_date']).agg(
+            revenue=('total_price', 'sum'),
+            quantity=('quantity', 'sum')
+        ).reset_index()
+
+        top = df.groupby(['company_id', 'item_id', 'item_name', 'sku']).agg(
+            quantity=('quantity', 'sum'),
+            revenue=('total_price', 'sum')
+        ).reset_index()
+        top = top.sort_values('quantity', ascending=False, kind='stable').groupby('company_id', sort=False).head(5)
+
+        # tolist() converte in blocco ai tipi Python, evitando int()/float() per riga
+        items_analysis = defaultdict(list)
+        for company_id, item_name, sku, total_quantity, total_revenue, average_price in zip(
+                items['company_id'].tolist(), items['item_name'].tolist(), items['sku'].tolist(),
+                items['total_quantity'].tolist(), items['total_revenue'].tolist(), items['average_price'].tolist()):
+            items_analysis[company_id].append({
+                'item_name': item_name,
+                'sku': sku,
+                'total_quantity': total_quantity,
+                'total_revenue': total_revenue,
+                'average_price': average_price
+            })
+
+        daily_sales = defaultdict(list)
+        for company_id, date, revenue, quantity in zip(
+                daily['company_id'].tolist(), daily['sale_date'].dt.strftime('%Y-%m-%d').tolist(),
+                daily['revenue'].tolist(), daily['quantity'].tolist()):
+            daily_sales[company_id].append({
+                'date': date,
+                'revenue': revenue,
+                'quantity': quantity
+            })
+
+        top_selling_items = defaultdict(list)
+        for company_id, item_name, sku, quantity, revenue in zip(
+                top['company_id'].tolist(), top['item_name'].tolist(), top['sku'].tolist(),
+                top['quantity'].tolist(), top['revenue'].tolist()):
+            top_selling_items[company_id].append({
+                'item_name': item_name,
+                'sku': sku,
+                'quantity': quantity,
+                'revenue': revenue
+            })
+
+        return {
+            company_id: {
+                'company_name': company_name,
+                'total_sales': total_sales,
+                'total_items_sold': total_items_sold,
+                'average_order_value': average_order_value,
+                'items_analysis': items_analysis[company_id],
+                'daily_sales': daily_sales[company_id],
+                'top_selling_items': top_selling_items[company_id]
+            }
+            for company_id, company_name, total_sales, total_items_sold, average_order_value in zip(
+                companies.index.tolist(), companies['company_name'].tolist(), companies['total_sales'].tolist(),
+                companies['total_items_sold'].tolist(), companies['average_order_value'].tolist())
         }
 
     @staticmethod
+    @analytics_cache.cached()
+    @track_stages
     def get_inventory_analysis():
         """Analisi dell'inventario per fornitore"""
         query = text("""
@@ -102,8 +182,7 @@ class SalesAnalytics:
             JOIN companies c ON i.company_id = c.id
         """)
 
-        result = db.session.execute(query)
-        df = pd.DataFrame(result.fetchall())
+        df = SalesAnalytics._frame(query)
         if df.empty:
             return {
                 'message': 'Nessun dato inventario disponibile',
@@ -147,94 +226,95 @@ class SalesAnalytics:
         return {'data': inventory_analysis}
 
     @staticmethod
+    @analytics_cache.cached()
+    @track_stages
     def get_profit_analysis(start_date=None, end_date=None):
         """Analisi dei profitti per fornitore"""
         if not start_date:
-            start_date = datetime.now() - timedelta(days=30)
+            start_date = datetime.now() - timedelta(days=RECENT_PERIOD_DAYS)
         if not end_date:
             end_date = datetime.now()
 
-        sales_query = text("""
+        query = text("""
+            WITH sold AS (
+                SELECT 
+                    si.item_id,
+                    SUM(si.quantity) as sold_quantity,
+                    SUM(si.total_price) as revenue
+                FROM sales s
+                JOIN sale_items si ON s.id = si.sale_id
+                WHERE s.date BETWEEN :start_date AND :end_date
+                AND s.status != 'cancelled'
+                GROUP BY si.item_id
+            ),
+            purchased AS (
+                SELECT 
+                    pi.item_id,
+                    SUM(pi.quantity) as purchased_quantity,
+                    SUM(pi.total_price) as cost
+                FROM purchases p
+                JOIN purchase_items pi ON p.id = pi.purchase_id
+                WHERE p.date BETWEEN :start_date AND :end_date
+                AND p.status != 'cancelled'
+                GROUP BY pi.item_id
+            )
             SELECT 
                 c.id as company_id,
                 c.name as company_name,
                 i.id as item_id,
                 i.name as item_name,
-                si.quantity as sold_quantity,
-                si.unit_price as selling_price,
-                si.total_price as revenue,
-                s.date
-            FROM sales s
-            JOIN sale_items si ON s.id = si.sale_id
-            JOIN items i ON si.item_id = i.id
+                sold.item_id IS NOT NULL as has_sales,
+                COALESCE(sold.sold_quantity, 0) as sold_quantity,
+                COALESCE(sold.revenue, 0) as revenue,
+                COALESCE(purchased.purchased_quantity, 0) as purchased_quantity,
+                COALESCE(purchased.cost, 0) as cost
+            FROM items i
             JOIN companies c ON i.company_id = c.id
-            WHERE s.date BETWEEN :start_date AND :end_date
-            AND s.status != 'cancelled'
+            LEFT JOIN sold ON sold.item_id = i.id
+            LEFT JOIN purchased ON purchased.item_id = i.id
+            WHERE sold.item_id IS NOT NULL OR purchased.item_id IS NOT NULL
+            ORDER BY c.id, i.id
         """)
 
-        purchases_query = text("""
-            SELECT 
-                c.id as company_id,
-                c.name as company_name,
-                i.id as item_id,
-                i.name as item_name,
-                pi.quantity as purchased_quantity,
-                pi.unit_price as purchase_price,
-                pi.total_price as cost,
-                p.date
-            FROM purchases p
-            JOIN purchase_items pi ON p.id = pi.purchase_id
-            JOIN items i ON pi.item_id = i.id
-            JOIN companies c ON i.company_id = c.id
-            WHERE p.date BETWEEN :start_date AND :end_date
-            AND p.status != 'cancelled'
-        """)
+        with stage('query'):
+            rows = db.session.execute(query, {
+                'start_date': start_date,
+                'end_date': end_date
+            }).fetchall()
 
-        sales_df = pd.DataFrame(db.session.execute(sales_query, {
-            'start_date': start_date,
-            'end_date': end_date
-        }).fetchall())
+        # Una riga per (azienda, item): il costo dell'azienda include anche gli
+        # item acquistati e non venduti, l'analisi per item solo quelli venduti
+        profit_analysis = {}
+        company_costs = {}
+        for row in rows:
+            company_costs[row.company_id] = company_costs.get(row.company_id, 0) + float(row.cost)
+            if not row.has_sales:
+                continue
+
+            analysis = profit_analysis.setdefault(row.company_id, {
+                'company_name': row.company_name,
+                'total_revenue': 0,
+                'total_cost': 0,
+                'items_analysis': []
+            })
+
+            item_analysis = {
+                'item_name': row.item_name,
+                'revenue': float(row.revenue),
+                'cost': float(row.cost),
+                'sold_quantity': int(row.sold_quantity),
+                'purchased_quantity': int(row.purchased_quantity)
+            }
+            item_analysis['profit'] = item_analysis['revenue'] - item_analysis['cost']
+            item_analysis['profit_margin'] = (item_analysis['profit'] / item_analysis['revenue'] * 100) if item_analysis['revenue'] > 0 else 0
 
-        purchases_df = pd.DataFrame(db.session.execute(purchases_query, {
-            'start_date': start_date,
-            'end_date': end_date
-        }).fetchall())
+            analysis['total_revenue'] += item_analysis['revenue']
+            analysis['items_analysis'].append(item_analysis)
 
-        profit_analysis = {}
-        
-        if not sales_df.empty:
-            for company_id in sales_df['company_id'].unique():
-                company_sales = sales_df[sales_df['company_id'] == company_id]
-                company_purchases = purchases_df[purchases_df['company_id'] == company_id] if not purchases_df.empty else pd.DataFrame()
-                
-                analysis = {
-                    'company_name': company_sales['company_name'].iloc[0],
-                    'total_revenue': float(company_sales['revenue'].sum()),
-                    'total_cost': float(company_purchases['cost'].sum()) if not company_purchases.empty else 0,
-                    'items_analysis': []
-                }
-                
-                analysis['gross_profit'] = analysis['total_revenue'] - analysis['total_cost']
-                analysis['profit_margin'] = (analysis['gross_profit'] / analysis['total_revenue'] * 100) if analysis['total_revenue'] > 0 else 0
-                
-                for item_id in company_sales['item_id'].unique():
-                    item_sales = company_sales[company_sales['item_id'] == item_id]
-                    item_purchases = company_purchases[company_purchases['item_id'] == item_id] if not company_purchases.empty else pd.DataFrame()
-                    
-                    item_analysis = {
-                        'item_name': item_sales['item_name'].iloc[0],
-                        'revenue': float(item_sales['revenue'].sum()),
-                        'cost': float(item_purchases['cost'].sum()) if not item_purchases.empty else 0,
-                        'sold_quantity': int(item_sales['sold_quantity'].sum()),
-                        'purchased_quantity': int(item_purchases['purchased_quantity'].sum()) if not item_purchases.empty else 0
-                    }
-                    
-                    item_analysis['profit'] = item_analysis['revenue'] - item_analysis['cost']
-                    item_analysis['profit_margin'] = (item_analysis['profit'] / item_analysis['revenue'] * 100) if item_analysis['revenue'] > 0 else 0
-                    
-                    analysis['items_analysis'].append(item_analysis)
-                
-                profit_analysis[company_id] = analysis
+        for company_id, analysis in profit_analysis.items():
+            analysis['total_cost'] = company_costs[company_id]
+            analysis['gross_profit'] = analysis['total_revenue'] - analysis['total_cost']
+            analysis['profit_margin'] = (analysis['gross_profit'] / analysis['total_revenue'] * 100) if analysis['total_revenue'] > 0 else 0
 
         return {
             'period': {
@@ -245,64 +325,70 @@ class SalesAnalytics:
         }
 
     @staticmethod
-    def _get_daily_sales(df):
-        """Calcola le vendite giornaliere"""
-        daily_sales = df.groupby('sale_date').agg({
-            'total_price': 'sum',
-            'quantity': 'sum'
-        }).reset_index()
-        
-        return [{
-            'date': date.strftime('%Y-%m-%d'),
-            'revenue': float(revenue),
-            'quantity': int(quantity)
-        } for date, revenue, quantity in daily_sales.values]
-
-    @staticmethod
-    def _get_top_selling_items(df, limit=5):
-        """Ottiene i prodotti più venduti"""
-        top_items = df.groupby(['item_id', 'item_name', 'sku']).agg({
-            'quantity': 'sum',
-            'total_price': 'sum'
-        }).reset_index().nlargest(limit, 'quantity')
-        
-        return [{
-            'item_name': row['item_name'],
-            'sku': row['sku'],
-            'quantity': int(row['quantity']),
-            'revenue': float(row['total_price'])
-        } for _, row in top_items.iterrows()] 
-
-    @staticmethod
+    @analytics_cache.cached()
+    @track_stages
     def get_sales_trend(start_date=None, end_date=None):
         """Analisi dell'andamento delle vendite nel tempo"""
         if not start_date:
-            start_date = datetime.now() - timedelta(days=365)   
+            start_date = datetime.now() - timedelta(days=TREND_PERIOD_DAYS)
         if not end_date:
             end_date = datetime.now()
 
-        query = text("""
-            SELECT 
-                DATE_TRUNC('month', s.date) as month,
-                COUNT(DISTINCT s.id) as total_orders,
-                SUM(s.total_amount) as total_revenue,
-                COUNT(DISTINCT s.customer_name) as unique_customers,
-                AVG(s.total_amount) as average_order_value,
-                SUM(si.quantity) as total_items_sold
-            FROM sales s
-            JOIN sale_items si ON s.id = si.sale_id
-            WHERE s.date BETWEEN :start_date AND :end_date
-            AND s.status != 'cancelled'
-            GROUP BY DATE_TRUNC('month', s.date)
-            ORDER BY month ASC
-        """)
-
-        result = db.session.execute(query, {
-            'start_date': start_date,
-            'end_date': end_date
-        })
+        if SalesAnalytics._use_rollup():
+            # Ordini e clienti dalla sola tabella sales, quantità e ricavi dalla
+            # rollup; entrambi sui giorni interi compresi nel periodo
+            query = text("""
+                WITH orders AS (
+                    SELECT 
+                        DATE_TRUNC('month', s.date) as month,
+                        COUNT(*) as total_orders,
+                        COUNT(DISTINCT s.customer_name) as unique_customers,
+                        AVG(s.total_amount) as average_order_value
+                    FROM sales s
+                    WHERE s.date >= :start_day AND s.date < :end_day_next
+                    AND s.status != 'cancelled'
+                    GROUP BY DATE_TRUNC('month', s.date)
+                ),
+                lines AS (
+                    SELECT 
+                        DATE_TRUNC('month', CAST(a.day AS TIMESTAMP)) as month,
+                        SUM(a.revenue) as total_revenue,
+                        SUM(a.quantity) as total_items_sold
+                    FROM sales_daily_item_agg a
+                    WHERE a.day >= :start_day AND a.day < :end_day_next
+                    AND a.status_bucket != 'cancelled'
+                    GROUP BY DATE_TRUNC('month', CAST(a.day AS TIMESTAMP))
+                    HAVING SUM(a.line_count) > 0
+                )
+                SELECT 
+                    lines.month,
+                    COALESCE(orders.total_orders, 0) as total_orders,
+                    lines.total_revenue,
+                    COALESCE(orders.unique_customers, 0) as unique_customers,
+                    COALESCE(orders.average_order_value, 0) as average_order_value,
+                    lines.total_items_sold
+                FROM lines
+                LEFT JOIN orders ON orders.month = lines.month
+                ORDER BY lines.month ASC
+            """)
+        else:
+            query = text("""
+                SELECT 
+                    DATE_TRUNC('month', s.date) as month,
+                    COUNT(DISTINCT s.id) as total_orders,
+                    SUM(s.total_amount) as total_revenue,
+                    COUNT(DISTINCT s.customer_name) as unique_customers,
+                    AVG(s.total_amount) as average_order_value,
+                    SUM(si.quantity) as total_items_sold
+                FROM sales s
+                JOIN sale_items si ON s.id = si.sale_id
+                WHERE s.date BETWEEN :start_date AND :end_date
+                AND s.status != 'cancelled'
+                GROUP BY DATE_TRUNC('month', s.date)
+                ORDER BY month ASC
+            """)
 
-        df = pd.DataFrame(result.fetchall())
+        df = SalesAnalytics._frame(query, SalesAnalytics._period_params(start_date, end_date))
         if df.empty:
             return {
                 'message': 'Nessun dato disponibile per il periodo selezionato',
@@ -347,43 +433,66 @@ class SalesAnalytics:
         } 
 
     @staticmethod
+    @analytics_cache.cached()
+    @track_stages
     def get_top_items_analysis(start_date=None, end_date=None, limit=10):
         """Analisi degli item più venduti"""
         if not start_date:
-            start_date = datetime.now() - timedelta(days=365) 
+            start_date = datetime.now() - timedelta(days=TREND_PERIOD_DAYS)
         if not end_date:
             end_date = datetime.now()
 
-        query = text("""
-            SELECT 
-                i.id as item_id,
-                i.name as item_name,
-                i.sku,
-                c.id as company_id,
-                c.name as company_name,
-                SUM(si.quantity) as total_quantity,
-                SUM(si.total_price) as total_revenue,
-                COUNT(DISTINCT s.id) as orders_count,
-                AVG(si.unit_price) as average_price,
-                i.stock as current_stock
-            FROM items i
-            JOIN sale_items si ON i.id = si.item_id
-            JOIN sales s ON si.sale_id = s.id
-            JOIN companies c ON i.company_id = c.id
-            WHERE s.date BETWEEN :start_date AND :end_date
-            AND s.status != 'cancelled'
-            GROUP BY i.id, i.name, i.sku, c.id, c.name, i.stock
-            ORDER BY total_quantity DESC
-            LIMIT :limit
-        """)
+        if SalesAnalytics._use_rollup():
+            query = text("""
+                SELECT 
+                    i.id as item_id,
+                    i.name as item_name,
+                    i.sku,
+                    c.id as company_id,
+                    c.name as company_name,
+                    SUM(a.quantity) as total_quantity,
+                    SUM(a.revenue) as total_revenue,
+                    SUM(a.order_count) as orders_count,
+                    SUM(a.unit_price_sum) / SUM(a.line_count) as average_price,
+                    i.stock as current_stock
+                FROM sales_daily_item_agg a
+                JOIN items i ON a.item_id = i.id
+                JOIN companies c ON i.company_id = c.id
+                WHERE a.day >= :start_day AND a.day < :end_day_next
+                AND a.status_bucket != 'cancelled'
+                GROUP BY i.id, i.name, i.sku, c.id, c.name, i.stock
+                HAVING SUM(a.line_count) > 0
+                ORDER BY total_quantity DESC
+                LIMIT :limit
+            """)
+        else:
+            query = text("""
+                SELECT 
+                    i.id as item_id,
+                    i.name as item_name,
+                    i.sku,
+                    c.id as company_id,
+                    c.name as company_name,
+                    SUM(si.quantity) as total_quantity,
+                    SUM(si.total_price) as total_revenue,
+                    COUNT(DISTINCT s.id) as orders_count,
+                    AVG(si.unit_price) as average_price,
+                    i.stock as current_stock
+                FROM items i
+                JOIN sale_items si ON i.id = si.item_id
+                JOIN sales s ON si.sale_id = s.id
+                JOIN companies c ON i.company_id = c.id
+                WHERE s.date BETWEEN :start_date AND :end_date
+                AND s.status != 'cancelled'
+                GROUP BY i.id, i.name, i.sku, c.id, c.name, i.stock
+                ORDER BY total_quantity DESC
+                LIMIT :limit
+            """)
 
-        result = db.session.execute(query, {
-            'start_date': start_date,
-            'end_date': end_date,
+        df = SalesAnalytics._frame(query, {
+            **SalesAnalytics._period_params(start_date, end_date),
             'limit': limit
         })
-
-        df = pd.DataFrame(result.fetchall())
         if df.empty:
             return {
                 'message': 'Nessun dato disponibile per il periodo selezionato',
@@ -430,6 +539,8 @@ class SalesAnalytics:
         } 
 
     @staticmethod
+    @analytics_cache.cached()
+    @track_stages
     def get_dashboard_metrics():
         """Ottiene le metriche principali per la dashboard"""
         current_month = datetime.now().replace(day=1)
@@ -462,11 +573,9 @@ class SalesAnalytics:
             LIMIT 2
         """)
 
-        result = db.session.execute(query, {
+        df = SalesAnalytics._frame(query, {
             'last_month': last_month
         })
-
-        df = pd.DataFrame(result.fetchall())
         if df.empty:
             return {
                 'average_sales': {
@@ -518,6 +627,8 @@ class SalesAnalytics:
         }
 
     @staticmethod
+    @analytics_cache.cached()
+    @track_stages
     def get_hourly_profit_sales():
         """Ottiene l'andamento orario di profitti e vendite"""
         query = text("""
@@ -548,8 +659,7 @@ class SalesAnalytics:
             FROM hourly_sales
         """)
 
-        result = db.session.execute(query)
-        df = pd.DataFrame(result.fetchall())
+        df = SalesAnalytics._frame(query)
         if df.empty:
             return {
                 'hours': [],
@@ -564,24 +674,38 @@ class SalesAnalytics:
         }
 
     @staticmethod
+    @analytics_cache.cached()
+    @track_stages
     def get_sales_by_brand():
         """Ottiene le vendite totali per brand/company"""
-        query = text("""
-            SELECT 
-                c.name as brand,
-                COUNT(DISTINCT s.id) as total_orders,
-                SUM(si.total_price) as total_sales
-            FROM sales s
-            JOIN sale_items si ON s.id = si.sale_id
-            JOIN items i ON si.item_id = i.id
-            JOIN companies c ON i.company_id = c.id
-            WHERE s.status != 'cancelled'
-            GROUP BY c.id, c.name
-            ORDER BY total_sales DESC
-        """)
+        if SalesAnalytics._use_rollup():
+            query = text("""
+                SELECT 
+                    c.name as brand,
+                    SUM(a.revenue) as total_sales
+                FROM sales_daily_item_agg a
+                JOIN companies c ON a.company_id = c.id
+                WHERE a.status_bucket != 'cancelled'
+                GROUP BY c.id, c.name
+                HAVING SUM(a.line_count) > 0
+                ORDER BY total_sales DESC
+            """)
+        else:
+            query = text("""
+                SELECT 
+                    c.name as brand,
+                    COUNT(DISTINCT s.id) as total_orders,
+                    SUM(si.total_price) as total_sales
+                FROM sales s
+                JOIN sale_items si ON s.id = si.sale_id
+                JOIN items i ON si.item_id = i.id
+                JOIN companies c ON i.company_id = c.id
+                WHERE s.status != 'cancelled'
+                GROUP BY c.id, c.name
+                ORDER BY total_sales DESC
+            """)
 
-        result = db.session.execute(query)
-        df = pd.DataFrame(result.fetchall())
+        df = SalesAnalytics._frame(query)
         if df.empty:
             return {
                 'brands': [],
@@ -594,6 +718,8 @@ class SalesAnalytics:
         }
 
     @staticmethod
+    @analytics_cache.cached()
+    @track_stages
     def get_brand_popularity():
         """Ottiene la popolarità dei brand basata su vendite e recensioni"""
         query = text("""
@@ -621,8 +747,7 @@ class SalesAnalytics:
             ORDER BY popularity_score DESC
         """)
 
-        result = db.session.execute(query)
-        df = pd.DataFrame(result.fetchall())
+        df = SalesAnalytics._frame(query)
         if df.empty:
             return {
                 'brands': [],
@@ -638,33 +763,55 @@ class SalesAnalytics:
         }
 
     @staticmethod
+    @analytics_cache.cached()
+    @track_stages
     def get_brand_average_sales(period='monthly'):
         """Ottiene la media delle vendite per brand (settimanale o mensile)"""
         interval = "week" if period == 'weekly' else "month"
         
-        query = text(f"""
-            WITH brand_sales AS (
+        if SalesAnalytics._use_rollup():
+            query = text("""
+                WITH brand_sales AS (
+                    SELECT 
+                        c.name as brand,
+                        DATE_TRUNC(:interval, CAST(a.day AS TIMESTAMP)) as period,
+                        SUM(a.revenue) as total_sales
+                    FROM sales_daily_item_agg a
+                    JOIN companies c ON a.company_id = c.id
+                    WHERE a.status_bucket != 'cancelled'
+                    GROUP BY c.name, DATE_TRUNC(:interval, CAST(a.day AS TIMESTAMP))
+                    HAVING SUM(a.line_count) > 0
+                )
                 SELECT 
-                    c.name as brand,
-                    DATE_TRUNC(:interval, s.date) as period,
-                    SUM(si.total_price) as total_sales
-                FROM sales s
-                JOIN sale_items si ON s.id = si.sale_id
-                JOIN items i ON si.item_id = i.id
-                JOIN companies c ON i.company_id = c.id
-                WHERE s.status != 'cancelled'
-                GROUP BY c.name, DATE_TRUNC(:interval, s.date)
-            )
-            SELECT 
-                brand,
-                AVG(total_sales) as average_sales
-            FROM brand_sales
-            GROUP BY brand
-            ORDER BY average_sales DESC
-        """)
-
-        result = db.session.execute(query, {'interval': interval})
-        df = pd.DataFrame(result.fetchall())
+                    brand,
+                    AVG(total_sales) as average_sales
+                FROM brand_sales
+                GROUP BY brand
+                ORDER BY average_sales DESC
+            """)
+        else:
+            query = text(f"""
+                WITH brand_sales AS (
+                    SELECT 
+                        c.name as brand,
+                        DATE_TRUNC(:interval, s.date) as period,
+                        SUM(si.total_price) as total_sales
+                    FROM sales s
+                    JOIN sale_items si ON s.id = si.sale_id
+                    JOIN items i ON si.item_id = i.id
+                    JOIN companies c ON i.company_id = c.id
+                    WHERE s.status != 'cancelled'
+                    GROUP BY c.name, DATE_TRUNC(:interval, s.date)
+                )
+                SELECT 
+                    brand,
+                    AVG(total_sales) as average_sales
+                FROM brand_sales
+                GROUP BY brand
+                ORDER BY average_sales DESC
+            """)
+
+        df = SalesAnalytics._frame(query, {'interval': interval})
         if df.empty:
             return {
                 'brands': [],
@@ -676,6 +823,16 @@ class SalesAnalytics:
             'averages': [float(x) for x in df['average_sales'].tolist()]
         }
 
+    @staticmethod
+    def _period_params(start_date, end_date):
+        """Parametri del periodo, sia come timestamp sia come giorni interi per la rollup"""
+        return {
+            'start_date': start_date,
+            'end_date': end_date,
+            'start_day': start_date.date(),
+            'end_day_next': end_date.date() + timedelta(days=1)
+        }
+
     @staticmethod
     def _calculate_percentage_change(current, previous):
         """Calcola la variazione percentuale tra due valori"""
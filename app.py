@@ -5,6 +5,13 @@ from flask_cors import CORS
 import os
 from dotenv import load_dotenv
 from extensions import db, jwt, cors, mail
+from analytics.cache import analytics_cache
+from utils.email import email_dispatcher
+from utils.identity import identity_cache
+from utils.passwords import password_hasher
+from utils.admission import admission
+from utils.report_jobs import report_jobs
+from utils.metrics import request_metrics
 from models.user import User
 from routes.auth import auth_bp
 from routes.user_routes import user_bp
@@ -13,28 +20,54 @@ from routes.item_routes import item_bp
 from routes.purchase_routes import purchase_bp
 from routes.sale_routes import sale_bp
 from routes.analytics_routes import analytics_bp
-from utils.commands import list_users, shell_command
+from routes.export_routes import export_bp
+from routes.health_routes import health_bp
+from utils.db_pool import engine_options
+from utils.json_provider import OrjsonProvider
+from utils.commands import list_users, rebuild_sales_rollup, check_indexes_command, send_emails, import_catalog_command, shell_command
+import random
 import time
 import psycopg2
 
 load_dotenv()
 
-def wait_for_db(max_retries=5, delay_seconds=2):
+def wait_for_db(timeout_seconds=None, base_delay=0.5, max_delay=10):
+    """Attende il database con backoff esponenziale e jitter, fino a timeout_seconds"""
+    if timeout_seconds is None:
+        timeout_seconds = float(os.getenv('DB_WAIT_TIMEOUT', 60))
+    deadline = time.monotonic() + timeout_seconds
     current_try = 1
-    while current_try <= max_retries:
+    while True:
         try:
-            conn = psycopg2.connect(os.getenv('DATABASE_URL'))
+            conn = psycopg2.connect(os.getenv('DATABASE_URL'), connect_timeout=5)
             conn.close()
             print("Database connection successful!")
             return True
         except psycopg2.OperationalError as e:
-            print(f"Attempt {current_try}/{max_retries}: Database not ready yet... {str(e)}")
-            time.sleep(delay_seconds)
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            # Full jitter: i worker e i container avviati insieme non riprovano in sincronia
+            delay = min(random.uniform(0, min(max_delay, base_delay * 2 ** current_try)), remaining)
+            print(f"Attempt {current_try}: Database not ready yet, retrying in {delay:.1f}s... {str(e).splitlines()[0]}")
+            time.sleep(delay)
             current_try += 1
-    return False
+
+def prepare_database(app):
+    """Attende il database e crea le tabelle mancanti; False se il database non risponde"""
+    print("Waiting for database to be ready...")
+    if not wait_for_db():
+        print("Could not connect to database. Exiting.")
+        return False
+
+    with app.app_context():
+        db.create_all()
+        print("Database tables created successfully!")
+    return True
 
 def create_app():
     app = Flask(__name__)
+    app.json = OrjsonProvider(app)
 
     CORS(app, resources={
         r"/api/*": {
@@ -47,7 +80,16 @@ def create_app():
 
     app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv('DATABASE_URL')
     app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options()
     app.config['JWT_SECRET_KEY'] = os.getenv('JWT_SECRET_KEY')
+    app.config['ANALYTICS_USE_ROLLUP'] = os.getenv('ANALYTICS_USE_ROLLUP', 'False').lower() == 'true'
+    app.config['ANALYTICS_CACHE_BACKEND'] = os.getenv('ANALYTICS_CACHE_BACKEND', 'memory')
+    app.config['ANALYTICS_CACHE_TTL'] = int(os.getenv('ANALYTICS_CACHE_TTL', 60))
+    app.config['ANALYTICS_CACHE_MAX_ENTRIES'] = int(os.getenv('ANALYTICS_CACHE_MAX_ENTRIES', 256))
+    app.config['HEALTH_CHECK_CACHE_SECONDS'] = float(os.getenv('HEALTH_CHECK_CACHE_SECONDS', 5))
+    app.config['HEALTH_POOL_SATURATION'] = float(os.getenv('HEALTH_POOL_SATURATION', 1.0))
+    # La cache condivisa contiene pickle: va in una directory privata dell'applicazione
+    app.config['ANALYTICS_CACHE_PATH'] = os.getenv('ANALYTICS_CACHE_PATH', os.path.join(app.instance_path, 'analytics_cache', 'analytics.sqlite3'))
 
     app.config['MAIL_SERVER'] = os.getenv('MAIL_SERVER')
     app.config['MAIL_PORT'] = int(os.getenv('MAIL_PORT', 1025))
@@ -56,10 +98,45 @@ def create_app():
     app.config['MAIL_USERNAME'] = os.getenv('MAIL_USERNAME')
     app.config['MAIL_PASSWORD'] = os.getenv('MAIL_PASSWORD')
     app.config['MAIL_DEFAULT_SENDER'] = os.getenv('MAIL_DEFAULT_SENDER')
+    app.config['EMAIL_DISPATCHER_ENABLED'] = os.getenv('EMAIL_DISPATCHER_ENABLED', 'True').lower() == 'true'
+    app.config['EMAIL_WORKERS'] = int(os.getenv('EMAIL_WORKERS', 2))
+    app.config['EMAIL_BATCH_SIZE'] = int(os.getenv('EMAIL_BATCH_SIZE', 50))
+    app.config['EMAIL_MAX_ATTEMPTS'] = int(os.getenv('EMAIL_MAX_ATTEMPTS', 5))
+    app.config['EMAIL_RETRY_BASE_SECONDS'] = float(os.getenv('EMAIL_RETRY_BASE_SECONDS', 30))
+    app.config['EMAIL_POLL_INTERVAL'] = float(os.getenv('EMAIL_POLL_INTERVAL', 5))
+    app.config['EMAIL_SMTP_IDLE_SECONDS'] = float(os.getenv('EMAIL_SMTP_IDLE_SECONDS', 30))
+    app.config['EMAIL_LEASE_SECONDS'] = float(os.getenv('EMAIL_LEASE_SECONDS', 300))
+    app.config['IDENTITY_CACHE_TTL'] = float(os.getenv('IDENTITY_CACHE_TTL', 60))
+    app.config['IDENTITY_CACHE_MAX_ENTRIES'] = int(os.getenv('IDENTITY_CACHE_MAX_ENTRIES', 10000))
+    app.config['IDENTITY_SYNC_SECONDS'] = float(os.getenv('IDENTITY_SYNC_SECONDS', 5))
+    app.config['PASSWORD_HASH_WORKERS'] = int(os.getenv('PASSWORD_HASH_WORKERS', 2))
+    app.config['PASSWORD_HASH_QUEUE'] = int(os.getenv('PASSWORD_HASH_QUEUE', 16))
+    app.config['PASSWORD_HASH_TIMEOUT'] = float(os.getenv('PASSWORD_HASH_TIMEOUT', 10))
+    app.config['PASSWORD_HASH_RETRY_AFTER'] = int(os.getenv('PASSWORD_HASH_RETRY_AFTER', 1))
+    # Di default metà dei thread del worker: le altre restano alle route CRUD
+    app.config['ANALYTICS_CAPACITY'] = int(os.getenv('ANALYTICS_CAPACITY', max(1, int(os.getenv('GUNICORN_THREADS', 4)) // 2)))
+    app.config['ANALYTICS_ROUTE_CONCURRENCY'] = int(os.getenv('ANALYTICS_ROUTE_CONCURRENCY', 1))
+    app.config['ANALYTICS_COST_DAYS'] = int(os.getenv('ANALYTICS_COST_DAYS', 90))
+    app.config['ANALYTICS_RESERVED_CONNECTIONS'] = int(os.getenv('ANALYTICS_RESERVED_CONNECTIONS', 2))
+    app.config['ANALYTICS_RETRY_AFTER'] = int(os.getenv('ANALYTICS_RETRY_AFTER', 5))
+    app.config['REPORT_JOB_WORKERS'] = int(os.getenv('REPORT_JOB_WORKERS', 1))
+    app.config['REPORT_JOB_MAX_PENDING'] = int(os.getenv('REPORT_JOB_MAX_PENDING', 100))
+    app.config['REPORT_JOB_RESULT_TTL'] = int(os.getenv('REPORT_JOB_RESULT_TTL', 3600))
+    app.config['REPORT_JOB_HEARTBEAT_SECONDS'] = float(os.getenv('REPORT_JOB_HEARTBEAT_SECONDS', 10))
+    app.config['REPORT_JOB_LEASE_SECONDS'] = float(os.getenv('REPORT_JOB_LEASE_SECONDS', 60))
+    app.config['REPORT_JOB_POLL_INTERVAL'] = float(os.getenv('REPORT_JOB_POLL_INTERVAL', 2))
+    app.config['METRICS_ENABLED'] = os.getenv('METRICS_ENABLED', 'True').lower() == 'true'
 
     db.init_app(app)
     jwt.init_app(app)
     mail.init_app(app)
+    analytics_cache.init_app(app)
+    email_dispatcher.init_app(app)
+    identity_cache.init_app(app)
+    password_hasher.init_app(app)
+    admission.init_app(app)
+    report_jobs.init_app(app)
+    request_metrics.init_app(app)
     
     migrate = Migrate(app, db)
 
@@ -81,8 +158,14 @@ def create_app():
     app.register_blueprint(purchase_bp, url_prefix='/api')
     app.register_blueprint(sale_bp, url_prefix='/api')
     app.register_blueprint(analytics_bp, url_prefix='/api')
+    app.register_blueprint(export_bp, url_prefix='/api')
+    app.register_blueprint(health_bp)
 
     app.cli.add_command(list_users)
+    app.cli.add_command(rebuild_sales_rollup)
+    app.cli.add_command(check_indexes_command)
+    app.cli.add_command(send_emails)
+    app.cli.add_command(import_catalog_command)
     app.cli.add_command(shell_command)
 
     @app.route('/')
@@ -96,6 +179,9 @@ def create_app():
             "version": "1.0.0",
             "documentation": "/api/docs",
             "health_check": "/health",
+            "liveness": "/health/live",
+            "readiness": "/health/ready",
+            "metrics": "/metrics",
             "endpoints": {
                 "auth": {
                     "register": "/api/auth/register",
@@ -126,26 +212,12 @@ def create_app():
             }
         })
 
-    @app.route('/health')
-    def health_check():
-        return jsonify({
-            "status": "healthy",
-            "database": "connected",
-            "version": "1.0.0"
-        }), 200
-
     return app
 
 app = create_app()
 
 if __name__ == '__main__':
-    print("Waiting for database to be ready...")
-    if not wait_for_db():
-        print("Could not connect to database. Exiting.")
+    if not prepare_database(app):
         exit(1)
-        
-    with app.app_context():
-        db.create_all()
-        print("Database tables created successfully!")
-    
+
     app.run(host='0.0.0.0', debug=True) 
\ No newline at end of file
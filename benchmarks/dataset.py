@@ -0,0 +1,184 @@
+"""Dataset sintetico e deterministico per i benchmark delle analytics.
+
+Genera aziende, item, vendite e acquisti con numpy a blocchi e li carica
+con COPY, quindi anche 10M righe di vendita non devono stare in memoria
+tutte insieme. A parità di parametri (seed e data finale compresi) il
+contenuto del database è identico, così i report di versioni diverse sono
+confrontabili.
+
+I parametri del dataset caricato sono salvati come commento sulla tabella
+sales e letti da load_metadata().
+"""
+import io
+import json
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import text
+
+from extensions import db
+from analytics import rollup
+
+SIZES = {
+    'small': 10_000,
+    'medium': 1_000_000,
+    'large': 10_000_000
+}
+
+SALE_STATUSES = ['pending', 'confirmed', 'shipped', 'delivered', 'cancelled']
+SALE_STATUS_WEIGHTS = [0.10, 0.55, 0.10, 0.20, 0.05]
+PURCHASE_STATUSES = ['pending', 'confirmed', 'delivered', 'cancelled']
+PURCHASE_STATUS_WEIGHTS = [0.10, 0.20, 0.65, 0.05]
+COMPANY_TAGS = ['SUPPLIER', 'BUYER', 'CUSTOMER']
+
+# Righe per ordine tra 1 e 5, in media 3
+MAX_LINES_PER_ORDER = 5
+CHUNK_ORDERS = 200_000
+
+TABLES = ['purchase_items', 'purchases', 'sale_items', 'sales', 'sales_daily_item_agg', 'items']
+
+
+def _copy(cursor, table, df):
+    buffer = io.StringIO()
+    df.to_csv(buffer, index=False, header=False)
+    buffer.seek(0)
+    cursor.copy_expert(f'COPY {table} ({", ".join(df.columns)}) FROM STDIN WITH (FORMAT csv)', buffer)
+
+
+def _orders(rng, first_id, count, params, start, item_prices, item_companies):
+    """Testate e righe di un blocco di ordini; gli id sono consecutivi da first_id"""
+    ids = np.arange(first_id, first_id + count)
+    line_counts = rng.integers(1, MAX_LINES_PER_ORDER + 1, count)
+    seconds = rng.integers(0, params['days'] * 24 * 3600, count)
+    dates = pd.Timestamp(start) + pd.to_timedelta(np.sort(seconds), unit='s')
+
+    order_ids = np.repeat(ids, line_counts)
+    item_ids = rng.integers(1, params['items'] + 1, len(order_ids))
+    quantities = rng.integers(1, 20, len(order_ids))
+    unit_prices = item_prices[item_ids - 1]
+    total_prices = np.round(unit_prices * quantities, 2)
+    starts = np.concatenate(([0], np.cumsum(line_counts)[:-1]))
+
+    headers = pd.DataFrame({
+        'id': ids,
+        'date': dates,
+        'total_amount': np.round(np.add.reduceat(total_prices, starts), 2),
+        'company_id': item_companies[item_ids[starts] - 1]
+    })
+    lines = pd.DataFrame({
+        'order_id': order_ids,
+        'item_id': item_ids,
+        'quantity': quantities,
+        'unit_price': unit_prices,
+        'total_price': total_prices
+    })
+    return headers, lines
+
+
+def load_dataset(lines, companies=50, items=2000, days=365, seed=42, end_date=None):
+    """Svuota le tabelle del dominio e carica il dataset; restituisce i parametri usati.
+
+    Gli utenti restano, scollegati dalle aziende eliminate.
+    """
+    end_date = end_date or datetime.now().strftime('%Y-%m-%d')
+    params = {
+        'lines': lines,
+        'companies': companies,
+        'items': items,
+        'days': days,
+        'seed': seed,
+        'end_date': end_date
+    }
+    start = datetime.strptime(end_date, '%Y-%m-%d') + timedelta(days=1) - timedelta(days=days)
+    now = datetime.now()
+    rng = np.random.default_rng(seed)
+
+    connection = db.session.connection()
+    connection.execute(text(f'TRUNCATE {", ".join(TABLES)} RESTART IDENTITY'))
+    connection.execute(text('UPDATE users SET company_id = NULL WHERE company_id IS NOT NULL'))
+    connection.execute(text('DELETE FROM companies'))
+    cursor = connection.connection.cursor()
+
+    company_ids = np.arange(1, companies + 1)
+    _copy(cursor, 'companies', pd.DataFrame({
+        'id': company_ids,
+        'name': [f'Azienda {i}' for i in company_ids],
+        'vat_number': [f'IT{i:011d}' for i in company_ids],
+        'email': [f'azienda{i}@example.com' for i in company_ids],
+        'tag': [COMPANY_TAGS[i % len(COMPANY_TAGS)] for i in company_ids],
+        'created_at': now,
+        'updated_at': now
+    }))
+
+    item_ids = np.arange(1, items + 1)
+    item_prices = np.round(rng.uniform(1, 500, items), 2)
+    item_companies = (item_ids % companies) + 1
+    _copy(cursor, 'items', pd.DataFrame({
+        'id': item_ids,
+        'name': [f'Item {i}' for i in item_ids],
+        'price': item_prices,
+        'price_unit': 'EUR',
+        'sku': [f'SKU-{i}' for i in item_ids],
+        'stock': rng.integers(0, 1000, items),
+        'stock_unit': 'PZ',
+        'gross_margin': np.round(rng.uniform(5, 60, items), 2),
+        'company_id': item_companies,
+        'created_at': now,
+        'updated_at': now
+    }))
+
+    # Stesso numero atteso di righe per vendite e per acquisti (1/4)
+    average_lines = (MAX_LINES_PER_ORDER + 1) / 2
+    sales_total = max(1, round(lines / average_lines))
+    purchases_total = max(1, sales_total // 4)
+    counts = {'sale_lines': 0, 'purchase_lines': 0}
+
+    for kind, total in (('sale', sales_total), ('purchase', purchases_total)):
+        line_id = 1
+        for first_id in range(1, total + 1, CHUNK_ORDERS):
+            count = min(CHUNK_ORDERS, total - first_id + 1)
+            prices = item_prices if kind == 'sale' else np.round(item_prices * 0.6, 2)
+            headers, order_lines = _orders(rng, first_id, count, params, start, prices, item_companies)
+            order_lines.insert(0, 'id', np.arange(line_id, line_id + len(order_lines)))
+            line_id += len(order_lines)
+            headers['created_at'] = now
+            headers['updated_at'] = now
+
+            if kind == 'sale':
+                headers['status'] = rng.choice(SALE_STATUSES, count, p=SALE_STATUS_WEIGHTS)
+                customers = rng.integers(1, max(2, total // 5), count)
+                headers['customer_name'] = [f'Cliente {c}' for c in customers]
+                headers['customer_email'] = [f'cliente{c}@example.com' for c in customers]
+                _copy(cursor, 'sales', headers)
+                _copy(cursor, 'sale_items', order_lines.rename(columns={'order_id': 'sale_id'}))
+            else:
+                headers['status'] = rng.choice(PURCHASE_STATUSES, count, p=PURCHASE_STATUS_WEIGHTS)
+                _copy(cursor, 'purchases', headers)
+                _copy(cursor, 'purchase_items', order_lines.rename(columns={'order_id': 'purchase_id'}))
+        counts[f'{kind}_lines'] = line_id - 1
+
+    for table in ('companies', 'items', 'sales', 'sale_items', 'purchases', 'purchase_items'):
+        connection.execute(text(
+            f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), (SELECT COALESCE(MAX(id), 1) FROM {table}))"
+        ))
+
+    params.update(counts)
+    connection.execute(text(f"COMMENT ON TABLE sales IS '{json.dumps({'benchmark_dataset': params})}'"))
+    db.session.commit()
+
+    rollup.rebuild()
+    db.session.execute(text('ANALYZE'))
+    db.session.commit()
+    return params
+
+
+def load_metadata():
+    """Parametri del dataset caricato, None se il database non contiene un dataset di benchmark"""
+    comment = db.session.execute(text("SELECT obj_description('sales'::regclass, 'pg_class')")).scalar()
+    if not comment:
+        return None
+    try:
+        return json.loads(comment).get('benchmark_dataset')
+    except ValueError:
+        return None
@@ -0,0 +1,158 @@
+"""Benchmark della serializzazione JSON di una lista di vendite.
+
+Costruisce in memoria N vendite con righe e azienda, senza database, e
+misura la risposta jsonify({'data': [...]}) in due modi:
+
+- legacy: to_dict con float()/isoformat() in Python e provider JSON
+  predefinito di Flask (json della libreria standard);
+- orjson: to_dict con Decimal e datetime nativi e OrjsonProvider.
+
+    python benchmarks/json_serialization.py --sales 10000
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask
+from flask.json.provider import DefaultJSONProvider
+from models.company import Company, CompanyTag
+from models.item import Item
+from models.sale import Sale, SaleItem
+from utils.json_provider import OrjsonProvider
+
+
+def build_sales(count, lines_per_sale=3, companies=20, items=500, seed=42):
+    """Vendite transienti e deterministiche con le relazioni già popolate"""
+    rng = random.Random(seed)
+    start = datetime(2024, 1, 1, 8, 30, 15, 123456)
+    company_rows = [
+        Company(
+            id=c, name=f'Company {c}', vat_number=f'IT{c:011d}', address=f'Via Roma {c}',
+            email=f'company{c}@example.com', phone='+39 02 0000000', tag=CompanyTag.CUSTOMER,
+            created_at=start, updated_at=start
+        )
+        for c in range(1, companies + 1)
+    ]
+    item_rows = [
+        Item(id=i, name=f'Item {i}', sku=f'SKU-{i}', price=Decimal(rng.randint(100, 50000)) / 100)
+        for i in range(1, items + 1)
+    ]
+
+    sales = []
+    for s in range(1, count + 1):
+        date = start + timedelta(seconds=rng.randint(0, 365 * 24 * 3600))
+        lines = []
+        for l in range(lines_per_sale):
+            item = rng.choice(item_rows)
+            quantity = rng.randint(1, 20)
+            lines.append(SaleItem(
+                id=s * lines_per_sale + l, item_id=item.id, item=item, quantity=quantity,
+                unit_price=item.price, total_price=item.price * quantity
+            ))
+        company = rng.choice(company_rows)
+        sales.append(Sale(
+            id=s, customer_name=f'Cliente {s}', customer_email=f'cliente{s}@example.com',
+            customer_address='Via Milano 1', customer_phone='+39 333 0000000',
+            date=date, status='confirmed', total_amount=sum(line.total_price for line in lines),
+            notes=None, company_id=company.id, company=company, items=lines,
+            created_at=date, updated_at=date
+        ))
+    return sales
+
+
+def legacy_company(company):
+    return {
+        'id': company.id,
+        'name': company.name,
+        'vat_number': company.vat_number,
+        'address': company.address,
+        'email': company.email,
+        'phone': company.phone,
+        'tag': company.tag.value if company.tag else None,
+        'created_at': company.created_at.isoformat(),
+        'updated_at': company.updated_at.isoformat()
+    }
+
+
+def legacy_sale(sale):
+    """Sale.to_dict come prima di OrjsonProvider, con le conversioni in Python"""
+    return {
+        'id': sale.id,
+        'customer_name': sale.customer_name,
+        'customer_email': sale.customer_email,
+        'customer_address': sale.customer_address,
+        'customer_phone': sale.customer_phone,
+        'date': sale.date.isoformat(),
+        'status': sale.status,
+        'total_amount': float(sale.total_amount),
+        'notes': sale.notes,
+        'company_id': sale.company_id,
+        'company': legacy_company(sale.company) if sale.company else None,
+        'items': [
+            {
+                'id': line.id,
+                'item_id': line.item_id,
+                'item_name': line.item.name,
+                'item_sku': line.item.sku,
+                'quantity': line.quantity,
+                'unit_price': float(line.unit_price),
+                'total_price': float(line.total_price)
+            }
+            for line in sale.items
+        ],
+        'created_at': sale.created_at.isoformat(),
+        'updated_at': sale.updated_at.isoformat()
+    }
+
+
+def measure(app, sales, serialize, repeat):
+    timings = []
+    body = None
+    with app.app_context():
+        for _ in range(repeat):
+            start = time.perf_counter()
+            body = app.json.response({'data': [serialize(sale) for sale in sales]}).get_data()
+            timings.append(time.perf_counter() - start)
+    return timings, body
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sales', type=int, default=10_000)
+    parser.add_argument('--lines', type=int, default=3)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    sales = build_sales(args.sales, args.lines)
+    print(f'{len(sales)} vendite, {args.lines} righe per vendita')
+
+    legacy_app = Flask('legacy')
+    legacy_app.json = DefaultJSONProvider(legacy_app)
+    orjson_app = Flask('orjson')
+    orjson_app.json = OrjsonProvider(orjson_app)
+
+    results = {}
+    for name, app, serialize in (
+        ('legacy', legacy_app, legacy_sale),
+        ('orjson', orjson_app, Sale.to_dict),
+    ):
+        timings, body = measure(app, sales, serialize, args.repeat)
+        results[name] = (statistics.median(timings), body)
+        print(f'{name:>7}: mediana {results[name][0] * 1000:.1f} ms, '
+              f'minimo {min(timings) * 1000:.1f} ms, {len(body) / 1024 / 1024:.1f} MB')
+
+    if orjson_app.json.loads(results['legacy'][1]) != orjson_app.json.loads(results['orjson'][1]):
+        print('Le due risposte non contengono gli stessi dati')
+        sys.exit(1)
+    print(f'Risposte equivalenti, speedup {results["legacy"][0] / results["orjson"][0]:.1f}x')
+
+
+if __name__ == '__main__':
+    main()
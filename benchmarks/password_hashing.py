@@ -0,0 +1,118 @@
+"""Benchmark della verifica delle password durante un picco di login.
+
+Per ogni modalità (nel thread della richiesta e nel pool di processi di
+PasswordHasher) --clients thread verificano password per --seconds
+secondi; intanto un thread sonda esegue ogni 10 ms un piccolo lavoro in
+Python, come farebbe una richiesta qualsiasi dello stesso worker, e ne
+misura la latenza. Non serve il database.
+
+    python benchmarks/password_hashing.py --clients 16 --workers 2 --seconds 5
+"""
+import argparse
+import os
+import statistics
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask
+from werkzeug.security import generate_password_hash
+from utils.passwords import PasswordHasher, PasswordHasherBusy
+
+
+def make_hasher(workers, queue):
+    app = Flask('benchmark')
+    app.config.update(
+        PASSWORD_HASH_WORKERS=workers,
+        PASSWORD_HASH_QUEUE=queue,
+        PASSWORD_HASH_TIMEOUT=60,
+        PASSWORD_HASH_RETRY_AFTER=1
+    )
+    hasher = PasswordHasher()
+    hasher.init_app(app)
+    return hasher
+
+
+def probe(stop, latencies):
+    """Lavoro breve ogni 10 ms: misura quanto aspetta il GIL"""
+    while not stop.is_set():
+        start = time.perf_counter()
+        sum(i * i for i in range(2000))
+        latencies.append(time.perf_counter() - start)
+        time.sleep(0.01)
+
+
+def run(hasher, password_hash, clients, seconds):
+    stop = threading.Event()
+    counts = {'ok': 0, 'rejected': 0}
+    lock = threading.Lock()
+    latencies = []
+    logins = []
+
+    def client():
+        while not stop.is_set():
+            start = time.perf_counter()
+            try:
+                hasher.check(password_hash, 'password')
+                logins.append(time.perf_counter() - start)
+                key = 'ok'
+            except PasswordHasherBusy:
+                key = 'rejected'
+                time.sleep(0.005)
+            with lock:
+                counts[key] += 1
+
+    # Il pool si avvia prima della misura
+    hasher.check(password_hash, 'password')
+
+    threads = [threading.Thread(target=client) for _ in range(clients)]
+    threads.append(threading.Thread(target=probe, args=(stop, latencies)))
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    time.sleep(seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    logins.sort()
+    return {
+        'per_second': counts['ok'] / elapsed,
+        'rejected': counts['rejected'],
+        'login_p50_ms': statistics.median(logins) * 1000,
+        'login_max_ms': logins[-1] * 1000,
+        'probe_p50_ms': statistics.median(latencies) * 1000,
+        'probe_p99_ms': latencies[int(len(latencies) * 0.99) - 1] * 1000,
+        'probe_max_ms': latencies[-1] * 1000
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--clients', type=int, default=16)
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--queue', type=int, default=16)
+    parser.add_argument('--seconds', type=float, default=5)
+    args = parser.parse_args()
+
+    cpus = os.cpu_count() or 1
+    password_hash = generate_password_hash('password')
+    print(f'{password_hash.split("$")[0]}, {cpus} CPU, {args.clients} client')
+
+    for name, workers in (('inline', 0), ('pool', args.workers)):
+        result = run(make_hasher(workers, args.queue), password_hash, args.clients, args.seconds)
+        cores = min(workers or args.clients, cpus)
+        print(
+            f'{name:>6}: {result["per_second"]:.1f} login/s, {result["per_second"] / cores:.1f} per core '
+            f'({cores}), rifiutati {result["rejected"]}, login p50 {result["login_p50_ms"]:.0f} ms '
+            f'max {result["login_max_ms"]:.0f} ms, sonda p50 {result["probe_p50_ms"]:.2f} ms '
+            f'p99 {result["probe_p99_ms"]:.2f} ms max {result["probe_max_ms"]:.2f} ms'
+        )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,67 @@
+"""Benchmark dell'aggregazione di SalesAnalytics.get_sales_by_company.
+
+Genera in memoria un DataFrame di righe di vendita con la stessa forma
+restituita dalla query (90 giorni, N aziende e item) e misura il tempo di
+SalesAnalytics._build_sales_by_company, senza bisogno del database.
+
+    python benchmarks/sales_by_company.py --rows 1000000
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from analytics.sales_analytics import SalesAnalytics
+
+
+def build_sale_lines(rows, companies, items, days, seed=42):
+    """Righe di vendita sintetiche e deterministiche"""
+    rng = np.random.default_rng(seed)
+    item_ids = rng.integers(1, items + 1, rows)
+    company_ids = (item_ids % companies) + 1
+    unit_prices = np.round(rng.uniform(1, 500, rows), 2)
+    quantities = rng.integers(1, 20, rows)
+    sale_dates = pd.Timestamp('2024-01-01') + pd.to_timedelta(rng.integers(0, days * 24 * 3600, rows), unit='s')
+
+    return pd.DataFrame({
+        'company_id': company_ids,
+        'company_name': np.char.add('Company ', company_ids.astype(str)).astype(object),
+        'item_id': item_ids,
+        'item_name': np.char.add('Item ', item_ids.astype(str)).astype(object),
+        'sku': np.char.add('SKU-', item_ids.astype(str)).astype(object),
+        'quantity': quantities,
+        'unit_price': unit_prices,
+        'total_price': np.round(unit_prices * quantities, 2),
+        'sale_date': sale_dates.floor('min'),
+        'status': 'confirmed'
+    })
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    parser.add_argument('--companies', type=int, default=200)
+    parser.add_argument('--items', type=int, default=5000)
+    parser.add_argument('--days', type=int, default=90)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    df = build_sale_lines(args.rows, args.companies, args.items, args.days)
+    print(f'{len(df)} righe, {args.companies} aziende, {args.items} item, {args.days} giorni')
+
+    timings = []
+    for _ in range(args.repeat):
+        start = time.perf_counter()
+        SalesAnalytics._build_sales_by_company(df)
+        timings.append(time.perf_counter() - start)
+
+    print(f'get_sales_by_company: min {min(timings):.3f}s, media {sum(timings) / len(timings):.3f}s')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,62 @@
+"""Configurazione di gunicorn per l'esecuzione in produzione.
+
+    gunicorn -c gunicorn.conf.py app:app
+
+Tutti i parametri sono letti dalle variabili d'ambiente GUNICORN_*.
+"""
+import glob
+import multiprocessing
+import os
+
+bind = os.getenv('GUNICORN_BIND', '0.0.0.0:5000')
+
+# Metriche Prometheus condivise tra i worker: la directory va impostata
+# prima che l'app importi prometheus_client e svuotata a ogni avvio
+os.environ.setdefault('PROMETHEUS_MULTIPROC_DIR', '/tmp/order_manager_metrics')
+os.makedirs(os.environ['PROMETHEUS_MULTIPROC_DIR'], exist_ok=True)
+for path in glob.glob(os.path.join(os.environ['PROMETHEUS_MULTIPROC_DIR'], '*.db')):
+    os.remove(path)
+
+# Worker gthread: ogni processo serve più richieste in parallelo con i suoi thread
+worker_class = 'gthread'
+workers = int(os.getenv('GUNICORN_WORKERS', multiprocessing.cpu_count() * 2 + 1))
+threads = int(os.getenv('GUNICORN_THREADS', 4))
+
+# L'app viene importata una sola volta nel master e condivisa con i worker
+preload_app = os.getenv('GUNICORN_PRELOAD', 'True').lower() == 'true'
+
+# Riciclo dei worker dopo N richieste; il jitter evita che si riavviino tutti insieme
+max_requests = int(os.getenv('GUNICORN_MAX_REQUESTS', 1000))
+max_requests_jitter = int(os.getenv('GUNICORN_MAX_REQUESTS_JITTER', 100))
+
+# Su SIGTERM i worker smettono di accettare connessioni e hanno
+# graceful_timeout secondi per completare le richieste in corso
+timeout = int(os.getenv('GUNICORN_TIMEOUT', 60))
+graceful_timeout = int(os.getenv('GUNICORN_GRACEFUL_TIMEOUT', 30))
+keepalive = int(os.getenv('GUNICORN_KEEPALIVE', 5))
+
+accesslog = os.getenv('GUNICORN_ACCESS_LOG', '-')
+errorlog = os.getenv('GUNICORN_ERROR_LOG', '-')
+loglevel = os.getenv('GUNICORN_LOG_LEVEL', 'info')
+
+
+def on_starting(server):
+    # Una sola volta nel master, prima di avviare i worker
+    from app import app, prepare_database
+    if not prepare_database(app):
+        raise SystemExit(1)
+
+
+def post_fork(server, worker):
+    # Le connessioni aperte dal master non vanno condivise tra processi:
+    # ogni worker apre le proprie
+    from app import app
+    from extensions import db
+    with app.app_context():
+        db.engine.dispose(close=False)
+
+
+def child_exit(server, worker):
+    # I contatori del worker terminato restano, le sue serie live no
+    from prometheus_client import multiprocess
+    multiprocess.mark_process_dead(worker.pid)
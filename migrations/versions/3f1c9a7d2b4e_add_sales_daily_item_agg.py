@@ -0,0 +1,62 @@
+"""add sales_daily_item_agg rollup
+
+Revision ID: 3f1c9a7d2b4e
+Revises: 721224e62c28
+Create Date: 2026-10-18 09:30:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3f1c9a7d2b4e'
+down_revision = '721224e62c28'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('sales_daily_item_agg',
+    sa.Column('day', sa.Date(), nullable=False),
+    sa.Column('company_id', sa.Integer(), nullable=False),
+    sa.Column('item_id', sa.Integer(), nullable=False),
+    sa.Column('status_bucket', sa.String(length=20), nullable=False),
+    sa.Column('quantity', sa.Integer(), nullable=False),
+    sa.Column('revenue', sa.Numeric(precision=14, scale=2), nullable=False),
+    sa.Column('order_count', sa.Integer(), nullable=False),
+    sa.Column('line_count', sa.Integer(), nullable=False),
+    sa.Column('unit_price_sum', sa.Numeric(precision=14, scale=2), nullable=False),
+    sa.ForeignKeyConstraint(['company_id'], ['companies.id'], ),
+    sa.ForeignKeyConstraint(['item_id'], ['items.id'], ),
+    sa.PrimaryKeyConstraint('day', 'company_id', 'item_id', 'status_bucket')
+    )
+    # popola la rollup con lo storico esistente
+    op.execute("""
+        INSERT INTO sales_daily_item_agg (
+            day, company_id, item_id, status_bucket,
+            quantity, revenue, order_count, line_count, unit_price_sum
+        )
+        SELECT
+            CAST(s.date AS DATE),
+            i.company_id,
+            si.item_id,
+            CASE
+                WHEN s.status = 'cancelled' THEN 'cancelled'
+                WHEN s.status = 'pending' THEN 'pending'
+                ELSE 'confirmed'
+            END,
+            SUM(si.quantity),
+            SUM(si.total_price),
+            COUNT(DISTINCT s.id),
+            COUNT(*),
+            SUM(si.unit_price)
+        FROM sales s
+        JOIN sale_items si ON s.id = si.sale_id
+        JOIN items i ON si.item_id = i.id
+        GROUP BY 1, 2, 3, 4
+    """)
+
+
+def downgrade():
+    op.drop_table('sales_daily_item_agg')
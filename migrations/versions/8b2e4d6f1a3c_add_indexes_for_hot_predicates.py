@@ -0,0 +1,52 @@
+"""add indexes for hot query predicates
+
+Revision ID: 8b2e4d6f1a3c
+Revises: 3f1c9a7d2b4e
+Create Date: 2026-10-18 10:15:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8b2e4d6f1a3c'
+down_revision = '3f1c9a7d2b4e'
+branch_labels = None
+depends_on = None
+
+
+INDEXES = [
+    ('ix_sales_active_date', 'sales', ['date'], "status <> 'cancelled'"),
+    ('ix_sales_date_id', 'sales', ['date', 'id'], None),
+    ('ix_sales_status_date_id', 'sales', ['status', 'date', 'id'], None),
+    ('ix_sales_customer_email_date_id', 'sales', ['customer_email', 'date', 'id'], None),
+    ('ix_sales_company_id_date_id', 'sales', ['company_id', 'date', 'id'], None),
+    ('ix_sale_items_sale_id', 'sale_items', ['sale_id'], None),
+    ('ix_sale_items_item_id', 'sale_items', ['item_id'], None),
+    ('ix_purchases_active_date', 'purchases', ['date'], "status <> 'cancelled'"),
+    ('ix_purchases_date_id', 'purchases', ['date', 'id'], None),
+    ('ix_purchases_company_id_date_id', 'purchases', ['company_id', 'date', 'id'], None),
+    ('ix_purchase_items_purchase_id', 'purchase_items', ['purchase_id'], None),
+    ('ix_purchase_items_item_id', 'purchase_items', ['item_id'], None),
+    ('ix_items_company_id', 'items', ['company_id', 'id'], None),
+]
+
+
+def upgrade():
+    # CONCURRENTLY non blocca le scritture sulle tabelle già popolate,
+    # ma deve girare fuori dalla transazione della migrazione
+    with op.get_context().autocommit_block():
+        for name, table, columns, where in INDEXES:
+            op.create_index(
+                name, table, columns,
+                postgresql_where=sa.text(where) if where else None,
+                postgresql_concurrently=True,
+                if_not_exists=True
+            )
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        for name, table, _, _ in reversed(INDEXES):
+            op.drop_index(name, table_name=table, postgresql_concurrently=True, if_exists=True)
@@ -0,0 +1,26 @@
+"""add report job heartbeat
+
+Revision ID: a3d7f1c5e9b2
+Revises: f2c6a9d4e8b3
+Create Date: 2026-10-18 18:20:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a3d7f1c5e9b2'
+down_revision = 'f2c6a9d4e8b3'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('report_jobs', sa.Column('heartbeat_at', sa.DateTime(), nullable=True))
+    # I job già in esecuzione partono dall'avvio
+    op.execute("UPDATE report_jobs SET heartbeat_at = started_at WHERE status = 'running'")
+
+
+def downgrade():
+    op.drop_column('report_jobs', 'heartbeat_at')
@@ -0,0 +1,26 @@
+"""users timestamps in utc
+
+Revision ID: b8e2c4f6a1d9
+Revises: a3d7f1c5e9b2
+Create Date: 2026-10-18 18:50:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b8e2c4f6a1d9'
+down_revision = 'a3d7f1c5e9b2'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.alter_column('users', 'created_at', server_default=sa.text("timezone('UTC', now())"))
+    op.alter_column('users', 'updated_at', server_default=sa.text("timezone('UTC', now())"))
+
+
+def downgrade():
+    op.alter_column('users', 'created_at', server_default=sa.text('now()'))
+    op.alter_column('users', 'updated_at', server_default=sa.text('now()'))
@@ -0,0 +1,40 @@
+"""add email outbox
+
+Revision ID: c4a9e2f7b1d5
+Revises: 8b2e4d6f1a3c
+Create Date: 2026-10-18 11:40:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c4a9e2f7b1d5'
+down_revision = '8b2e4d6f1a3c'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('email_outbox',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('subject', sa.String(length=200), nullable=False),
+    sa.Column('recipients', sa.JSON(), nullable=False),
+    sa.Column('text_body', sa.Text(), nullable=False),
+    sa.Column('html_body', sa.Text(), nullable=True),
+    sa.Column('status', sa.String(length=20), nullable=False),
+    sa.Column('attempts', sa.Integer(), nullable=False),
+    sa.Column('next_attempt_at', sa.DateTime(), nullable=False),
+    sa.Column('last_error', sa.Text(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.Column('sent_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_email_outbox_pending', 'email_outbox', ['next_attempt_at', 'id'],
+                    postgresql_where=sa.text("status = 'pending'"))
+
+
+def downgrade():
+    op.drop_index('ix_email_outbox_pending', table_name='email_outbox')
+    op.drop_table('email_outbox')
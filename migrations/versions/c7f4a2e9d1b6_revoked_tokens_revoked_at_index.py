@@ -0,0 +1,26 @@
+"""revoked tokens revoked_at index
+
+Revision ID: c7f4a2e9d1b6
+Revises: b8e2c4f6a1d9
+Create Date: 2026-10-18 20:30:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c7f4a2e9d1b6'
+down_revision = 'b8e2c4f6a1d9'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.alter_column('revoked_tokens', 'revoked_at', server_default=sa.text("timezone('UTC', now())"))
+    op.create_index('ix_revoked_tokens_revoked_at', 'revoked_tokens', ['revoked_at'])
+
+
+def downgrade():
+    op.drop_index('ix_revoked_tokens_revoked_at', table_name='revoked_tokens')
+    op.alter_column('revoked_tokens', 'revoked_at', server_default=None)
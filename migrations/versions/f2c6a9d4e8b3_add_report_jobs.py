@@ -0,0 +1,46 @@
+"""add report jobs
+
+Revision ID: f2c6a9d4e8b3
+Revises: e5d3b8a1c7f2
+Create Date: 2026-10-18 16:30:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f2c6a9d4e8b3'
+down_revision = 'e5d3b8a1c7f2'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('report_jobs',
+    sa.Column('id', sa.String(length=32), nullable=False),
+    sa.Column('report', sa.String(length=50), nullable=False),
+    sa.Column('params', sa.JSON(), nullable=False),
+    sa.Column('dedupe_key', sa.String(length=64), nullable=False),
+    sa.Column('status', sa.String(length=20), nullable=False),
+    sa.Column('stage', sa.String(length=20), nullable=False),
+    sa.Column('result', sa.Text(), nullable=True),
+    sa.Column('error', sa.Text(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.Column('started_at', sa.DateTime(), nullable=True),
+    sa.Column('finished_at', sa.DateTime(), nullable=True),
+    sa.Column('expires_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_report_jobs_in_flight', 'report_jobs', ['dedupe_key'], unique=True,
+                    postgresql_where=sa.text("status IN ('pending', 'running')"))
+    op.create_index('ix_report_jobs_pending', 'report_jobs', ['created_at'],
+                    postgresql_where=sa.text("status = 'pending'"))
+    op.create_index('ix_report_jobs_expires_at', 'report_jobs', ['expires_at'])
+
+
+def downgrade():
+    op.drop_index('ix_report_jobs_expires_at', table_name='report_jobs')
+    op.drop_index('ix_report_jobs_pending', table_name='report_jobs')
+    op.drop_index('ix_report_jobs_in_flight', table_name='report_jobs')
+    op.drop_table('report_jobs')
@@ -1,5 +1,6 @@
 from datetime import datetime
 from extensions import db
+from utils.fieldsets import fieldset_dict, fieldset_options
 from enum import Enum
 
 class CompanyTag(Enum):
@@ -22,10 +23,20 @@ class Company(db.Model):
     
     items = db.relationship('Item', backref='company', lazy=True)
 
+    FIELDS = ('id', 'name', 'vat_number', 'address', 'email', 'phone', 'tag', 'created_at', 'updated_at')
+    INCLUDES = ()
+
+    @staticmethod
+    def serialization_options(fieldset=None):
+        """Opzioni di caricamento per to_dict(fieldset)"""
+        return fieldset_options(Company, fieldset) if fieldset else ()
+
     def __repr__(self):
         return f'<Company {self.name}>'
 
-    def to_dict(self):
+    def to_dict(self, fieldset=None):
+        if fieldset is not None:
+            return fieldset_dict(self, fieldset)
         return {
             'id': self.id,
             'name': self.name,
@@ -34,6 +45,6 @@ class Company(db.Model):
             'email': self.email,
             'phone': self.phone,
             'tag': self.tag.value if self.tag else None,
-            'created_at': self.created_at.isoformat(),
-            'updated_at': self.updated_at.isoformat()
+            'created_at': self.created_at,
+            'updated_at': self.updated_at
         } 
\ No newline at end of file
@@ -0,0 +1,29 @@
+from datetime import datetime
+from extensions import db
+
+class EmailStatus:
+    PENDING = 'pending'
+    SENT = 'sent'
+    FAILED = 'failed'
+
+class EmailOutbox(db.Model):
+    __tablename__ = 'email_outbox'
+
+    id = db.Column(db.Integer, primary_key=True)
+    subject = db.Column(db.String(200), nullable=False)
+    recipients = db.Column(db.JSON, nullable=False)
+    text_body = db.Column(db.Text, nullable=False)
+    html_body = db.Column(db.Text)
+    status = db.Column(db.String(20), nullable=False, default=EmailStatus.PENDING)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    next_attempt_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    last_error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    sent_at = db.Column(db.DateTime)
+
+    __table_args__ = (
+        db.Index('ix_email_outbox_pending', 'next_attempt_at', 'id', postgresql_where=db.text("status = 'pending'")),
+    )
+
+    def __repr__(self):
+        return f'<EmailOutbox {self.id} {self.status}>'
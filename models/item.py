@@ -1,5 +1,6 @@
 from datetime import datetime
 from extensions import db
+from utils.fieldsets import fieldset_dict, fieldset_options
 
 class Item(db.Model):
     __tablename__ = 'items'
@@ -19,23 +20,37 @@ class Item(db.Model):
 
     __table_args__ = (
         db.UniqueConstraint('sku', 'company_id', name='unique_sku_per_company'),
+        db.Index('ix_items_company_id', 'company_id', 'id'),
     )
 
+    FIELDS = (
+        'id', 'name', 'description', 'price', 'price_unit', 'sku', 'stock',
+        'stock_unit', 'gross_margin', 'company_id', 'created_at', 'updated_at'
+    )
+    INCLUDES = ()
+
+    @staticmethod
+    def serialization_options(fieldset=None):
+        """Opzioni di caricamento per to_dict(fieldset): description solo se richiesta"""
+        return fieldset_options(Item, fieldset) if fieldset else ()
+
     def __repr__(self):
         return f'<Item {self.name}>'
 
-    def to_dict(self):
+    def to_dict(self, fieldset=None):
+        if fieldset is not None:
+            return fieldset_dict(self, fieldset)
         return {
             'id': self.id,
             'name': self.name,
             'description': self.description,
-            'price': float(self.price),
+            'price': self.price,
             'price_unit': self.price_unit,
             'sku': self.sku,
             'stock': self.stock,
             'stock_unit': self.stock_unit,
-            'gross_margin': float(self.gross_margin) if self.gross_margin is not None else None,
+            'gross_margin': self.gross_margin,
             'company_id': self.company_id,
-            'created_at': self.created_at.isoformat(),
-            'updated_at': self.updated_at.isoformat()
+            'created_at': self.created_at,
+            'updated_at': self.updated_at
         } 
\ No newline at end of file
@@ -1,5 +1,9 @@
 from datetime import datetime
+from sqlalchemy.orm import joinedload, selectinload
 from extensions import db
+from models.company import Company
+from models.item import Item
+from utils.fieldsets import fieldset_dict, fieldset_options
 
 class PurchaseStatus:
     PENDING = 'pending'
@@ -22,21 +26,61 @@ class Purchase(db.Model):
     company = db.relationship('Company', backref='purchases')
     items = db.relationship('PurchaseItem', backref='purchase', cascade='all, delete-orphan')
 
+    __table_args__ = (
+        db.Index('ix_purchases_active_date', 'date', postgresql_where=db.text("status <> 'cancelled'")),
+        db.Index('ix_purchases_date_id', 'date', 'id'),
+        db.Index('ix_purchases_company_id_date_id', 'company_id', 'date', 'id'),
+    )
+
+    # company_name è letto dall'azienda, caricata in join solo se richiesto
+    FIELDS = (
+        'id', 'company_id', 'company_name', 'date', 'status', 'total_amount',
+        'notes', 'created_at', 'updated_at'
+    )
+    INCLUDES = ('company', 'items')
+
+    @staticmethod
+    def serialization_options(collection_loader=selectinload, fieldset=None):
+        """Opzioni di caricamento eager per to_dict(fieldset), come Sale.serialization_options"""
+        if fieldset is None:
+            return (
+                joinedload(Purchase.company),
+                collection_loader(Purchase.items).joinedload(PurchaseItem.item),
+            )
+        company_name = 'company_name' in fieldset.fields
+        options = fieldset_options(Purchase, fieldset, Purchase.date, loaded=('company',) if company_name else ())
+        if 'company' in fieldset.include:
+            options.append(joinedload(Purchase.company))
+        elif company_name:
+            options.append(joinedload(Purchase.company).load_only(Company.name))
+        if 'items' in fieldset.include:
+            options.append(collection_loader(Purchase.items).joinedload(PurchaseItem.item).load_only(Item.name, Item.sku))
+        return options
+
     def __repr__(self):
         return f'<Purchase {self.id} from {self.company.name}>'
 
-    def to_dict(self):
+    def to_dict(self, fieldset=None):
+        if fieldset is not None:
+            data = fieldset_dict(self, fieldset)
+            if 'company_name' in fieldset.fields:
+                data['company_name'] = self.company.name
+            if 'company' in fieldset.include:
+                data['company'] = self.company.to_dict()
+            if 'items' in fieldset.include:
+                data['items'] = [item.to_dict() for item in self.items]
+            return data
         return {
             'id': self.id,
             'company_id': self.company_id,
             'company_name': self.company.name,
-            'date': self.date.isoformat(),
+            'date': self.date,
             'status': self.status,
-            'total_amount': float(self.total_amount),
+            'total_amount': self.total_amount,
             'notes': self.notes,
             'items': [item.to_dict() for item in self.items],
-            'created_at': self.created_at.isoformat(),
-            'updated_at': self.updated_at.isoformat()
+            'created_at': self.created_at,
+            'updated_at': self.updated_at
         }
 
 class PurchaseItem(db.Model):
@@ -51,6 +95,11 @@ class PurchaseItem(db.Model):
 
     item = db.relationship('Item')
 
+    __table_args__ = (
+        db.Index('ix_purchase_items_purchase_id', 'purchase_id'),
+        db.Index('ix_purchase_items_item_id', 'item_id'),
+    )
+
     def __repr__(self):
         return f'<PurchaseItem {self.item.name} x{self.quantity}>'
 
@@ -61,6 +110,6 @@ class PurchaseItem(db.Model):
             'item_name': self.item.name,
             'item_sku': self.item.sku,
             'quantity': self.quantity,
-            'unit_price': float(self.unit_price),
-            'total_price': float(self.total_price)
+            'unit_price': self.unit_price,
+            'total_price': self.total_price
         } 
\ No newline at end of file
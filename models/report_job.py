@@ -0,0 +1,50 @@
+from datetime import datetime
+from extensions import db
+
+class ReportJobStatus:
+    PENDING = 'pending'
+    RUNNING = 'running'
+    SUCCEEDED = 'succeeded'
+    FAILED = 'failed'
+
+class ReportJob(db.Model):
+    __tablename__ = 'report_jobs'
+
+    id = db.Column(db.String(32), primary_key=True)
+    report = db.Column(db.String(50), nullable=False)
+    params = db.Column(db.JSON, nullable=False)
+    dedupe_key = db.Column(db.String(64), nullable=False)
+    status = db.Column(db.String(20), nullable=False, default=ReportJobStatus.PENDING)
+    stage = db.Column(db.String(20), nullable=False, default='queued')
+    result = db.Column(db.Text)
+    error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime)
+    heartbeat_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+    expires_at = db.Column(db.DateTime)
+
+    __table_args__ = (
+        # Un solo job in coda o in esecuzione per report e parametri
+        db.Index('ix_report_jobs_in_flight', 'dedupe_key', unique=True,
+                 postgresql_where=db.text("status IN ('pending', 'running')")),
+        db.Index('ix_report_jobs_pending', 'created_at', postgresql_where=db.text("status = 'pending'")),
+        db.Index('ix_report_jobs_expires_at', 'expires_at'),
+    )
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'report': self.report,
+            'params': self.params,
+            'status': self.status,
+            'stage': self.stage,
+            'error': self.error,
+            'created_at': self.created_at,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at,
+            'expires_at': self.expires_at
+        }
+
+    def __repr__(self):
+        return f'<ReportJob {self.id} {self.report} {self.status}>'
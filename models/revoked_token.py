@@ -0,0 +1,19 @@
+from extensions import db
+
+class RevokedToken(db.Model):
+    __tablename__ = 'revoked_tokens'
+
+    id = db.Column(db.Integer, primary_key=True)
+    jti = db.Column(db.String(36), nullable=False, unique=True)
+    user_id = db.Column(db.Integer)
+    expires_at = db.Column(db.DateTime, nullable=False)
+    # Orologio del database, lo stesso con cui IdentityCache.sync() legge le revoche recenti
+    revoked_at = db.Column(db.DateTime, server_default=db.func.timezone('UTC', db.func.now()))
+
+    __table_args__ = (
+        db.Index('ix_revoked_tokens_expires_at', 'expires_at'),
+        db.Index('ix_revoked_tokens_revoked_at', 'revoked_at'),
+    )
+
+    def __repr__(self):
+        return f'<RevokedToken {self.jti}>'
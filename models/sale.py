@@ -1,5 +1,10 @@
 from datetime import datetime
+from sqlalchemy import func, select
+from sqlalchemy.orm import joinedload, selectinload
 from extensions import db
+from models.company import Company
+from models.item import Item
+from utils.fieldsets import fieldset_dict, fieldset_options
 
 class SaleStatus:
     PENDING = 'pending'
@@ -28,25 +33,87 @@ class Sale(db.Model):
 
     items = db.relationship('SaleItem', backref='sale', cascade='all, delete-orphan')
 
+    __table_args__ = (
+        db.Index('ix_sales_active_date', 'date', postgresql_where=db.text("status <> 'cancelled'")),
+        db.Index('ix_sales_date_id', 'date', 'id'),
+        db.Index('ix_sales_status_date_id', 'status', 'date', 'id'),
+        db.Index('ix_sales_customer_email_date_id', 'customer_email', 'date', 'id'),
+        db.Index('ix_sales_company_id_date_id', 'company_id', 'date', 'id'),
+    )
+
+    FIELDS = (
+        'id', 'customer_name', 'customer_email', 'customer_address', 'customer_phone', 'date',
+        'status', 'total_amount', 'notes', 'company_id', 'created_at', 'updated_at'
+    )
+    INCLUDES = ('company', 'items')
+
+    @staticmethod
+    def serialization_options(collection_loader=selectinload, fieldset=None):
+        """Opzioni di caricamento per to_dict(fieldset) senza lazy load.
+
+        L'azienda è caricata in join, le righe con i relativi item con
+        collection_loader: selectinload per le liste (una query aggiuntiva
+        per pagina), joinedload per il dettaglio (una sola query). Con un
+        fieldset si leggono solo le colonne richieste, più date per la
+        paginazione, e solo le relazioni incluse.
+        """
+        if fieldset is None:
+            return (
+                joinedload(Sale.company),
+                collection_loader(Sale.items).joinedload(SaleItem.item),
+            )
+        options = fieldset_options(Sale, fieldset, Sale.date)
+        if 'company' in fieldset.include:
+            options.append(joinedload(Sale.company))
+        if 'items' in fieldset.include:
+            options.append(collection_loader(Sale.items).joinedload(SaleItem.item).load_only(Item.name, Item.sku))
+        return options
+
+    @staticmethod
+    def version_column(fieldset=None):
+        """Espressione SQL della versione di una vendita per ETag e Last-Modified.
+
+        È l'updated_at più recente tra la vendita e quanto to_dict(fieldset)
+        incorpora: l'azienda e gli item delle righe.
+        """
+        parts = [Sale.updated_at]
+        if fieldset is None or 'company' in fieldset.include:
+            parts.append(select(Company.updated_at).where(Company.id == Sale.company_id).scalar_subquery())
+        if fieldset is None or 'items' in fieldset.include:
+            parts.append(
+                select(func.max(Item.updated_at))
+                .join(SaleItem, SaleItem.item_id == Item.id)
+                .where(SaleItem.sale_id == Sale.id)
+                .scalar_subquery()
+            )
+        return func.greatest(*parts) if len(parts) > 1 else parts[0]
+
     def __repr__(self):
         return f'<Sale {self.id} to {self.customer_name}>'
 
-    def to_dict(self):
+    def to_dict(self, fieldset=None):
+        if fieldset is not None:
+            data = fieldset_dict(self, fieldset)
+            if 'company' in fieldset.include:
+                data['company'] = self.company.to_dict() if self.company else None
+            if 'items' in fieldset.include:
+                data['items'] = [item.to_dict() for item in self.items]
+            return data
         return {
             'id': self.id,
             'customer_name': self.customer_name,
             'customer_email': self.customer_email,
             'customer_address': self.customer_address,
             'customer_phone': self.customer_phone,
-            'date': self.date.isoformat(),
+            'date': self.date,
             'status': self.status,
-            'total_amount': float(self.total_amount),
+            'total_amount': self.total_amount,
             'notes': self.notes,
             'company_id': self.company_id,
             'company': self.company.to_dict() if self.company else None,
             'items': [item.to_dict() for item in self.items],
-            'created_at': self.created_at.isoformat(),
-            'updated_at': self.updated_at.isoformat()
+            'created_at': self.created_at,
+            'updated_at': self.updated_at
         }
 
 class SaleItem(db.Model):
@@ -61,6 +128,11 @@ class SaleItem(db.Model):
 
     item = db.relationship('Item')
 
+    __table_args__ = (
+        db.Index('ix_sale_items_sale_id', 'sale_id'),
+        db.Index('ix_sale_items_item_id', 'item_id'),
+    )
+
     def __repr__(self):
         return f'<SaleItem {self.item.name} x{self.quantity}>'
 
@@ -71,6 +143,6 @@ class SaleItem(db.Model):
             'item_name': self.item.name,
             'item_sku': self.item.sku,
             'quantity': self.quantity,
-            'unit_price': float(self.unit_price),
-            'total_price': float(self.total_price)
+            'unit_price': self.unit_price,
+            'total_price': self.total_price
         } 
\ No newline at end of file
@@ -0,0 +1,31 @@
+from extensions import db
+from models.sale import SaleStatus
+
+class SaleStatusBucket:
+    PENDING = 'pending'
+    CONFIRMED = 'confirmed'
+    CANCELLED = 'cancelled'
+
+def status_bucket(status):
+    """Raggruppa lo stato di una vendita nel bucket usato dalla rollup"""
+    if status == SaleStatus.CANCELLED:
+        return SaleStatusBucket.CANCELLED
+    if status == SaleStatus.PENDING:
+        return SaleStatusBucket.PENDING
+    return SaleStatusBucket.CONFIRMED
+
+class SalesDailyItemAgg(db.Model):
+    __tablename__ = 'sales_daily_item_agg'
+
+    day = db.Column(db.Date, primary_key=True)
+    company_id = db.Column(db.Integer, db.ForeignKey('companies.id'), primary_key=True)
+    item_id = db.Column(db.Integer, db.ForeignKey('items.id'), primary_key=True)
+    status_bucket = db.Column(db.String(20), primary_key=True)
+    quantity = db.Column(db.Integer, nullable=False, default=0)
+    revenue = db.Column(db.Numeric(14, 2), nullable=False, default=0)
+    order_count = db.Column(db.Integer, nullable=False, default=0)
+    line_count = db.Column(db.Integer, nullable=False, default=0)
+    unit_price_sum = db.Column(db.Numeric(14, 2), nullable=False, default=0)
+
+    def __repr__(self):
+        return f'<SalesDailyItemAgg {self.day} item {self.item_id} {self.status_bucket}>'
@@ -1,5 +1,7 @@
+from sqlalchemy.orm import joinedload
 from extensions import db
-from werkzeug.security import generate_password_hash, check_password_hash
+from utils.fieldsets import fieldset_dict, fieldset_options
+from utils.passwords import password_hasher
 from enum import Enum
 
 class UserRole(Enum):
@@ -18,19 +20,39 @@ class User(db.Model):
     last_name = db.Column(db.String(50))
     role = db.Column(db.Enum(UserRole), nullable=False, default=UserRole.BASIC)
     is_active = db.Column(db.Boolean, default=True)
-    created_at = db.Column(db.DateTime, server_default=db.func.now())
-    updated_at = db.Column(db.DateTime, server_default=db.func.now(), server_onupdate=db.func.now())
+    # UTC come gli updated_at scritti con datetime.utcnow dagli altri modelli
+    created_at = db.Column(db.DateTime, server_default=db.func.timezone('UTC', db.func.now()))
+    updated_at = db.Column(db.DateTime, server_default=db.func.timezone('UTC', db.func.now()),
+                           onupdate=db.func.timezone('UTC', db.func.now()))
     
     company_id = db.Column(db.Integer, db.ForeignKey('companies.id'))
     company = db.relationship('Company', backref=db.backref('users', lazy=True))
 
+    FIELDS = ('id', 'email', 'first_name', 'last_name', 'role', 'company_id', 'is_active', 'created_at', 'updated_at')
+    INCLUDES = ('company',)
+
+    @staticmethod
+    def serialization_options(fieldset=None):
+        """Opzioni di caricamento per to_dict(fieldset); l'azienda è caricata in join solo se serializzata"""
+        if fieldset is None:
+            return (joinedload(User.company),)
+        options = fieldset_options(User, fieldset)
+        if 'company' in fieldset.include:
+            options.append(joinedload(User.company))
+        return options
+
     def set_password(self, password):
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = password_hasher.hash(password)
 
     def check_password(self, password):
-        return check_password_hash(self.password_hash, password)
+        return password_hasher.check(self.password_hash, password)
 
-    def to_dict(self):
+    def to_dict(self, fieldset=None):
+        if fieldset is not None:
+            data = fieldset_dict(self, fieldset)
+            if 'company' in fieldset.include:
+                data['company'] = self.company.to_dict() if self.company else None
+            return data
         return {
             'id': self.id,
             'email': self.email,
@@ -40,6 +62,6 @@ class User(db.Model):
             'company_id': self.company_id,
             'company': self.company.to_dict() if self.company else None,
             'is_active': self.is_active,
-            'created_at': self.created_at.isoformat() if self.created_at else None,
-            'updated_at': self.updated_at.isoformat() if self.updated_at else None
+            'created_at': self.created_at,
+            'updated_at': self.updated_at
         } 
\ No newline at end of file
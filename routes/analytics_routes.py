@@ -1,11 +1,16 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, current_app, request, jsonify, url_for
 from datetime import datetime
-from analytics.sales_analytics import SalesAnalytics
+from analytics.sales_analytics import RECENT_PERIOD_DAYS, TREND_PERIOD_DAYS, SalesAnalytics
+from analytics.cache import analytics_cache
+from utils.admission import AdmissionRejected, admission, date_span_cost
+from utils.report_jobs import ReportQueueFull, parse_report, report_jobs
+from models.report_job import ReportJobStatus
 from http import HTTPStatus
 
 analytics_bp = Blueprint('analytics', __name__)
 
 @analytics_bp.route('/analytics/sales', methods=['GET'])
+@admission.limit(cost=date_span_cost(RECENT_PERIOD_DAYS))
 def get_sales_analytics():
     try:
         start_date = request.args.get('start_date')
@@ -20,18 +25,24 @@ def get_sales_analytics():
         return jsonify(result)
     except ValueError as e:
         return jsonify({'error': 'Formato data non valido'}), HTTPStatus.BAD_REQUEST
+    except AdmissionRejected:
+        raise
     except Exception as e:
         return jsonify({'error': str(e)}), HTTPStatus.INTERNAL_SERVER_ERROR
 
 @analytics_bp.route('/analytics/inventory', methods=['GET'])
+@admission.limit()
 def get_inventory_analytics():
     try:
         result = SalesAnalytics.get_inventory_analysis()
         return jsonify(result)
+    except AdmissionRejected:
+        raise
     except Exception as e:
         return jsonify({'error': str(e)}), HTTPStatus.INTERNAL_SERVER_ERROR
 
 @analytics_bp.route('/analytics/profit', methods=['GET'])
+@admission.limit(cost=date_span_cost(RECENT_PERIOD_DAYS))
 def get_profit_analytics():
     try:
         start_date = request.args.get('start_date')
@@ -46,10 +57,13 @@ def get_profit_analytics():
         return jsonify(result)
     except ValueError as e:
         return jsonify({'error': 'Formato data non valido'}), HTTPStatus.BAD_REQUEST
+    except AdmissionRejected:
+        raise
     except Exception as e:
         return jsonify({'error': str(e)}), HTTPStatus.INTERNAL_SERVER_ERROR
 
 @analytics_bp.route('/analytics/sales/trend', methods=['GET'])
+@admission.limit(cost=date_span_cost(TREND_PERIOD_DAYS))
 def get_sales_trend():
     try:
         start_date = request.args.get('start_date')
@@ -64,10 +78,13 @@ def get_sales_trend():
         return jsonify(result)
     except ValueError as e:
         return jsonify({'error': 'Formato data non valido'}), HTTPStatus.BAD_REQUEST
+    except AdmissionRejected:
+        raise
     except Exception as e:
         return jsonify({'error': str(e)}), HTTPStatus.INTERNAL_SERVER_ERROR
 
 @analytics_bp.route('/analytics/items/top', methods=['GET'])
+@admission.limit(cost=date_span_cost(TREND_PERIOD_DAYS))
 def get_top_items():
     try:
         start_date = request.args.get('start_date')
@@ -83,42 +100,57 @@ def get_top_items():
         return jsonify(result)
     except ValueError as e:
         return jsonify({'error': 'Formato data non valido'}), HTTPStatus.BAD_REQUEST
+    except AdmissionRejected:
+        raise
     except Exception as e:
         return jsonify({'error': str(e)}), HTTPStatus.INTERNAL_SERVER_ERROR
 
 @analytics_bp.route('/analytics/dashboard/metrics', methods=['GET'])
+@admission.limit()
 def get_dashboard_metrics():
     try:
         result = SalesAnalytics.get_dashboard_metrics()
         return jsonify(result)
+    except AdmissionRejected:
+        raise
     except Exception as e:
         return jsonify({'error': str(e)}), HTTPStatus.INTERNAL_SERVER_ERROR
 
 @analytics_bp.route('/analytics/dashboard/hourly', methods=['GET'])
+@admission.limit()
 def get_hourly_profit_sales():
     try:
         result = SalesAnalytics.get_hourly_profit_sales()
         return jsonify(result)
+    except AdmissionRejected:
+        raise
     except Exception as e:
         return jsonify({'error': str(e)}), HTTPStatus.INTERNAL_SERVER_ERROR
 
 @analytics_bp.route('/analytics/dashboard/brands/sales', methods=['GET'])
+@admission.limit(cost=2)
 def get_sales_by_brand():
     try:
         result = SalesAnalytics.get_sales_by_brand()
         return jsonify(result)
+    except AdmissionRejected:
+        raise
     except Exception as e:
         return jsonify({'error': str(e)}), HTTPStatus.INTERNAL_SERVER_ERROR
 
 @analytics_bp.route('/analytics/dashboard/brands/popularity', methods=['GET'])
+@admission.limit(cost=2)
 def get_brand_popularity():
     try:
         result = SalesAnalytics.get_brand_popularity()
         return jsonify(result)
+    except AdmissionRejected:
+        raise
     except Exception as e:
         return jsonify({'error': str(e)}), HTTPStatus.INTERNAL_SERVER_ERROR
 
 @analytics_bp.route('/analytics/dashboard/brands/average-sales', methods=['GET'])
+@admission.limit(cost=2)
 def get_brand_average_sales():
     try:
         period = request.args.get('period', 'monthly')
@@ -127,5 +159,58 @@ def get_brand_average_sales():
         
         result = SalesAnalytics.get_brand_average_sales(period)
         return jsonify(result)
+    except AdmissionRejected:
+        raise
     except Exception as e:
-        return jsonify({'error': str(e)}), HTTPStatus.INTERNAL_SERVER_ERROR 
\ No newline at end of file
+        return jsonify({'error': str(e)}), HTTPStatus.INTERNAL_SERVER_ERROR
+
+@analytics_bp.route('/analytics/cache/stats', methods=['GET'])
+def get_cache_stats():
+    return jsonify(analytics_cache.stats())
+
+@analytics_bp.route('/analytics/admission/stats', methods=['GET'])
+def get_admission_stats():
+    return jsonify(admission.stats())
+
+@analytics_bp.route('/analytics/jobs', methods=['POST'])
+def create_report_job():
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({'error': 'Dati mancanti'}), HTTPStatus.BAD_REQUEST
+    try:
+        report, params = parse_report(data)
+        job, created = report_jobs.submit(report, params)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), HTTPStatus.BAD_REQUEST
+    except ReportQueueFull:
+        response = jsonify({'error': 'Troppi report in coda, riprovare tra poco'})
+        response.headers['Retry-After'] = str(current_app.config['ANALYTICS_RETRY_AFTER'])
+        return response, HTTPStatus.SERVICE_UNAVAILABLE
+
+    response = jsonify({**report_jobs.describe(job), 'deduplicated': not created})
+    response.headers['Location'] = url_for('analytics.get_report_job', job_id=job.id)
+    return response, HTTPStatus.ACCEPTED
+
+@analytics_bp.route('/analytics/jobs/<job_id>', methods=['GET'])
+def get_report_job(job_id):
+    job = report_jobs.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Job non trovato o scaduto'}), HTTPStatus.NOT_FOUND
+    data = report_jobs.describe(job)
+    if job.status == ReportJobStatus.SUCCEEDED:
+        data['result_url'] = url_for('analytics.get_report_job_result', job_id=job.id)
+    return jsonify(data)
+
+@analytics_bp.route('/analytics/jobs/<job_id>/result', methods=['GET'])
+def get_report_job_result(job_id):
+    job = report_jobs.get(job_id, with_result=True)
+    if job is None:
+        return jsonify({'error': 'Job non trovato o scaduto'}), HTTPStatus.NOT_FOUND
+    if job.status != ReportJobStatus.SUCCEEDED:
+        return jsonify({'error': f'Risultato non disponibile, stato del job: {job.status}', 'status': job.status}), HTTPStatus.CONFLICT
+    # Il risultato è già JSON: nessuna deserializzazione
+    return current_app.response_class(job.result, mimetype='application/json')
+
+@analytics_bp.route('/analytics/jobs/stats', methods=['GET'])
+def get_report_job_stats():
+    return jsonify(report_jobs.stats())
@@ -1,9 +1,10 @@
 from flask import Blueprint, request, jsonify
-from flask_jwt_extended import create_access_token, jwt_required, get_jwt_identity
+from flask_jwt_extended import create_access_token, jwt_required, get_jwt, get_jwt_identity
 from extensions import db
 from models.user import User, UserRole
-from datetime import timedelta
-from utils.email import send_welcome_email
+from datetime import datetime, timedelta
+from utils.email import send_welcome_email, email_dispatcher
+from utils.identity import identity_cache
 
 auth_bp = Blueprint('auth', __name__)
 
@@ -26,9 +27,9 @@ def register():
     user.set_password(data['password'])
     
     db.session.add(user)
-    db.session.commit()
-    
     send_welcome_email(user)
+    db.session.commit()
+    email_dispatcher.wake()
     
     return jsonify({'message': 'User registered successfully'}), 201
 
@@ -60,10 +61,18 @@ def login():
 @auth_bp.route('/me', methods=['GET'])
 @jwt_required()
 def get_current_user():
-    user_id = get_jwt_identity()
-    user = User.query.get(user_id)
+    user = identity_cache.get_user(get_jwt_identity())
     
     if not user:
         return jsonify({'error': 'User not found'}), 404
     
-    return jsonify(user.to_dict()), 200 
\ No newline at end of file
+    return jsonify(user), 200
+
+@auth_bp.route('/logout', methods=['POST'])
+@jwt_required()
+def logout():
+    token = get_jwt()
+    identity_cache.revoke(token['jti'], datetime.utcfromtimestamp(token['exp']), get_jwt_identity())
+    db.session.commit()
+    
+    return jsonify({'message': 'Logged out successfully'}), 200 
\ No newline at end of file
@@ -1,6 +1,10 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, abort, request, jsonify
 from models.company import Company, CompanyTag
 from extensions import db
+from analytics.cache import analytics_cache
+from utils.pagination import paginate
+from utils.fieldsets import parse_fieldset
+from utils.conditional import page_validator, row_validator
 from http import HTTPStatus
 
 company_bp = Blueprint('company', __name__)
@@ -26,6 +30,7 @@ def create_company():
         
         db.session.add(company)
         db.session.commit()
+        analytics_cache.bump_version()
         return jsonify(company.to_dict()), HTTPStatus.CREATED
     except Exception as e:
         db.session.rollback()
@@ -33,13 +38,32 @@ def create_company():
 
 @company_bp.route('/companies', methods=['GET'])
 def get_companies():
-    companies = Company.query.all()
-    return jsonify([company.to_dict() for company in companies])
+    try:
+        fieldset = parse_fieldset(Company)
+        validator = page_validator(Company.query, (Company.id,), Company.updated_at)
+        if validator.not_modified():
+            return validator.not_modified_response()
+        companies, page = paginate(Company.query.options(*Company.serialization_options(fieldset)), (Company.id,), total=validator.total)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), HTTPStatus.BAD_REQUEST
+    
+    return validator.apply(jsonify({'data': [company.to_dict(fieldset) for company in companies], **page}))
 
 @company_bp.route('/companies/<int:company_id>', methods=['GET'])
 def get_company(company_id):
-    company = Company.query.get_or_404(company_id)
-    return jsonify(company.to_dict())
+    try:
+        fieldset = parse_fieldset(Company)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), HTTPStatus.BAD_REQUEST
+    
+    validator = row_validator(Company, company_id)
+    if validator is None:
+        abort(HTTPStatus.NOT_FOUND)
+    if validator.not_modified():
+        return validator.not_modified_response()
+    
+    company = Company.query.options(*Company.serialization_options(fieldset)).get_or_404(company_id)
+    return validator.apply(jsonify(company.to_dict(fieldset)))
 
 @company_bp.route('/companies/<int:company_id>', methods=['PUT'])
 def update_company(company_id):
@@ -52,6 +76,7 @@ def update_company(company_id):
                 setattr(company, key, value)
         
         db.session.commit()
+        analytics_cache.bump_version()
         return jsonify(company.to_dict())
     except Exception as e:
         db.session.rollback()
@@ -63,6 +88,7 @@ def delete_company(company_id):
     try:
         db.session.delete(company)
         db.session.commit()
+        analytics_cache.bump_version()
         return '', HTTPStatus.NO_CONTENT
     except Exception as e:
         db.session.rollback()
@@ -0,0 +1,138 @@
+from flask import Blueprint, Response, request, jsonify, send_file, stream_with_context
+from datetime import datetime, timedelta
+from utils.export import parquet_file, stream_copy
+from http import HTTPStatus
+
+export_bp = Blueprint('export', __name__)
+
+# (colonna, espressione SQL, tipo Arrow) nell'ordine del file esportato
+SALE_COLUMNS = [
+    ('sale_id', 's.id', 'int64'),
+    ('date', 's.date', 'timestamp'),
+    ('status', 's.status', 'string'),
+    ('customer_name', 's.customer_name', 'string'),
+    ('customer_email', 's.customer_email', 'string'),
+    ('company_id', 's.company_id', 'int64'),
+    ('item_id', 'si.item_id', 'int64'),
+    ('sku', 'i.sku', 'string'),
+    ('item_name', 'i.name', 'string'),
+    ('quantity', 'si.quantity', 'int64'),
+    ('unit_price', 'si.unit_price', 'decimal'),
+    ('total_price', 'si.total_price', 'decimal'),
+    ('sale_total', 's.total_amount', 'decimal'),
+]
+
+PURCHASE_COLUMNS = [
+    ('purchase_id', 'p.id', 'int64'),
+    ('date', 'p.date', 'timestamp'),
+    ('status', 'p.status', 'string'),
+    ('company_id', 'p.company_id', 'int64'),
+    ('item_id', 'pi.item_id', 'int64'),
+    ('sku', 'i.sku', 'string'),
+    ('item_name', 'i.name', 'string'),
+    ('quantity', 'pi.quantity', 'int64'),
+    ('unit_price', 'pi.unit_price', 'decimal'),
+    ('total_price', 'pi.total_price', 'decimal'),
+    ('purchase_total', 'p.total_amount', 'decimal'),
+]
+
+EXPORTS = {
+    'sales': {
+        'columns': SALE_COLUMNS,
+        'from': 'sales s JOIN sale_items si ON si.sale_id = s.id JOIN items i ON i.id = si.item_id',
+        'alias': 's',
+        'order': 's.date, s.id, si.id'
+    },
+    'purchases': {
+        'columns': PURCHASE_COLUMNS,
+        'from': 'purchases p JOIN purchase_items pi ON pi.purchase_id = p.id JOIN items i ON i.id = pi.item_id',
+        'alias': 'p',
+        'order': 'p.date, p.id, pi.id'
+    }
+}
+
+def _arrow_schema(columns):
+    import pyarrow as pa
+
+    types = {
+        'int64': pa.int64(),
+        'timestamp': pa.timestamp('us'),
+        'string': pa.string(),
+        'decimal': pa.decimal128(10, 2)
+    }
+    return pa.schema([(name, types[kind]) for name, _, kind in columns])
+
+def _export_query(name):
+    """SELECT dell'export con i filtri della richiesta; solleva ValueError su parametri non validi"""
+    export = EXPORTS[name]
+    alias = export['alias']
+    conditions = []
+    params = {}
+
+    start_date = request.args.get('start_date')
+    end_date = request.args.get('end_date')
+    try:
+        if start_date:
+            params['start_date'] = datetime.strptime(start_date, '%Y-%m-%d')
+            conditions.append(f'{alias}.date >= %(start_date)s')
+        if end_date:
+            # end_date è incluso per intero
+            params['end_date'] = datetime.strptime(end_date, '%Y-%m-%d') + timedelta(days=1)
+            conditions.append(f'{alias}.date < %(end_date)s')
+    except ValueError:
+        raise ValueError('Formato data non valido')
+
+    company_id = request.args.get('company_id', type=int)
+    if company_id:
+        params['company_id'] = company_id
+        conditions.append(f'{alias}.company_id = %(company_id)s')
+
+    status = request.args.get('status')
+    if status:
+        params['status'] = status
+        conditions.append(f'{alias}.status = %(status)s')
+
+    select = ', '.join(f'{expression} AS {column}' for column, expression, _ in export['columns'])
+    where = f'WHERE {" AND ".join(conditions)}' if conditions else ''
+    return f'SELECT {select} FROM {export["from"]} {where} ORDER BY {export["order"]}', params
+
+def _export(name, file_format):
+    try:
+        sql, params = _export_query(name)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), HTTPStatus.BAD_REQUEST
+
+    filename = f'{name}_{datetime.now():%Y%m%d}.{file_format}'
+
+    if file_format == 'parquet':
+        try:
+            schema = _arrow_schema(EXPORTS[name]['columns'])
+        except ImportError:
+            return jsonify({'error': 'Export Parquet non disponibile: installare pyarrow'}), HTTPStatus.NOT_IMPLEMENTED
+        return send_file(
+            parquet_file(sql, params, schema),
+            mimetype='application/vnd.apache.parquet',
+            as_attachment=True,
+            download_name=filename
+        )
+
+    response = Response(stream_with_context(stream_copy(sql, params)), mimetype='text/csv')
+    response.headers['Content-Disposition'] = f'attachment; filename={filename}'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+@export_bp.route('/exports/sales.csv', methods=['GET'])
+def export_sales_csv():
+    return _export('sales', 'csv')
+
+@export_bp.route('/exports/sales.parquet', methods=['GET'])
+def export_sales_parquet():
+    return _export('sales', 'parquet')
+
+@export_bp.route('/exports/purchases.csv', methods=['GET'])
+def export_purchases_csv():
+    return _export('purchases', 'csv')
+
+@export_bp.route('/exports/purchases.parquet', methods=['GET'])
+def export_purchases_parquet():
+    return _export('purchases', 'parquet')
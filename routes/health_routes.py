@@ -0,0 +1,47 @@
+from flask import Blueprint, current_app, jsonify
+from extensions import db
+from utils.db_pool import pool_stats
+from utils.health import readiness
+from utils.email import email_dispatcher
+from utils.metrics import request_metrics
+from http import HTTPStatus
+
+health_bp = Blueprint('health', __name__)
+
+@health_bp.route('/health', methods=['GET'])
+def health_check():
+    result, _ = readiness.get(current_app)
+    connected = result['database'].get('status') == 'connected'
+    return jsonify({
+        "status": "healthy" if connected else "unhealthy",
+        "database": "connected" if connected else "unavailable",
+        "version": "1.0.0"
+    }), HTTPStatus.OK if connected else HTTPStatus.SERVICE_UNAVAILABLE
+
+@health_bp.route('/health/live', methods=['GET'])
+def liveness():
+    # Solo il processo: un database irraggiungibile non richiede il riavvio del container
+    return jsonify({'status': 'alive'}), HTTPStatus.OK
+
+@health_bp.route('/health/ready', methods=['GET'])
+def readiness_check():
+    ready, checks = readiness.status(current_app)
+    return jsonify({
+        'status': 'ready' if ready else 'not_ready',
+        'checks': checks
+    }), HTTPStatus.OK if ready else HTTPStatus.SERVICE_UNAVAILABLE
+
+@health_bp.route('/health/db-pool', methods=['GET'])
+def db_pool_stats():
+    return jsonify(pool_stats(db.engine)), HTTPStatus.OK
+
+@health_bp.route('/health/email-outbox', methods=['GET'])
+def email_outbox_stats():
+    return jsonify(email_dispatcher.stats()), HTTPStatus.OK
+
+@health_bp.route('/metrics', methods=['GET'])
+def metrics():
+    if not current_app.config['METRICS_ENABLED']:
+        return jsonify({'error': 'Metriche disattivate'}), HTTPStatus.NOT_FOUND
+    body, content_type = request_metrics.generate()
+    return current_app.response_class(body, content_type=content_type)
@@ -1,7 +1,13 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, abort, request, jsonify
 from models.item import Item
 from models.company import Company
 from extensions import db
+from analytics.cache import analytics_cache
+from utils.pagination import paginate
+from utils.fieldsets import parse_fieldset
+from utils.conditional import page_validator, row_validator
+from utils.streaming import stream_json, wants_stream
+from utils.catalog import CatalogError, import_catalog
 from http import HTTPStatus
 
 item_bp = Blueprint('item', __name__)
@@ -34,6 +40,7 @@ def create_item():
     try:
         db.session.add(item)
         db.session.commit()
+        analytics_cache.bump_version()
         return jsonify(item.to_dict()), HTTPStatus.CREATED
     except Exception as e:
         db.session.rollback()
@@ -42,18 +49,72 @@ def create_item():
 @item_bp.route('/items', methods=['GET'])
 def get_items():
     company_id = request.args.get('company_id', type=int)
+    
+    try:
+        fieldset = parse_fieldset(Item)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), HTTPStatus.BAD_REQUEST
+    
     query = Item.query
     
     if company_id:
         query = query.filter_by(company_id=company_id)
     
-    items = query.all()
-    return jsonify([item.to_dict() for item in items])
+    if wants_stream():
+        query = query.options(*Item.serialization_options(fieldset))
+        return stream_json(query.order_by(Item.id), lambda item: item.to_dict(fieldset))
+    
+    try:
+        validator = page_validator(query, (Item.id,), Item.updated_at)
+        if validator.not_modified():
+            return validator.not_modified_response()
+        items, page = paginate(query.options(*Item.serialization_options(fieldset)), (Item.id,), total=validator.total)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), HTTPStatus.BAD_REQUEST
+    
+    return validator.apply(jsonify({'data': [item.to_dict(fieldset) for item in items], **page}))
+
+@item_bp.route('/items/import', methods=['POST'])
+def import_items():
+    company_id = request.args.get('company_id', type=int)
+    if company_id and not Company.query.get(company_id):
+        return jsonify({'error': 'Azienda non trovata'}), HTTPStatus.NOT_FOUND
+    
+    if 'file' in request.files:
+        stream = request.files['file'].stream
+    elif request.mimetype == 'text/csv':
+        stream = request.stream
+    else:
+        return jsonify({'error': 'Inviare il catalogo come file multipart "file" o come corpo text/csv'}), HTTPStatus.BAD_REQUEST
+    
+    try:
+        result = import_catalog(stream, company_id)
+        db.session.commit()
+    except CatalogError as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), HTTPStatus.BAD_REQUEST
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), HTTPStatus.INTERNAL_SERVER_ERROR
+    
+    analytics_cache.bump_version()
+    return jsonify(result)
 
 @item_bp.route('/items/<int:item_id>', methods=['GET'])
 def get_item(item_id):
-    item = Item.query.get_or_404(item_id)
-    return jsonify(item.to_dict())
+    try:
+        fieldset = parse_fieldset(Item)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), HTTPStatus.BAD_REQUEST
+    
+    validator = row_validator(Item, item_id)
+    if validator is None:
+        abort(HTTPStatus.NOT_FOUND)
+    if validator.not_modified():
+        return validator.not_modified_response()
+    
+    item = Item.query.options(*Item.serialization_options(fieldset)).get_or_404(item_id)
+    return validator.apply(jsonify(item.to_dict(fieldset)))
 
 @item_bp.route('/items/<int:item_id>', methods=['PUT'])
 def update_item(item_id):
@@ -71,6 +132,7 @@ def update_item(item_id):
                 setattr(item, key, value)
         
         db.session.commit()
+        analytics_cache.bump_version()
         return jsonify(item.to_dict())
     except Exception as e:
         db.session.rollback()
@@ -82,6 +144,7 @@ def delete_item(item_id):
     try:
         db.session.delete(item)
         db.session.commit()
+        analytics_cache.bump_version()
         return '', HTTPStatus.NO_CONTENT
     except Exception as e:
         db.session.rollback()
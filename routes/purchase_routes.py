@@ -3,10 +3,19 @@ from models.purchase import Purchase, PurchaseItem, PurchaseStatus
 from models.company import Company
 from models.item import Item
 from extensions import db
+from analytics.cache import analytics_cache
+from utils.pagination import paginate
+from utils.fieldsets import parse_fieldset
+from utils.streaming import stream_json, wants_stream
+from sqlalchemy import insert
+from sqlalchemy.orm import joinedload
+from datetime import datetime
 from http import HTTPStatus
 
 purchase_bp = Blueprint('purchase', __name__)
 
+BULK_MAX_ORDERS = 1000
+
 @purchase_bp.route('/purchases', methods=['POST'])
 def create_purchase():
     data = request.get_json()
@@ -62,6 +71,7 @@ def create_purchase():
         
         db.session.add(purchase)
         db.session.commit()
+        analytics_cache.bump_version()
         
         return jsonify(purchase.to_dict()), HTTPStatus.CREATED
     
@@ -69,29 +79,150 @@ def create_purchase():
         db.session.rollback()
         return jsonify({'error': str(e)}), HTTPStatus.BAD_REQUEST
 
+def _validate_bulk_purchase(order, company_ids, items):
+    """Valida un acquisto del lotto come create_purchase; restituisce (righe, totale, errore)"""
+    if not isinstance(order, dict):
+        return None, None, 'Acquisto non valido'
+    
+    for field in ['company_id', 'items']:
+        if field not in order:
+            return None, None, f'Campo {field} obbligatorio'
+    
+    if order['company_id'] not in company_ids:
+        return None, None, 'Azienda non trovata'
+    
+    status = order.get('status', PurchaseStatus.PENDING)
+    if status not in vars(PurchaseStatus).values():
+        return None, None, 'Stato non valido'
+    
+    if not isinstance(order['items'], list) or not order['items']:
+        return None, None, 'Dati item incompleti'
+    
+    lines = []
+    total_amount = 0
+    for item_data in order['items']:
+        if not isinstance(item_data, dict) or not all(k in item_data for k in ('item_id', 'quantity', 'unit_price')):
+            return None, None, 'Dati item incompleti'
+        
+        item = items.get(item_data['item_id'])
+        if not item:
+            return None, None, f'Item {item_data["item_id"]} non trovato'
+        
+        if item.company_id != order['company_id']:
+            return None, None, f'Item {item_data["item_id"]} non appartiene all\'azienda selezionata'
+        
+        quantity, unit_price = item_data['quantity'], item_data['unit_price']
+        if not isinstance(quantity, int) or quantity <= 0 or not isinstance(unit_price, (int, float)) or unit_price < 0:
+            return None, None, f'Quantità o prezzo non validi per item {item.name}'
+        
+        total_price = quantity * unit_price
+        lines.append((item, quantity, unit_price, total_price))
+        total_amount += total_price
+    
+    return lines, total_amount, None
+
+@purchase_bp.route('/purchases/bulk', methods=['POST'])
+def create_purchases_bulk():
+    data = request.get_json()
+    orders = data.get('purchases') if isinstance(data, dict) else None
+    
+    if not isinstance(orders, list) or not orders:
+        return jsonify({'error': 'Campo purchases obbligatorio'}), HTTPStatus.BAD_REQUEST
+    if len(orders) > BULK_MAX_ORDERS:
+        return jsonify({'error': f'Massimo {BULK_MAX_ORDERS} acquisti per richiesta'}), HTTPStatus.BAD_REQUEST
+    
+    requested_companies = {o.get('company_id') for o in orders if isinstance(o, dict) and isinstance(o.get('company_id'), int)}
+    requested_items = {
+        line.get('item_id')
+        for o in orders if isinstance(o, dict) and isinstance(o.get('items'), list)
+        for line in o['items'] if isinstance(line, dict) and isinstance(line.get('item_id'), int)
+    }
+    
+    company_ids = {row.id for row in db.session.query(Company.id).filter(Company.id.in_(requested_companies))}
+    items = {item.id: item for item in Item.query.filter(Item.id.in_(requested_items))}
+    
+    valid = []
+    errors = []
+    for index, order in enumerate(orders):
+        lines, total_amount, error = _validate_bulk_purchase(order, company_ids, items)
+        if error:
+            errors.append({'index': index, 'error': error})
+        else:
+            valid.append((index, order, lines, total_amount))
+    
+    if not valid:
+        return jsonify({'created': [], 'errors': errors}), HTTPStatus.BAD_REQUEST
+    
+    try:
+        now = datetime.utcnow()
+        purchase_ids = db.session.execute(
+            insert(Purchase).returning(Purchase.id, sort_by_parameter_order=True),
+            [{
+                'company_id': order['company_id'],
+                'date': now,
+                'status': order.get('status', PurchaseStatus.PENDING),
+                'total_amount': total_amount,
+                'notes': order.get('notes')
+            } for _, order, _, total_amount in valid]
+        ).scalars().all()
+        
+        db.session.execute(insert(PurchaseItem), [{
+            'purchase_id': purchase_id,
+            'item_id': item.id,
+            'quantity': quantity,
+            'unit_price': unit_price,
+            'total_price': total_price
+        } for purchase_id, (_, _, lines, _) in zip(purchase_ids, valid) for item, quantity, unit_price, total_price in lines])
+        
+        db.session.commit()
+        analytics_cache.bump_version()
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), HTTPStatus.BAD_REQUEST
+    
+    created = [{'index': index, 'id': purchase_id} for (index, _, _, _), purchase_id in zip(valid, purchase_ids)]
+    return jsonify({'created': created, 'errors': errors}), HTTPStatus.MULTI_STATUS if errors else HTTPStatus.CREATED
+
 @purchase_bp.route('/purchases', methods=['GET'])
 def get_purchases():
     company_id = request.args.get('company_id', type=int)
     status = request.args.get('status')
     
-    query = Purchase.query
+    try:
+        fieldset = parse_fieldset(Purchase)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), HTTPStatus.BAD_REQUEST
+    
+    query = Purchase.query.options(*Purchase.serialization_options(fieldset=fieldset))
     
     if company_id:
         query = query.filter_by(company_id=company_id)
     if status:
         query = query.filter_by(status=status)
     
-    purchases = query.order_by(Purchase.date.desc()).all()
-    return jsonify([purchase.to_dict() for purchase in purchases])
+    if wants_stream():
+        return stream_json(query.order_by(Purchase.date.desc(), Purchase.id.desc()), lambda purchase: purchase.to_dict(fieldset))
+    
+    try:
+        purchases, page = paginate(query, (Purchase.date, Purchase.id), descending=True)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), HTTPStatus.BAD_REQUEST
+    
+    return jsonify({'data': [purchase.to_dict(fieldset) for purchase in purchases], **page})
 
 @purchase_bp.route('/purchases/<int:purchase_id>', methods=['GET'])
 def get_purchase(purchase_id):
-    purchase = Purchase.query.get_or_404(purchase_id)
-    return jsonify(purchase.to_dict())
+    try:
+        fieldset = parse_fieldset(Purchase)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), HTTPStatus.BAD_REQUEST
+    
+    purchase = Purchase.query.options(*Purchase.serialization_options(joinedload, fieldset)).get_or_404(purchase_id)
+    return jsonify(purchase.to_dict(fieldset))
 
 @purchase_bp.route('/purchases/<int:purchase_id>', methods=['PUT'])
 def update_purchase(purchase_id):
-    purchase = Purchase.query.get_or_404(purchase_id)
+    purchase = Purchase.query.options(*Purchase.serialization_options(joinedload)).get_or_404(purchase_id)
     data = request.get_json()
     
     if 'status' in data:
@@ -104,6 +235,7 @@ def update_purchase(purchase_id):
     
     try:
         db.session.commit()
+        analytics_cache.bump_version()
         return jsonify(purchase.to_dict())
     except Exception as e:
         db.session.rollback()
@@ -119,6 +251,7 @@ def delete_purchase(purchase_id):
     try:
         db.session.delete(purchase)
         db.session.commit()
+        analytics_cache.bump_version()
         return '', HTTPStatus.NO_CONTENT
     except Exception as e:
         db.session.rollback()
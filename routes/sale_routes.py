@@ -1,12 +1,23 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, abort, request, jsonify
 from models.sale import Sale, SaleItem, SaleStatus
-from models.item import Item
 from models.company import Company
 from extensions import db
+from analytics.cache import analytics_cache
+from analytics import rollup
+from utils.pagination import paginate
+from utils.fieldsets import parse_fieldset
+from utils.conditional import page_validator, row_validator
+from utils.streaming import stream_json, wants_stream
+from utils import stock
+from sqlalchemy import insert
+from sqlalchemy.orm import joinedload
+from datetime import datetime
 from http import HTTPStatus
 
 sale_bp = Blueprint('sale', __name__)
 
+BULK_MAX_ORDERS = 1000
+
 @sale_bp.route('/sales', methods=['POST'])
 def create_sale():
     data = request.get_json()
@@ -20,14 +31,21 @@ def create_sale():
     if not company:
         return jsonify({'error': f'Azienda {data["company_id"]} non trovata'}), HTTPStatus.NOT_FOUND
     
+    for item_data in data['items']:
+        if not all(k in item_data for k in ('item_id', 'quantity', 'unit_price')):
+            return jsonify({'error': 'Dati item incompleti'}), HTTPStatus.BAD_REQUEST
+    
+    status = data.get('status', SaleStatus.PENDING)
+    items = stock.lock_items(
+        (item_data['item_id'] for item_data in data['items']),
+        for_update=status == SaleStatus.CONFIRMED
+    )
+    
     total_amount = 0
     sale_items = []
     
     for item_data in data['items']:
-        if not all(k in item_data for k in ('item_id', 'quantity', 'unit_price')):
-            return jsonify({'error': 'Dati item incompleti'}), HTTPStatus.BAD_REQUEST
-        
-        item = Item.query.get(item_data['item_id'])
+        item = items.get(item_data['item_id'])
         if not item:
             return jsonify({'error': f'Item {item_data["item_id"]} non trovato'}), HTTPStatus.NOT_FOUND
         
@@ -51,7 +69,7 @@ def create_sale():
             customer_phone=data.get('customer_phone'),
             total_amount=total_amount,
             notes=data.get('notes'),
-            status=data.get('status', SaleStatus.PENDING),
+            status=status,
             company_id=company.id
         )
         
@@ -63,12 +81,20 @@ def create_sale():
                 total_price=item_data['total_price']
             )
             sale.items.append(sale_item)
-            
-            if sale.status == SaleStatus.CONFIRMED:
-                item_data['item'].stock -= item_data['quantity']
+        
+        if sale.status == SaleStatus.CONFIRMED:
+            unavailable = stock.reserve_stock(stock.quantities_by_item(
+                (item_data['item'].id, item_data['quantity']) for item_data in sale_items
+            ))
+            if unavailable:
+                db.session.rollback()
+                return jsonify({'error': f'Quantità non disponibile per item {items[min(unavailable)].name}'}), HTTPStatus.BAD_REQUEST
         
         db.session.add(sale)
+        db.session.flush()
+        rollup.apply_sale(sale)
         db.session.commit()
+        analytics_cache.bump_version()
         
         return jsonify(sale.to_dict()), HTTPStatus.CREATED
     
@@ -76,10 +102,141 @@ def create_sale():
         db.session.rollback()
         return jsonify({'error': str(e)}), HTTPStatus.BAD_REQUEST
 
+def _validate_bulk_sale(order, company_ids, items, available_stock):
+    """Valida un ordine del lotto come create_sale; restituisce (righe, totale, errore)"""
+    if not isinstance(order, dict):
+        return None, None, 'Ordine non valido'
+    
+    for field in ['customer_name', 'items', 'company_id']:
+        if field not in order:
+            return None, None, f'Campo {field} obbligatorio'
+    
+    if order['company_id'] not in company_ids:
+        return None, None, f'Azienda {order["company_id"]} non trovata'
+    
+    status = order.get('status', SaleStatus.PENDING)
+    if status not in vars(SaleStatus).values():
+        return None, None, 'Stato non valido'
+    
+    if not isinstance(order['items'], list) or not order['items']:
+        return None, None, 'Dati item incompleti'
+    
+    lines = []
+    requested = {}
+    total_amount = 0
+    for item_data in order['items']:
+        if not isinstance(item_data, dict) or not all(k in item_data for k in ('item_id', 'quantity', 'unit_price')):
+            return None, None, 'Dati item incompleti'
+        
+        item = items.get(item_data['item_id'])
+        if not item:
+            return None, None, f'Item {item_data["item_id"]} non trovato'
+        
+        quantity, unit_price = item_data['quantity'], item_data['unit_price']
+        if not isinstance(quantity, int) or quantity <= 0 or not isinstance(unit_price, (int, float)) or unit_price < 0:
+            return None, None, f'Quantità o prezzo non validi per item {item.name}'
+        
+        requested[item.id] = requested.get(item.id, 0) + quantity
+        if available_stock[item.id] < requested[item.id]:
+            return None, None, f'Quantità non disponibile per item {item.name}'
+        
+        total_price = quantity * unit_price
+        lines.append((item, quantity, unit_price, total_price))
+        total_amount += total_price
+    
+    if status == SaleStatus.CONFIRMED:
+        for item_id, quantity in requested.items():
+            available_stock[item_id] -= quantity
+    
+    return lines, total_amount, None
+
+@sale_bp.route('/sales/bulk', methods=['POST'])
+def create_sales_bulk():
+    data = request.get_json()
+    orders = data.get('sales') if isinstance(data, dict) else None
+    
+    if not isinstance(orders, list) or not orders:
+        return jsonify({'error': 'Campo sales obbligatorio'}), HTTPStatus.BAD_REQUEST
+    if len(orders) > BULK_MAX_ORDERS:
+        return jsonify({'error': f'Massimo {BULK_MAX_ORDERS} vendite per richiesta'}), HTTPStatus.BAD_REQUEST
+    
+    requested_companies = {o.get('company_id') for o in orders if isinstance(o, dict) and isinstance(o.get('company_id'), int)}
+    requested_items = {
+        line.get('item_id')
+        for o in orders if isinstance(o, dict) and isinstance(o.get('items'), list)
+        for line in o['items'] if isinstance(line, dict) and isinstance(line.get('item_id'), int)
+    }
+    
+    company_ids = {row.id for row in db.session.query(Company.id).filter(Company.id.in_(requested_companies))}
+    any_confirmed = any(isinstance(o, dict) and o.get('status') == SaleStatus.CONFIRMED for o in orders)
+    items = stock.lock_items(requested_items, for_update=any_confirmed)
+    available_stock = {item_id: item.stock for item_id, item in items.items()}
+    
+    valid = []
+    errors = []
+    for index, order in enumerate(orders):
+        lines, total_amount, error = _validate_bulk_sale(order, company_ids, items, available_stock)
+        if error:
+            errors.append({'index': index, 'error': error})
+        else:
+            valid.append((index, order, lines, total_amount))
+    
+    if not valid:
+        return jsonify({'created': [], 'errors': errors}), HTTPStatus.BAD_REQUEST
+    
+    try:
+        now = datetime.utcnow()
+        headers = [{
+            'customer_name': order['customer_name'],
+            'customer_email': order.get('customer_email'),
+            'customer_address': order.get('customer_address'),
+            'customer_phone': order.get('customer_phone'),
+            'date': now,
+            'status': order.get('status', SaleStatus.PENDING),
+            'total_amount': total_amount,
+            'notes': order.get('notes'),
+            'company_id': order['company_id']
+        } for _, order, _, total_amount in valid]
+        
+        sale_ids = db.session.execute(
+            insert(Sale).returning(Sale.id, sort_by_parameter_order=True), headers
+        ).scalars().all()
+        
+        db.session.execute(insert(SaleItem), [{
+            'sale_id': sale_id,
+            'item_id': item.id,
+            'quantity': quantity,
+            'unit_price': unit_price,
+            'total_price': total_price
+        } for sale_id, (_, _, lines, _) in zip(sale_ids, valid) for item, quantity, unit_price, total_price in lines])
+        
+        unavailable = stock.reserve_stock({
+            item_id: items[item_id].stock - available
+            for item_id, available in available_stock.items() if items[item_id].stock != available
+        })
+        if unavailable:
+            raise ValueError(f'Quantità non disponibile per item {items[min(unavailable)].name}')
+        
+        rollup.apply_sales((now, header['status'], lines) for header, (_, _, lines, _) in zip(headers, valid))
+        db.session.commit()
+        analytics_cache.bump_version()
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), HTTPStatus.BAD_REQUEST
+    
+    created = [{'index': index, 'id': sale_id} for (index, _, _, _), sale_id in zip(valid, sale_ids)]
+    return jsonify({'created': created, 'errors': errors}), HTTPStatus.MULTI_STATUS if errors else HTTPStatus.CREATED
+
 @sale_bp.route('/sales', methods=['GET'])
 def get_sales():
     status = request.args.get('status')
     customer_email = request.args.get('customer_email')
+    company_id = request.args.get('company_id', type=int)
+    
+    try:
+        fieldset = parse_fieldset(Sale)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), HTTPStatus.BAD_REQUEST
     
     query = Sale.query
     
@@ -87,18 +244,50 @@ def get_sales():
         query = query.filter_by(status=status)
     if customer_email:
         query = query.filter_by(customer_email=customer_email)
+    if company_id:
+        query = query.filter_by(company_id=company_id)
+    
+    if wants_stream():
+        query = query.options(*Sale.serialization_options(fieldset=fieldset))
+        return stream_json(query.order_by(Sale.date.desc(), Sale.id.desc()), lambda sale: sale.to_dict(fieldset))
     
-    sales = query.order_by(Sale.date.desc()).all()
-    return jsonify([sale.to_dict() for sale in sales])
+    try:
+        validator = page_validator(query, (Sale.date, Sale.id), Sale.version_column(fieldset), descending=True)
+        if validator.not_modified():
+            return validator.not_modified_response()
+        query = query.options(*Sale.serialization_options(fieldset=fieldset))
+        sales, page = paginate(query, (Sale.date, Sale.id), descending=True, total=validator.total)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), HTTPStatus.BAD_REQUEST
+    
+    return validator.apply(jsonify({'data': [sale.to_dict(fieldset) for sale in sales], **page}))
 
 @sale_bp.route('/sales/<int:sale_id>', methods=['GET'])
 def get_sale(sale_id):
-    sale = Sale.query.get_or_404(sale_id)
-    return jsonify(sale.to_dict())
+    try:
+        fieldset = parse_fieldset(Sale)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), HTTPStatus.BAD_REQUEST
+    
+    validator = row_validator(Sale, sale_id, Sale.version_column(fieldset))
+    if validator is None:
+        abort(HTTPStatus.NOT_FOUND)
+    if validator.not_modified():
+        return validator.not_modified_response()
+    
+    sale = Sale.query.options(*Sale.serialization_options(joinedload, fieldset)).get_or_404(sale_id)
+    return validator.apply(jsonify(sale.to_dict(fieldset)))
+
+def _lock_sale(sale_id):
+    # Lo stato si legge dopo il lock della riga: due cambi di stato concorrenti
+    # non possono partire entrambi dallo stesso stato e muovere due volte stock e rollup
+    if db.session.query(Sale.id).filter(Sale.id == sale_id).with_for_update().scalar() is None:
+        abort(HTTPStatus.NOT_FOUND)
 
 @sale_bp.route('/sales/<int:sale_id>', methods=['PUT'])
 def update_sale(sale_id):
-    sale = Sale.query.get_or_404(sale_id)
+    _lock_sale(sale_id)
+    sale = Sale.query.options(*Sale.serialization_options(joinedload)).get_or_404(sale_id)
     data = request.get_json()
     old_status = sale.status
     
@@ -106,15 +295,18 @@ def update_sale(sale_id):
         if data['status'] not in vars(SaleStatus).values():
             return jsonify({'error': 'Stato non valido'}), HTTPStatus.BAD_REQUEST
         
+        quantities = stock.quantities_by_item((sale_item.item_id, sale_item.quantity) for sale_item in sale.items)
+        
         if old_status != SaleStatus.CONFIRMED and data['status'] == SaleStatus.CONFIRMED:
-            for sale_item in sale.items:
-                if sale_item.item.stock < sale_item.quantity:
-                    return jsonify({'error': f'Quantità non disponibile per item {sale_item.item.name}'}), HTTPStatus.BAD_REQUEST
-                sale_item.item.stock -= sale_item.quantity
+            items = stock.lock_items(quantities)
+            unavailable = stock.reserve_stock(quantities)
+            if unavailable:
+                db.session.rollback()
+                return jsonify({'error': f'Quantità non disponibile per item {items[min(unavailable)].name}'}), HTTPStatus.BAD_REQUEST
         
         elif old_status == SaleStatus.CONFIRMED and data['status'] == SaleStatus.CANCELLED:
-            for sale_item in sale.items:
-                sale_item.item.stock += sale_item.quantity
+            stock.lock_items(quantities)
+            stock.release_stock(quantities)
         
         sale.status = data['status']
     
@@ -123,7 +315,9 @@ def update_sale(sale_id):
             setattr(sale, field, data[field])
     
     try:
+        rollup.move_sale(sale, old_status, sale.status)
         db.session.commit()
+        analytics_cache.bump_version()
         return jsonify(sale.to_dict())
     except Exception as e:
         db.session.rollback()
@@ -131,14 +325,17 @@ def update_sale(sale_id):
 
 @sale_bp.route('/sales/<int:sale_id>', methods=['DELETE'])
 def delete_sale(sale_id):
+    _lock_sale(sale_id)
     sale = Sale.query.get_or_404(sale_id)
     
     if sale.status != SaleStatus.PENDING:
         return jsonify({'error': 'Solo le vendite in stato pending possono essere eliminate'}), HTTPStatus.BAD_REQUEST
     
     try:
+        rollup.apply_sale(sale, -1)
         db.session.delete(sale)
         db.session.commit()
+        analytics_cache.bump_version()
         return '', HTTPStatus.NO_CONTENT
     except Exception as e:
         db.session.rollback()
@@ -2,6 +2,10 @@ from flask import Blueprint, request, jsonify
 from models.user import User, UserRole
 from models.company import Company
 from extensions import db
+from utils.pagination import paginate
+from utils.fieldsets import parse_fieldset
+from utils.identity import identity_cache
+from utils.passwords import PasswordHasherBusy
 from http import HTTPStatus
 
 user_bp = Blueprint('user', __name__)
@@ -71,7 +75,11 @@ def update_user(user_id):
             user.is_active = data['is_active']
         
         db.session.commit()
+        identity_cache.invalidate(user_id)
         return jsonify(user.to_dict())
+    except PasswordHasherBusy:
+        db.session.rollback()
+        raise
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': str(e)}), HTTPStatus.INTERNAL_SERVER_ERROR
@@ -83,6 +91,7 @@ def delete_user(user_id):
     try:
         db.session.delete(user)
         db.session.commit()
+        identity_cache.invalidate(user_id)
         return '', HTTPStatus.NO_CONTENT
     except Exception as e:
         db.session.rollback()
@@ -90,10 +99,20 @@ def delete_user(user_id):
 
 @user_bp.route('/users/<int:user_id>', methods=['GET'])
 def get_user(user_id):
-    user = User.query.get_or_404(user_id)
-    return jsonify(user.to_dict())
+    try:
+        fieldset = parse_fieldset(User)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), HTTPStatus.BAD_REQUEST
+    
+    user = User.query.options(*User.serialization_options(fieldset)).get_or_404(user_id)
+    return jsonify(user.to_dict(fieldset))
 
 @user_bp.route('/users', methods=['GET'])
 def get_users():
-    users = User.query.all()
-    return jsonify([user.to_dict() for user in users]) 
\ No newline at end of file
+    try:
+        fieldset = parse_fieldset(User)
+        users, page = paginate(User.query.options(*User.serialization_options(fieldset)), (User.id,))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), HTTPStatus.BAD_REQUEST
+    
+    return jsonify({'data': [user.to_dict(fieldset) for user in users], **page}) 
\ No newline at end of file
@@ -0,0 +1,43 @@
+"""Fixture dei test: applicazione su un database dedicato (TEST_DATABASE_URL).
+
+Le tabelle vengono ricreate a ogni test, quindi non usare il database
+dell'applicazione. Senza TEST_DATABASE_URL i test che usano il database
+sono saltati.
+"""
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+@pytest.fixture
+def app():
+    database_url = os.getenv('TEST_DATABASE_URL')
+    if not database_url:
+        pytest.skip('TEST_DATABASE_URL non impostata')
+    os.environ['DATABASE_URL'] = database_url
+    os.environ['ANALYTICS_CACHE_BACKEND'] = 'none'
+    # Nessun thread o processo in background durante i test
+    os.environ['PASSWORD_HASH_WORKERS'] = '0'
+    os.environ['REPORT_JOB_WORKERS'] = '0'
+    os.environ['EMAIL_WORKERS'] = '0'
+    os.environ['IDENTITY_SYNC_SECONDS'] = '3600'
+    os.environ.setdefault('JWT_SECRET_KEY', 'test')
+
+    from app import create_app
+    from extensions import db
+
+    app = create_app()
+    app.config['TESTING'] = True
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
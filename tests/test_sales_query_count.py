@@ -0,0 +1,79 @@
+"""Numero di statement SQL di GET /api/sales: non deve crescere con le vendite della pagina"""
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+from sqlalchemy import event
+
+from extensions import db
+from models.company import Company, CompanyTag
+from models.item import Item
+from models.sale import Sale, SaleItem, SaleStatus
+
+@contextmanager
+def count_statements(engine):
+    """Statement eseguiti dal thread corrente, esclusi quelli dei thread in background"""
+    statements = []
+    thread = threading.get_ident()
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if threading.get_ident() == thread:
+            statements.append(statement)
+
+    event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, 'before_cursor_execute', before_cursor_execute)
+
+def create_sales(count, items_per_sale=3):
+    company = Company(name='Azienda', vat_number='IT00000000001', email='azienda@example.com',
+                      tag=CompanyTag.CUSTOMER)
+    db.session.add(company)
+    db.session.flush()
+    items = [
+        Item(name=f'Item {i}', sku=f'SKU-{i}', price=10, stock=1000, company_id=company.id)
+        for i in range(items_per_sale)
+    ]
+    db.session.add_all(items)
+    db.session.flush()
+    start = datetime(2024, 1, 1)
+    for i in range(count):
+        sale = Sale(customer_name='Cliente', customer_email=f'cliente{i % 10}@example.com',
+                    total_amount=10 * items_per_sale, date=start + timedelta(minutes=i),
+                    company_id=company.id, status=SaleStatus.CONFIRMED)
+        for item in items:
+            sale.items.append(SaleItem(item=item, quantity=1, unit_price=10, total_price=10))
+        db.session.add(sale)
+    db.session.commit()
+
+def get_sales(client, limit):
+    with count_statements(db.engine) as statements:
+        response = client.get(f'/api/sales?limit={limit}')
+    assert response.status_code == 200
+    return response.get_json(), statements
+
+def warm_up(client):
+    # La prima richiesta del processo carica anche token revocati e identità
+    create_sales(500)
+    db.session.remove()
+    assert client.get('/api/sales?limit=1').status_code == 200
+
+def test_list_sales_statement_count(client):
+    warm_up(client)
+
+    body, statements = get_sales(client, 500)
+
+    assert len(body['data']) == 500
+    assert all(len(sale['items']) == 3 for sale in body['data'])
+    assert all(sale['items'][0]['item_sku'] for sale in body['data'])
+    # Versione della pagina, vendite con azienda, righe con item: niente query per vendita
+    assert len(statements) == 3, statements
+
+def test_list_sales_statement_count_independent_of_page_size(client):
+    warm_up(client)
+
+    _, small = get_sales(client, 5)
+    _, large = get_sales(client, 500)
+
+    assert len(large) == len(small)
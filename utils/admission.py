@@ -0,0 +1,153 @@
+import functools
+import math
+import threading
+from collections import Counter
+from datetime import datetime, timedelta
+from http import HTTPStatus
+from flask import g, has_app_context, jsonify, request
+from analytics.cache import analytics_cache
+from extensions import db
+
+class AdmissionRejected(Exception):
+    """Richiesta analitica rifiutata per mancanza di capacità"""
+
+def date_span_cost(default_days):
+    """Funzione di costo stimato dall'intervallo start_date/end_date della richiesta.
+
+    Una unità ogni ANALYTICS_COST_DAYS giorni. Senza start_date o end_date
+    si usano gli stessi valori del metodo di SalesAnalytics chiamato:
+    default_days giorni fino a oggi. Date non valide costano una unità,
+    tanto la route risponde subito 400.
+    """
+    def cost():
+        now = datetime.now()
+        try:
+            start_date = request.args.get('start_date')
+            end_date = request.args.get('end_date')
+            start = datetime.strptime(start_date, '%Y-%m-%d') if start_date else now - timedelta(days=default_days)
+            end = datetime.strptime(end_date, '%Y-%m-%d') if end_date else now
+        except ValueError:
+            return 1
+        days = max((end - start).days, 0) + 1
+        return math.ceil(days / admission.cost_days)
+    return cost
+
+class AdmissionController:
+    """Limiti di concorrenza per processo sulle route analitiche.
+
+    Ogni richiesta ha un costo in unità (fisso o stimato dai parametri) e
+    viene ammessa, al primo risultato non trovato nella cache delle
+    analytics, solo se restano ANALYTICS_CAPACITY unità, se la route ha
+    meno di ANALYTICS_ROUTE_CONCURRENCY richieste in corso e se il pool del
+    database ha almeno ANALYTICS_RESERVED_CONNECTIONS connessioni libere;
+    altrimenti è rifiutata subito con 503 e Retry-After, senza attendere.
+    La capacità è inferiore ai thread del worker, quindi le route CRUD
+    trovano sempre un thread e una connessione liberi.
+    """
+
+    def __init__(self):
+        self.capacity = 0
+        self.route_concurrency = 1
+        self.cost_days = 90
+        self.reserved_connections = 0
+        self.retry_after = 5
+        self._lock = threading.Lock()
+        self._used = 0
+        self._running = Counter()
+        self.admitted = Counter()
+        self.rejected = Counter()
+
+    def init_app(self, app):
+        self.capacity = app.config['ANALYTICS_CAPACITY']
+        self.route_concurrency = app.config['ANALYTICS_ROUTE_CONCURRENCY']
+        self.cost_days = app.config['ANALYTICS_COST_DAYS']
+        self.reserved_connections = app.config['ANALYTICS_RESERVED_CONNECTIONS']
+        self.retry_after = app.config['ANALYTICS_RETRY_AFTER']
+        app.extensions['admission'] = self
+        analytics_cache.on_miss(self._admit)
+
+        @app.errorhandler(AdmissionRejected)
+        def admission_rejected(e):
+            response = jsonify({'error': f'Servizio sovraccarico: {e}, riprovare tra poco'})
+            response.headers['Retry-After'] = str(self.retry_after)
+            return response, HTTPStatus.SERVICE_UNAVAILABLE
+
+    def _free_connections(self):
+        pool = db.engine.pool
+        if not hasattr(pool, 'checkedout'):
+            return math.inf
+        return pool.size() + max(pool._max_overflow, 0) - pool.checkedout()
+
+    def acquire(self, route, cost, concurrency=None):
+        """Riserva cost unità per route; solleva AdmissionRejected se non ci sono"""
+        if not self.capacity:
+            return 0
+        cost = min(max(cost, 1), self.capacity)
+        concurrency = concurrency or self.route_concurrency
+        with self._lock:
+            if self._running[route] >= concurrency:
+                reason = 'troppe richieste in corso per questa analisi'
+            elif self._used + cost > self.capacity:
+                reason = 'capacità per le analisi esaurita'
+            elif self._free_connections() <= self.reserved_connections:
+                reason = 'connessioni al database riservate alle operazioni'
+            else:
+                self._used += cost
+                self._running[route] += 1
+                self.admitted[route] += 1
+                return cost
+            self.rejected[route] += 1
+        raise AdmissionRejected(reason)
+
+    def release(self, route, cost):
+        if not cost:
+            return
+        with self._lock:
+            self._used -= cost
+            self._running[route] -= 1
+
+    def limit(self, cost=1, concurrency=None):
+        """Decoratore di route: cost è un numero di unità o una funzione che lo stima dalla richiesta.
+
+        Le unità sono riservate solo se la route calcola un risultato non in
+        cache; una risposta servita dalla cache non consuma capacità.
+        """
+        def decorator(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                g.admission_request = (request.endpoint, cost, concurrency)
+                g.admission_reserved = 0
+                try:
+                    return func(*args, **kwargs)
+                finally:
+                    reserved = g.pop('admission_reserved', 0)
+                    route, _, _ = g.pop('admission_request')
+                    self.release(route, reserved)
+            return wrapper
+        return decorator
+
+    def _admit(self):
+        """Hook della cache: riserva le unità della route in corso al primo miss"""
+        if not has_app_context() or g.get('admission_request') is None or g.admission_reserved:
+            return
+        route, cost, concurrency = g.admission_request
+        g.admission_reserved = self.acquire(route, cost() if callable(cost) else cost, concurrency)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'capacity': self.capacity,
+                'used': self._used,
+                'route_concurrency': self.route_concurrency,
+                'reserved_connections': self.reserved_connections,
+                'routes': {
+                    route: {
+                        'running': self._running[route],
+                        'admitted': self.admitted[route],
+                        'rejected': self.rejected[route]
+                    }
+                    for route in sorted(set(self.admitted) | set(self.rejected))
+                }
+            }
+
+admission = AdmissionController()
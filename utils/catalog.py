@@ -0,0 +1,157 @@
+import csv
+import io
+from sqlalchemy import text
+from extensions import db
+
+REQUIRED_COLUMNS = ['sku', 'name', 'price']
+OPTIONAL_COLUMNS = ['description', 'price_unit', 'stock', 'stock_unit', 'gross_margin', 'company_id']
+# Colonne aggiornate sugli item già presenti, se compaiono nel file
+UPDATE_COLUMNS = ['price', 'stock', 'gross_margin']
+MAX_REPORTED_ERRORS = 100
+
+DECIMAL = r"'^\s*[0-9]{1,8}(\.[0-9]{1,2})?\s*$'"
+MARGIN = r"'^\s*-?[0-9]{1,3}(\.[0-9]{1,2})?\s*$'"
+INTEGER = r"'^\s*[0-9]{1,9}\s*$'"
+
+# Primo motivo di scarto di ogni riga della staging, NULL se la riga è valida
+REJECTION_REASON = f"""
+    CASE
+        WHEN NULLIF(TRIM(st.sku), '') IS NULL THEN 'sku obbligatorio'
+        WHEN LENGTH(TRIM(st.sku)) > 50 THEN 'sku troppo lungo'
+        WHEN NULLIF(TRIM(st.name), '') IS NULL THEN 'name obbligatorio'
+        WHEN LENGTH(TRIM(st.name)) > 100 THEN 'name troppo lungo'
+        WHEN st.price IS NULL OR st.price !~ {DECIMAL} THEN 'price non valido'
+        WHEN NULLIF(TRIM(st.stock), '') IS NOT NULL AND st.stock !~ {INTEGER} THEN 'stock non valido'
+        WHEN NULLIF(TRIM(st.gross_margin), '') IS NOT NULL AND st.gross_margin !~ {MARGIN} THEN 'gross_margin non valido'
+        WHEN LENGTH(st.price_unit) > 20 OR LENGTH(st.stock_unit) > 20 THEN 'unità troppo lunga'
+        WHEN c.id IS NULL THEN 'azienda non trovata'
+    END
+"""
+
+class CatalogError(ValueError):
+    pass
+
+def _read_header(stream):
+    line = stream.readline()
+    if isinstance(line, bytes):
+        line = line.decode('utf-8-sig')
+    columns = [column.strip().lower() for column in next(csv.reader(io.StringIO(line)), [])]
+
+    unknown = set(columns) - set(REQUIRED_COLUMNS) - set(OPTIONAL_COLUMNS)
+    if unknown:
+        raise CatalogError(f'Colonne non riconosciute: {", ".join(sorted(unknown))}')
+    missing = [column for column in REQUIRED_COLUMNS if column not in columns]
+    if missing:
+        raise CatalogError(f'Colonne obbligatorie mancanti: {", ".join(missing)}')
+    if len(set(columns)) != len(columns):
+        raise CatalogError('Colonne duplicate nell\'intestazione')
+    return columns
+
+def import_catalog(stream, company_id=None):
+    """Importa un catalogo CSV con intestazione e restituisce i conteggi.
+
+    Il file viene caricato con COPY in una tabella temporanea, le righe non
+    valide sono scartate con il motivo, i duplicati di (sku, company_id)
+    tengono l'ultima occorrenza e il resto entra in items con un solo
+    INSERT ... ON CONFLICT. company_id, se indicato, vale per tutte le
+    righe. Il commit è a carico del chiamante.
+    """
+    columns = _read_header(stream)
+    if company_id is None and 'company_id' not in columns:
+        raise CatalogError('Indicare company_id come parametro o come colonna')
+
+    connection = db.session.connection()
+    connection.execute(text("""
+        CREATE TEMPORARY TABLE catalog_staging (
+            line BIGSERIAL,
+            sku TEXT, name TEXT, description TEXT, price TEXT, price_unit TEXT,
+            stock TEXT, stock_unit TEXT, gross_margin TEXT, company_id TEXT
+        ) ON COMMIT DROP
+    """))
+
+    cursor = connection.connection.cursor()
+    try:
+        cursor.copy_expert(
+            f'COPY catalog_staging ({", ".join(columns)}) FROM STDIN WITH (FORMAT csv)',
+            stream
+        )
+    except Exception as e:
+        raise CatalogError(f'CSV non valido: {str(e).splitlines()[0]}')
+
+    company = ':company_id' if company_id is not None else \
+        "CASE WHEN TRIM(st.company_id) ~ '^[0-9]{1,9}$' THEN TRIM(st.company_id)::int END"
+    params = {'company_id': company_id}
+
+    connection.execute(text(f"""
+        CREATE TEMPORARY TABLE catalog_checked ON COMMIT DROP AS
+        SELECT st.*, {company} AS target_company_id, {REJECTION_REASON} AS reason
+        FROM catalog_staging st
+        LEFT JOIN companies c ON c.id = {company}
+    """), params)
+
+    rejected = connection.execute(text("""
+        SELECT COUNT(*) FROM catalog_checked WHERE reason IS NOT NULL
+    """)).scalar()
+    errors = [
+        {'line': line + 1, 'sku': sku, 'error': reason}
+        for line, sku, reason in connection.execute(text("""
+            SELECT line, sku, reason FROM catalog_checked
+            WHERE reason IS NOT NULL ORDER BY line LIMIT :limit
+        """), {'limit': MAX_REPORTED_ERRORS})
+    ]
+
+    update_columns = [column for column in UPDATE_COLUMNS if column in columns]
+    if update_columns:
+        assignments = ', '.join(f'{column} = EXCLUDED.{column}' for column in update_columns)
+        changed = ' OR '.join(f'items.{column} IS DISTINCT FROM EXCLUDED.{column}' for column in update_columns)
+        on_conflict = f"DO UPDATE SET {assignments}, updated_at = timezone('UTC', now()) WHERE {changed}"
+    else:
+        on_conflict = 'DO NOTHING'
+
+    # xmax = 0 solo per le righe appena inserite; quelle non modificate non sono restituite
+    result = connection.execute(text(f"""
+        WITH latest AS (
+            SELECT DISTINCT ON (target_company_id, TRIM(sku)) *
+            FROM catalog_checked
+            WHERE reason IS NULL
+            ORDER BY target_company_id, TRIM(sku), line DESC
+        ),
+        upserted AS (
+            INSERT INTO items (
+                name, description, price, price_unit, sku, stock, stock_unit,
+                gross_margin, company_id, created_at, updated_at
+            )
+            SELECT
+                TRIM(name),
+                NULLIF(description, ''),
+                TRIM(price)::numeric,
+                COALESCE(NULLIF(TRIM(price_unit), ''), 'EUR'),
+                TRIM(sku),
+                COALESCE(NULLIF(TRIM(stock), '')::int, 0),
+                COALESCE(NULLIF(TRIM(stock_unit), ''), 'PZ'),
+                NULLIF(TRIM(gross_margin), '')::numeric,
+                target_company_id,
+                timezone('UTC', now()),
+                timezone('UTC', now())
+            FROM latest
+            ORDER BY target_company_id, TRIM(sku)
+            ON CONFLICT ON CONSTRAINT unique_sku_per_company {on_conflict}
+            RETURNING (xmax = 0) AS inserted
+        )
+        SELECT
+            (SELECT COUNT(*) FROM latest) AS valid,
+            COUNT(*) FILTER (WHERE inserted) AS inserted,
+            COUNT(*) FILTER (WHERE NOT inserted) AS updated
+        FROM upserted
+    """), params).one()
+
+    total = connection.execute(text('SELECT COUNT(*) FROM catalog_staging')).scalar()
+    return {
+        'rows': total,
+        'inserted': result.inserted,
+        'updated': result.updated,
+        'unchanged': result.valid - result.inserted - result.updated,
+        'duplicates': total - rejected - result.valid,
+        'rejected': rejected,
+        'errors': errors
+    }
@@ -2,6 +2,11 @@ import click
 from flask.cli import with_appcontext
 from models.user import User
 from extensions import db
+from analytics import rollup
+from utils.explain import check_indexes
+from utils.email import email_dispatcher
+from utils.catalog import CatalogError, import_catalog
+from analytics.cache import analytics_cache
 
 @click.command('list-users')
 @with_appcontext
@@ -10,6 +15,53 @@ def list_users():
     for user in users:
         click.echo(f'User: {user.email}')
 
+@click.command('rebuild-sales-rollup')
+@with_appcontext
+def rebuild_sales_rollup():
+    rows = rollup.rebuild()
+    click.echo(f'Rollup vendite ricostruita: {rows} righe')
+
+@click.command('check-indexes')
+@click.option('--natural', is_flag=True, help='Non disabilita le scansioni sequenziali')
+@with_appcontext
+def check_indexes_command(natural):
+    failed = False
+    for name, expected, used in check_indexes(natural):
+        missing = expected - used
+        status = 'OK' if not missing else 'MANCANTE: ' + ', '.join(sorted(missing))
+        click.echo(f'{name}: {status} (usati: {", ".join(sorted(used)) or "nessuno"})')
+        failed = failed or bool(missing)
+    if failed:
+        raise SystemExit(1)
+
+@click.command('send-emails')
+@with_appcontext
+def send_emails():
+    sent = email_dispatcher.drain()
+    stats = email_dispatcher.stats()
+    click.echo(f'Email elaborate: {sent}, in coda: {stats["pending"]}, fallite: {stats["failed"]}')
+
+@click.command('import-catalog')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--company-id', type=int, help='Azienda di tutte le righe, se il file non ha la colonna company_id')
+@with_appcontext
+def import_catalog_command(path, company_id):
+    try:
+        with open(path, 'rb') as f:
+            result = import_catalog(f, company_id)
+        db.session.commit()
+    except CatalogError as e:
+        db.session.rollback()
+        raise click.ClickException(str(e))
+    analytics_cache.bump_version()
+
+    click.echo(
+        f'Righe: {result["rows"]}, inserite: {result["inserted"]}, aggiornate: {result["updated"]}, '
+        f'invariate: {result["unchanged"]}, duplicate: {result["duplicates"]}, scartate: {result["rejected"]}'
+    )
+    for error in result['errors']:
+        click.echo(f'  riga {error["line"]} ({error["sku"]}): {error["error"]}')
+
 @click.command('shell')
 @with_appcontext
 def shell_command():
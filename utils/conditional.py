@@ -0,0 +1,65 @@
+import hashlib
+from datetime import timezone
+from flask import current_app, request
+from http import HTTPStatus
+from extensions import db
+from utils.pagination import page_versions
+
+class Validator:
+    """ETag e Last-Modified di una risposta GET, calcolati prima di costruirla.
+
+    L'ETag è un hash dello stato (le versioni lette dal database) e dei
+    parametri della richiesta, quindi cambia con fields, include, filtri e
+    cursore oltre che con i dati.
+    """
+
+    def __init__(self, state, last_modified=None, total=None):
+        self.total = total
+        args = sorted(request.args.items(multi=True))
+        self.etag = hashlib.sha256(repr((request.path, args, state)).encode()).hexdigest()[:32]
+        # updated_at è UTC senza fuso; l'header ha la precisione del secondo
+        self.last_modified = last_modified.replace(tzinfo=timezone.utc, microsecond=0) if last_modified else None
+
+    def not_modified(self):
+        """True se If-None-Match o, in sua assenza, If-Modified-Since dicono che il client è aggiornato"""
+        if request.if_none_match:
+            return request.if_none_match.contains_weak(self.etag)
+        if request.if_modified_since and self.last_modified:
+            return self.last_modified <= request.if_modified_since
+        return False
+
+    def apply(self, response):
+        response.set_etag(self.etag)
+        if self.last_modified:
+            response.last_modified = self.last_modified
+        # Il client può tenere la risposta ma deve rivalidarla a ogni uso
+        response.headers['Cache-Control'] = 'no-cache'
+        return response
+
+    def not_modified_response(self):
+        return self.apply(current_app.response_class(status=HTTPStatus.NOT_MODIFIED))
+
+def row_validator(model, row_id, version=None):
+    """Validator della riga row_id di model, None se non esiste.
+
+    version è l'espressione SQL della versione, per default updated_at;
+    le risorse che incorporano relazioni la calcolano anche su queste.
+    """
+    version = model.updated_at if version is None else version
+    row = db.session.query(version).filter(model.id == row_id).first()
+    if row is None:
+        return None
+    return Validator(row[0], row[0])
+
+def page_validator(query, columns, version, descending=False):
+    """Validator della pagina che paginate(query, columns, descending) restituirebbe.
+
+    Lo stato sono chiavi e versioni delle righe della pagina (più la prima
+    della successiva, che determina next_cursor) e, con include_total, il
+    totale: una riga modificata, aggiunta o rimossa cambia l'ETag.
+    Solleva ValueError su limit o cursore non validi, come paginate();
+    il totale letto è in total, da passare a paginate().
+    """
+    rows, total = page_versions(query, columns, version, descending)
+    versions = [row[-1] for row in rows if row[-1] is not None]
+    return Validator((rows, total), max(versions) if versions else None, total)
@@ -0,0 +1,85 @@
+import os
+import threading
+import time
+from sqlalchemy import exc
+from sqlalchemy.pool import QueuePool
+
+class TimedQueuePool(QueuePool):
+    """QueuePool che misura l'attesa per ottenere una connessione.
+
+    Il tempo comprende l'eventuale apertura di una nuova connessione e il
+    pre-ping. Le statistiche sono per processo: dopo il fork dispose()
+    ricrea il pool con i contatori azzerati.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._stats_lock = threading.Lock()
+        self.checkouts = 0
+        self.checkout_timeouts = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    def connect(self):
+        start = time.perf_counter()
+        timed_out = False
+        try:
+            return super().connect()
+        except exc.TimeoutError:
+            timed_out = True
+            raise
+        finally:
+            waited = time.perf_counter() - start
+            with self._stats_lock:
+                self.checkouts += 1
+                self.checkout_timeouts += timed_out
+                self.wait_total += waited
+                self.wait_max = max(self.wait_max, waited)
+
+def engine_options():
+    """SQLALCHEMY_ENGINE_OPTIONS dalle variabili d'ambiente DB_*"""
+    options = {
+        'poolclass': TimedQueuePool,
+        'pool_size': int(os.getenv('DB_POOL_SIZE', 5)),
+        'max_overflow': int(os.getenv('DB_MAX_OVERFLOW', 10)),
+        'pool_timeout': int(os.getenv('DB_POOL_TIMEOUT', 30)),
+        'pool_recycle': int(os.getenv('DB_POOL_RECYCLE', 1800)),
+        'pool_pre_ping': os.getenv('DB_POOL_PRE_PING', 'True').lower() == 'true',
+        'connect_args': {
+            'application_name': os.getenv('DB_APPLICATION_NAME', 'order_manager')
+        }
+    }
+
+    statement_timeout = int(os.getenv('DB_STATEMENT_TIMEOUT_MS', 0))
+    if statement_timeout:
+        options['connect_args']['options'] = f'-c statement_timeout={statement_timeout}'
+    return options
+
+def pool_stats(engine):
+    """Stato del pool del worker corrente"""
+    pool = engine.pool
+    stats = {
+        'pid': os.getpid(),
+        'pool_class': type(pool).__name__
+    }
+    if not isinstance(pool, QueuePool):
+        return stats
+
+    stats.update({
+        'size': pool.size(),
+        'max_overflow': pool._max_overflow,
+        'checked_out': pool.checkedout(),
+        'idle': pool.checkedin(),
+        'overflow': max(pool.overflow(), 0),
+        'timeout': pool.timeout()
+    })
+    if isinstance(pool, TimedQueuePool):
+        with pool._stats_lock:
+            stats['checkout_wait'] = {
+                'count': pool.checkouts,
+                'timeouts': pool.checkout_timeouts,
+                'total_seconds': round(pool.wait_total, 6),
+                'avg_seconds': round(pool.wait_total / pool.checkouts, 6) if pool.checkouts else 0,
+                'max_seconds': round(pool.wait_max, 6)
+            }
+    return stats
@@ -1,20 +1,226 @@
+import os
+import random
+import smtplib
+import threading
+import time
+from contextlib import ExitStack
+from datetime import datetime, timedelta
 from flask import current_app
 from flask_mail import Message
-from threading import Thread
-from extensions import mail
-
-def send_async_email(app, msg):
-    with app.app_context():
-        mail.send(msg)
+from sqlalchemy import func
+from extensions import db, mail
+from models.email_outbox import EmailOutbox, EmailStatus
 
 def send_email(subject, recipients, text_body, html_body=None):
-    msg = Message(subject, recipients=recipients)
-    msg.body = text_body
-    if html_body:
-        msg.html = html_body
-    
-    Thread(target=send_async_email,
-           args=(current_app._get_current_object(), msg)).start()
+    """Accoda il messaggio nella outbox della sessione corrente.
+
+    Il messaggio viene salvato con il commit del chiamante, insieme ai dati
+    che lo hanno generato, e inviato dal dispatcher.
+    """
+    email = EmailOutbox(
+        subject=subject,
+        recipients=list(recipients),
+        text_body=text_body,
+        html_body=html_body
+    )
+    db.session.add(email)
+    return email
+
+class EmailDispatcher:
+    """Pool limitato di thread che svuota la outbox.
+
+    Ogni worker prende un lotto di messaggi con SELECT ... FOR UPDATE SKIP
+    LOCKED in una transazione breve, spostando next_attempt_at avanti di
+    EMAIL_LEASE_SECONDS: finché il lease è valido nessun altro thread o
+    processo prende gli stessi messaggi. L'invio avviene fuori da qualsiasi
+    transazione e l'esito di ogni messaggio è salvato subito, quindi un
+    processo che termina a metà lotto fa ripetere, alla scadenza del lease,
+    solo i messaggi non ancora confermati. Ogni thread tiene aperta la
+    propria connessione SMTP tra un lotto e l'altro e la chiude dopo
+    EMAIL_SMTP_IDLE_SECONDS di inattività. Un invio fallito viene ritentato
+    con backoff esponenziale fino a EMAIL_MAX_ATTEMPTS.
+    """
+
+    def __init__(self):
+        self.app = None
+        self._pid = None
+        self._threads = []
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._local = threading.local()
+        self.sent = 0
+        self.failed_attempts = 0
+
+    def init_app(self, app):
+        self.app = app
+        app.extensions['email_dispatcher'] = self
+
+        @app.before_request
+        def start_email_dispatcher():
+            self.start()
+
+    def start(self):
+        """Avvia i thread nel processo corrente; dopo un fork vengono riavviati"""
+        if not self.app.config['EMAIL_DISPATCHER_ENABLED'] or self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._threads = [
+                threading.Thread(target=self._run, name=f'email-dispatcher-{i}', daemon=True)
+                for i in range(self.app.config['EMAIL_WORKERS'])
+            ]
+            for thread in self._threads:
+                thread.start()
+            self._pid = os.getpid()
+
+    def wake(self):
+        """Segnala ai thread che ci sono nuovi messaggi, senza attendere il polling"""
+        self._wakeup.set()
+
+    def _run(self):
+        while True:
+            try:
+                with self.app.app_context():
+                    processed = self.process_batch()
+            except Exception as e:
+                self.app.logger.exception('Errore nel dispatcher email: %s', e)
+                processed = 0
+            if processed < self.app.config['EMAIL_BATCH_SIZE']:
+                if self._idle_seconds() > self.app.config['EMAIL_SMTP_IDLE_SECONDS']:
+                    self._disconnect()
+                self._wakeup.wait(self.app.config['EMAIL_POLL_INTERVAL'])
+                self._wakeup.clear()
+
+    def _retry_delay(self, attempts):
+        base = current_app.config['EMAIL_RETRY_BASE_SECONDS'] * 2 ** (attempts - 1)
+        return timedelta(seconds=base * random.uniform(0.5, 1.5))
+
+    def _idle_seconds(self):
+        if getattr(self._local, 'connection', None) is None:
+            return 0
+        return time.monotonic() - self._local.last_used
+
+    def _disconnect(self):
+        smtp = getattr(self._local, 'smtp', None)
+        self._local.smtp = None
+        self._local.connection = None
+        if smtp is not None:
+            try:
+                smtp.close()
+            except Exception:
+                pass
+
+    def _send(self, msg):
+        """Invia sulla connessione del thread, aprendola se serve.
+
+        Se il server ha chiuso una connessione rimasta aperta, l'invio è
+        ripetuto una volta su una connessione nuova.
+        """
+        if self._idle_seconds() > current_app.config['EMAIL_SMTP_IDLE_SECONDS']:
+            self._disconnect()
+        reused = getattr(self._local, 'connection', None) is not None
+        for attempt in range(2):
+            if getattr(self._local, 'connection', None) is None:
+                self._local.smtp = ExitStack()
+                self._local.connection = self._local.smtp.enter_context(mail.connect())
+            try:
+                self._local.connection.send(msg)
+                self._local.last_used = time.monotonic()
+                return
+            except (smtplib.SMTPServerDisconnected, ConnectionError):
+                self._disconnect()
+                if not reused or attempt:
+                    raise
+            except Exception:
+                self._disconnect()
+                raise
+
+    def _claim_batch(self):
+        """Prende in lease un lotto di messaggi scaduti e conta il tentativo; restituisce (lease, messaggi)"""
+        now = datetime.utcnow()
+        batch = EmailOutbox.query.filter(
+            EmailOutbox.status == EmailStatus.PENDING,
+            EmailOutbox.next_attempt_at <= now
+        ).order_by(EmailOutbox.next_attempt_at, EmailOutbox.id).limit(
+            current_app.config['EMAIL_BATCH_SIZE']
+        ).with_for_update(skip_locked=True).all()
+
+        lease = now + timedelta(seconds=current_app.config['EMAIL_LEASE_SECONDS'])
+        claimed = []
+        for email in batch:
+            email.next_attempt_at = lease
+            email.attempts += 1
+            claimed.append((email.id, email.attempts, Message(
+                email.subject,
+                recipients=email.recipients,
+                body=email.text_body,
+                html=email.html_body
+            )))
+        db.session.commit()
+        return lease, claimed
+
+    def _record(self, email_id, lease, values):
+        # Solo se il lease è ancora nostro: scaduto, il messaggio può essere di un altro thread
+        EmailOutbox.query.filter(
+            EmailOutbox.id == email_id,
+            EmailOutbox.next_attempt_at == lease
+        ).update(values, synchronize_session=False)
+        db.session.commit()
+
+    def process_batch(self):
+        """Invia un lotto di messaggi scaduti; restituisce quanti ne ha elaborati"""
+        lease, claimed = self._claim_batch()
+        max_attempts = current_app.config['EMAIL_MAX_ATTEMPTS']
+        for email_id, attempts, msg in claimed:
+            try:
+                self._send(msg)
+            except Exception as e:
+                values = {'last_error': str(e)[:1000]}
+                if attempts >= max_attempts:
+                    values['status'] = EmailStatus.FAILED
+                else:
+                    values['next_attempt_at'] = datetime.utcnow() + self._retry_delay(attempts)
+                self.failed_attempts += 1
+            else:
+                values = {'status': EmailStatus.SENT, 'sent_at': datetime.utcnow(), 'last_error': None}
+                self.sent += 1
+            self._record(email_id, lease, values)
+        return len(claimed)
+
+    def drain(self):
+        """Invia tutti i messaggi già scaduti nel thread corrente"""
+        total = 0
+        try:
+            while True:
+                processed = self.process_batch()
+                if not processed:
+                    return total
+                total += processed
+        finally:
+            self._disconnect()
+
+    def stats(self):
+        counts = dict(
+            db.session.query(EmailOutbox.status, func.count(EmailOutbox.id)).group_by(EmailOutbox.status).all()
+        )
+        oldest = db.session.query(func.min(EmailOutbox.created_at)).filter(
+            EmailOutbox.status == EmailStatus.PENDING
+        ).scalar()
+        return {
+            'pending': counts.get(EmailStatus.PENDING, 0),
+            'sent': counts.get(EmailStatus.SENT, 0),
+            'failed': counts.get(EmailStatus.FAILED, 0),
+            'oldest_pending_seconds': round((datetime.utcnow() - oldest).total_seconds(), 1) if oldest else None,
+            'worker': {
+                'pid': os.getpid(),
+                'threads': sum(thread.is_alive() for thread in self._threads) if self._pid == os.getpid() else 0,
+                'sent': self.sent,
+                'failed_attempts': self.failed_attempts
+            }
+        }
+
+email_dispatcher = EmailDispatcher()
 
 def send_welcome_email(user):
     subject = "Benvenuto in Order Manager!"
@@ -39,4 +245,4 @@ def send_welcome_email(user):
     Il team di Order Manager</p>
     """
     
-    send_email(subject, [user.email], text_body, html_body) 
\ No newline at end of file
+    return send_email(subject, [user.email], text_body, html_body) 
\ No newline at end of file
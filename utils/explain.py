@@ -0,0 +1,108 @@
+from datetime import datetime, timedelta
+from sqlalchemy import text
+from extensions import db
+
+# Predicati delle query calde (analytics e liste paginate) con gli indici che devono usare
+INDEX_CHECKS = [
+    (
+        'vendite attive per periodo (analytics)',
+        """
+            SELECT si.item_id, si.quantity, si.total_price
+            FROM sales s
+            JOIN sale_items si ON s.id = si.sale_id
+            WHERE s.date BETWEEN :start_date AND :end_date
+            AND s.status != 'cancelled'
+        """,
+        {'ix_sales_active_date', 'ix_sale_items_sale_id'}
+    ),
+    (
+        'acquisti attivi per periodo (analytics)',
+        """
+            SELECT pi.item_id, pi.quantity, pi.total_price
+            FROM purchases p
+            JOIN purchase_items pi ON p.id = pi.purchase_id
+            WHERE p.date BETWEEN :start_date AND :end_date
+            AND p.status != 'cancelled'
+        """,
+        {'ix_purchases_active_date', 'ix_purchase_items_purchase_id'}
+    ),
+    (
+        'righe di vendita per item',
+        'SELECT si.sale_id, si.quantity FROM sale_items si WHERE si.item_id = :item_id',
+        {'ix_sale_items_item_id'}
+    ),
+    (
+        'righe di acquisto per item',
+        'SELECT pi.purchase_id, pi.quantity FROM purchase_items pi WHERE pi.item_id = :item_id',
+        {'ix_purchase_items_item_id'}
+    ),
+    (
+        'pagina vendite',
+        'SELECT s.id FROM sales s ORDER BY s.date DESC, s.id DESC LIMIT 50',
+        {'ix_sales_date_id'}
+    ),
+    (
+        'vendite per stato',
+        'SELECT s.id FROM sales s WHERE s.status = :status ORDER BY s.date DESC, s.id DESC LIMIT 50',
+        {'ix_sales_status_date_id'}
+    ),
+    (
+        'vendite per email cliente',
+        'SELECT s.id FROM sales s WHERE s.customer_email = :customer_email ORDER BY s.date DESC, s.id DESC LIMIT 50',
+        {'ix_sales_customer_email_date_id'}
+    ),
+    (
+        'vendite per azienda',
+        'SELECT s.id FROM sales s WHERE s.company_id = :company_id ORDER BY s.date DESC, s.id DESC LIMIT 50',
+        {'ix_sales_company_id_date_id'}
+    ),
+    (
+        'acquisti per azienda',
+        'SELECT p.id FROM purchases p WHERE p.company_id = :company_id ORDER BY p.date DESC, p.id DESC LIMIT 50',
+        {'ix_purchases_company_id_date_id'}
+    ),
+    (
+        'item per azienda',
+        'SELECT i.id FROM items i WHERE i.company_id = :company_id ORDER BY i.id LIMIT 50',
+        {'ix_items_company_id'}
+    ),
+]
+
+def _index_names(plan):
+    names = set()
+    if 'Index Name' in plan:
+        names.add(plan['Index Name'])
+    for child in plan.get('Plans', []):
+        names |= _index_names(child)
+    return names
+
+def check_indexes(natural=False):
+    """Esegue EXPLAIN sulle query di INDEX_CHECKS e verifica gli indici usati.
+
+    Senza natural le scansioni sequenziali sono disabilitate nella
+    transazione, così la verifica riguarda l'utilizzabilità dell'indice per
+    il predicato e non dipende dalla dimensione attuale delle tabelle. Le
+    statistiche sono ricalcolate con ANALYZE nella stessa transazione, che
+    viene annullata alla fine.
+    Restituisce una lista di (nome, indici attesi, indici usati).
+    """
+    params = {
+        'start_date': datetime.now() - timedelta(days=30),
+        'end_date': datetime.now(),
+        'item_id': 1,
+        'company_id': 1,
+        'status': 'pending',
+        'customer_email': 'cliente@example.com'
+    }
+
+    results = []
+    try:
+        db.session.execute(text('ANALYZE sales, sale_items, purchases, purchase_items, items'))
+        if not natural:
+            db.session.execute(text('SET LOCAL enable_seqscan = off'))
+        for name, query, expected in INDEX_CHECKS:
+            plan = db.session.execute(text(f'EXPLAIN (FORMAT JSON) {query}'), params).scalar()
+            results.append((name, expected, _index_names(plan[0]['Plan'])))
+    finally:
+        db.session.rollback()
+    return results
@@ -0,0 +1,131 @@
+import queue
+import tempfile
+import threading
+from extensions import db
+
+CHUNK_SIZE = 64 * 1024
+QUEUE_CHUNKS = 16
+
+class ExportCancelled(Exception):
+    pass
+
+def _copy_sql(cursor, select_sql, params, header):
+    # COPY non accetta parametri: i valori sono interpolati e quotati da psycopg2
+    select = cursor.mogrify(select_sql, params).decode()
+    return f'COPY ({select}) TO STDOUT WITH (FORMAT csv{", HEADER true" if header else ""})'
+
+class _QueueWriter:
+    """File per copy_expert che passa l'output a blocchi di CHUNK_SIZE a una coda limitata"""
+
+    def __init__(self, chunks, cancelled):
+        self.chunks = chunks
+        self.cancelled = cancelled
+        self.parts = []
+        self.size = 0
+
+    def put(self, item):
+        # Coda piena: il client legge più lentamente di Postgres, si attende
+        while not self.cancelled.is_set():
+            try:
+                self.chunks.put(item, timeout=0.5)
+                return
+            except queue.Full:
+                pass
+        raise ExportCancelled()
+
+    def write(self, data):
+        self.parts.append(data)
+        self.size += len(data)
+        if self.size >= CHUNK_SIZE:
+            self.flush()
+
+    def flush(self):
+        if self.parts:
+            self.put(b''.join(self.parts))
+            self.parts = []
+            self.size = 0
+
+def stream_copy(select_sql, params):
+    """Generatore del CSV, con intestazione, prodotto da COPY (select_sql) TO STDOUT.
+
+    COPY gira in un thread su una connessione dedicata del pool e riempie
+    una coda di al massimo QUEUE_CHUNKS blocchi, quindi la memoria resta
+    limitata anche se il client è lento. Se il client si disconnette la
+    query viene annullata e la connessione scartata.
+    """
+    conn = db.engine.raw_connection()
+    chunks = queue.Queue(maxsize=QUEUE_CHUNKS)
+    cancelled = threading.Event()
+    writer = _QueueWriter(chunks, cancelled)
+    done = object()
+    errors = []
+
+    def run():
+        try:
+            cursor = conn.cursor()
+            cursor.copy_expert(_copy_sql(cursor, select_sql, params, True), writer)
+            writer.flush()
+            conn.commit()
+        except Exception as e:
+            errors.append(e)
+        finally:
+            try:
+                writer.put(done)
+            except ExportCancelled:
+                pass
+
+    thread = threading.Thread(target=run, name='copy-export', daemon=True)
+    thread.start()
+    try:
+        while True:
+            chunk = chunks.get()
+            if chunk is done:
+                break
+            yield chunk
+        if errors:
+            raise errors[0]
+    finally:
+        if thread.is_alive():
+            cancelled.set()
+            conn.dbapi_connection.cancel()
+            thread.join()
+        if errors or cancelled.is_set():
+            conn.invalidate()
+        else:
+            conn.close()
+
+def parquet_file(select_sql, params, schema):
+    """Esegue COPY in un file temporaneo e lo converte in Parquet a blocchi.
+
+    select_sql deve restituire le colonne di schema, nello stesso ordine.
+    Restituisce il file Parquet posizionato all'inizio; richiede pyarrow.
+    """
+    import pyarrow.csv as pa_csv
+    import pyarrow.parquet as pq
+
+    with tempfile.TemporaryFile() as raw:
+        conn = db.engine.raw_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.copy_expert(_copy_sql(cursor, select_sql, params, False), raw)
+            conn.commit()
+        finally:
+            conn.close()
+        raw.seek(0)
+
+        reader = pa_csv.open_csv(
+            raw,
+            read_options=pa_csv.ReadOptions(column_names=schema.names, block_size=8 * 1024 * 1024),
+            convert_options=pa_csv.ConvertOptions(
+                column_types=schema,
+                null_values=[''],
+                strings_can_be_null=True,
+                quoted_strings_can_be_null=False
+            )
+        )
+        output = tempfile.TemporaryFile()
+        with pq.ParquetWriter(output, schema) as parquet:
+            for batch in reader:
+                parquet.write_batch(batch)
+    output.seek(0)
+    return output
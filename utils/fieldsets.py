@@ -0,0 +1,52 @@
+from dataclasses import dataclass
+from flask import request
+from sqlalchemy.orm import load_only, raiseload
+
+@dataclass(frozen=True)
+class Fieldset:
+    """Campi e relazioni chiesti con ?fields= e ?include="""
+    fields: tuple
+    include: frozenset
+
+def _split(value):
+    if value is None:
+        return None
+    return [part.strip() for part in value.split(',') if part.strip()]
+
+def parse_fieldset(model):
+    """Fieldset della richiesta per model, None se mancano sia fields sia include.
+
+    Senza fields si restituiscono tutti i model.FIELDS, senza include
+    nessuna delle relazioni di model.INCLUDES. Solleva ValueError sui nomi
+    non riconosciuti.
+    """
+    fields = _split(request.args.get('fields'))
+    include = _split(request.args.get('include'))
+    if fields is None and include is None:
+        return None
+
+    unknown = [field for field in fields or [] if field not in model.FIELDS]
+    if unknown:
+        raise ValueError(f'Campi non validi: {", ".join(unknown)}. Disponibili: {", ".join(model.FIELDS)}')
+    unknown = [name for name in include or [] if name not in model.INCLUDES]
+    if unknown:
+        raise ValueError(f'Relazioni non valide: {", ".join(unknown)}. Disponibili: {", ".join(model.INCLUDES) or "nessuna"}')
+
+    return Fieldset(tuple(dict.fromkeys(fields)) if fields else model.FIELDS, frozenset(include or ()))
+
+def fieldset_options(model, fieldset, *required, loaded=()):
+    """Opzioni che caricano solo le colonne richieste e vietano il caricamento delle relazioni escluse.
+
+    required aggiunge colonne necessarie al chiamante anche se non
+    richieste, ad esempio la chiave di paginazione; loaded le relazioni
+    che il chiamante carica comunque.
+    """
+    columns = [getattr(model, field) for field in fieldset.fields if field in model.__table__.columns]
+    options = [load_only(model.id, *columns, *required)]
+    options += [raiseload(getattr(model, name)) for name in model.INCLUDES if name not in fieldset.include and name not in loaded]
+    return options
+
+def fieldset_dict(obj, fieldset):
+    """Colonne richieste di obj; i campi calcolati e le relazioni sono aggiunti dal modello"""
+    columns = obj.__table__.columns
+    return {field: getattr(obj, field) for field in fieldset.fields if field in columns}
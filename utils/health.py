@@ -0,0 +1,98 @@
+import os
+import threading
+import time
+from alembic.config import Config
+from alembic.script import ScriptDirectory
+from sqlalchemy import text
+from extensions import db
+from utils.db_pool import pool_stats
+
+def migration_heads(directory):
+    """Revisioni head delle migrazioni presenti nel codice"""
+    config = Config()
+    config.set_main_option('script_location', directory)
+    return set(ScriptDirectory.from_config(config).get_heads())
+
+class ReadinessCheck:
+    """Verifica del database per la readiness, con risultato in cache.
+
+    Un solo thread per worker esegue la verifica quando il risultato è
+    scaduto; gli altri restituiscono l'ultimo risultato, così le probe non
+    occupano connessioni del pool.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._result = None
+        self._checked_at = 0.0
+        self._heads = None
+
+    def _heads_for(self, app):
+        if self._heads is None:
+            try:
+                directory = os.path.join(app.root_path, app.extensions['migrate'].directory)
+                self._heads = migration_heads(directory)
+            except Exception:
+                self._heads = set()
+        return self._heads
+
+    def _check(self, app):
+        result = {'database': {}, 'migrations': {}}
+        start = time.perf_counter()
+        try:
+            with db.engine.connect() as conn:
+                conn.execute(text('SELECT 1'))
+                has_versions = conn.execute(text("SELECT to_regclass('alembic_version') IS NOT NULL")).scalar()
+                current = set(conn.execute(text('SELECT version_num FROM alembic_version')).scalars()) if has_versions else None
+            result['database'] = {
+                'status': 'connected',
+                'latency_ms': round((time.perf_counter() - start) * 1000, 2)
+            }
+        except Exception as e:
+            result['database'] = {'status': 'unavailable', 'error': str(e).splitlines()[0]}
+            return result
+
+        heads = self._heads_for(app)
+        if current is None:
+            # Schema creato con create_all, non gestito da Alembic
+            status = 'unmanaged'
+        elif not heads or current == heads:
+            status = 'ok'
+        else:
+            status = 'mismatch'
+        result['migrations'] = {
+            'status': status,
+            'current': sorted(current) if current is not None else None,
+            'head': sorted(heads)
+        }
+        return result
+
+    def get(self, app):
+        ttl = app.config.get('HEALTH_CHECK_CACHE_SECONDS', 5)
+        if self._result is None or time.monotonic() - self._checked_at >= ttl:
+            # Se un altro thread sta già verificando si usa il risultato precedente
+            if self._lock.acquire(blocking=self._result is None):
+                try:
+                    self._result = self._check(app)
+                    self._checked_at = time.monotonic()
+                finally:
+                    self._lock.release()
+        return self._result, time.monotonic() - self._checked_at
+
+    def status(self, app):
+        """(ready, dettaglio) con lo stato del pool sempre aggiornato"""
+        result, age = self.get(app)
+        pool = pool_stats(db.engine)
+        capacity = pool.get('size', 0) + pool.get('max_overflow', 0)
+        saturation = pool.get('checked_out', 0) / capacity if capacity else 0.0
+        pool['saturation'] = round(saturation, 3)
+
+        checks = dict(result, pool=pool, checked_seconds_ago=round(age, 3))
+        ready = (
+            result['database'].get('status') == 'connected'
+            and result['migrations'].get('status') != 'mismatch'
+            and saturation < app.config.get('HEALTH_POOL_SATURATION', 1.0)
+        )
+        return ready, checks
+
+readiness = ReadinessCheck()
@@ -0,0 +1,178 @@
+import heapq
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from sqlalchemy import func
+from sqlalchemy.orm import joinedload
+from extensions import db, jwt
+from models.company import Company
+from models.revoked_token import RevokedToken
+from models.user import User
+
+def _jti_key(jti):
+    # 16 byte invece della stringa di 36 caratteri
+    try:
+        return uuid.UUID(jti).bytes
+    except (TypeError, ValueError):
+        return jti
+
+class IdentityCache:
+    """Utenti serializzati e token revocati tenuti in memoria per processo.
+
+    get_user() legge dal database solo alla prima richiesta di un utente o
+    dopo IDENTITY_CACHE_TTL secondi; is_revoked() non interroga mai il
+    database. Un thread per processo, ogni IDENTITY_SYNC_SECONDS, legge i
+    token revocati dagli altri worker, cancella quelli scaduti e scarta gli
+    utenti il cui updated_at, o quello dell'azienda incorporata, è cambiato;
+    le modifiche fatte nel processo stesso sono applicate subito con
+    invalidate() e revoke().
+    """
+
+    def __init__(self):
+        self.app = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self._start_lock = threading.Lock()
+        self._users = OrderedDict()
+        self._revoked = set()
+        self._expirations = []
+        self._revoked_since = None
+        self._users_since = None
+        self.hits = 0
+        self.misses = 0
+
+    def init_app(self, app):
+        self.app = app
+        app.extensions['identity_cache'] = self
+        jwt.token_in_blocklist_loader(lambda jwt_header, jwt_payload: self.is_revoked(jwt_payload['jti']))
+
+        @app.before_request
+        def start_identity_sync():
+            self.start()
+
+    def start(self):
+        """Carica i token revocati e avvia il thread di sincronizzazione nel processo corrente"""
+        if self._pid == os.getpid():
+            return
+        with self._start_lock:
+            if self._pid == os.getpid():
+                return
+            self._users.clear()
+            self._revoked.clear()
+            self._expirations = []
+            self._revoked_since = None
+            self._users_since = None
+            try:
+                self.sync()
+            except Exception as e:
+                self.app.logger.exception('Errore nel caricamento dei token revocati: %s', e)
+            threading.Thread(target=self._run, name='identity-sync', daemon=True).start()
+            self._pid = os.getpid()
+
+    def _run(self):
+        while True:
+            time.sleep(self.app.config['IDENTITY_SYNC_SECONDS'])
+            try:
+                self.sync()
+            except Exception as e:
+                self.app.logger.exception('Errore nella sincronizzazione delle identità: %s', e)
+
+    def sync(self):
+        """Aggiunge i token revocati non ancora visti e scarta gli utenti modificati"""
+        with self.app.app_context():
+            # Una transazione può salvare un updated_at o un revoked_at già
+            # superato da altre: si rilegge un margine, i token già noti sono
+            # ignorati e gli utenti scartati solo se la versione è diversa.
+            # Gli updated_at di utenti e aziende sono in UTC, qualunque sia il
+            # fuso del database
+            now = db.session.query(func.timezone('UTC', func.now())).scalar()
+            revoked = db.session.query(RevokedToken.jti, RevokedToken.expires_at).filter(
+                RevokedToken.expires_at > datetime.utcnow()
+            )
+            if self._revoked_since is not None:
+                revoked = revoked.filter(RevokedToken.revoked_at > self._revoked_since - timedelta(seconds=60))
+            revoked = revoked.all()
+
+            since = self._users_since or now
+            window = since - timedelta(seconds=60)
+            users = dict(db.session.query(User.id, User.updated_at).filter(User.updated_at > window))
+            companies = dict(db.session.query(Company.id, Company.updated_at).filter(Company.updated_at > window))
+            db.session.rollback()
+
+            RevokedToken.query.filter(RevokedToken.expires_at <= datetime.utcnow()).delete(synchronize_session=False)
+            db.session.commit()
+
+        for row in revoked:
+            self._add_revoked(row.jti, row.expires_at)
+        self._revoked_since = now
+
+        with self._lock:
+            for user_id, (versions, data, _) in list(self._users.items()):
+                if users.get(user_id, versions[0]) != versions[0] or \
+                        companies.get(data['company_id'], versions[1]) != versions[1]:
+                    del self._users[user_id]
+        self._users_since = max([since, *users.values(), *companies.values()])
+        self._prune()
+
+    def _add_revoked(self, jti, expires_at):
+        key = _jti_key(jti)
+        with self._lock:
+            if key not in self._revoked:
+                self._revoked.add(key)
+                heapq.heappush(self._expirations, (expires_at, key))
+
+    def _prune(self):
+        """Toglie dal set i token ormai scaduti, che verrebbero comunque rifiutati"""
+        now = datetime.utcnow()
+        with self._lock:
+            while self._expirations and self._expirations[0][0] <= now:
+                _, key = heapq.heappop(self._expirations)
+                self._revoked.discard(key)
+
+    def is_revoked(self, jti):
+        return _jti_key(jti) in self._revoked
+
+    def revoke(self, jti, expires_at, user_id=None):
+        """Revoca il token nel processo corrente e lo salva per gli altri; il commit è a carico del chiamante"""
+        db.session.add(RevokedToken(jti=jti, user_id=user_id, expires_at=expires_at))
+        self._add_revoked(jti, expires_at)
+
+    def get_user(self, user_id):
+        """to_dict() dell'utente, dalla cache se ancora valido; None se l'utente non esiste"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._users.get(user_id)
+            if entry is not None and entry[2] >= now:
+                self._users.move_to_end(user_id)
+                self.hits += 1
+                return entry[1]
+        self.misses += 1
+
+        user = User.query.options(joinedload(User.company)).get(user_id)
+        if user is None:
+            return None
+        data = user.to_dict()
+        with self._lock:
+            versions = (user.updated_at, user.company.updated_at if user.company else None)
+            self._users[user_id] = (versions, data, now + self.app.config['IDENTITY_CACHE_TTL'])
+            self._users.move_to_end(user_id)
+            while len(self._users) > self.app.config['IDENTITY_CACHE_MAX_ENTRIES']:
+                self._users.popitem(last=False)
+        return data
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self._users.pop(user_id, None)
+
+    def stats(self):
+        return {
+            'users': len(self._users),
+            'revoked_tokens': len(self._revoked),
+            'hits': self.hits,
+            'misses': self.misses
+        }
+
+identity_cache = IdentityCache()
@@ -0,0 +1,52 @@
+from datetime import date, time
+from decimal import Decimal
+from enum import Enum
+import orjson
+from flask.json.provider import JSONProvider
+
+def _default(value):
+    """Tipi non gestiti nativamente da orjson"""
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, Enum):
+        return value.value
+    if isinstance(value, (date, time)):
+        # Sottoclassi come pandas.Timestamp
+        return value.isoformat()
+    if isinstance(value, (set, frozenset)):
+        return list(value)
+    if hasattr(value, '__html__'):
+        return str(value.__html__())
+    raise TypeError(f'Oggetto di tipo {type(value).__name__} non serializzabile in JSON')
+
+class OrjsonProvider(JSONProvider):
+    """JSON provider basato su orjson.
+
+    datetime, date, UUID, dataclass e tipi numpy sono serializzati da orjson
+    senza passare da Python; Decimal diventa un numero e Enum il suo valore.
+    Le chiavi sono ordinate e possono essere non stringhe, come con il
+    provider predefinito di Flask.
+    """
+    mimetype = 'application/json'
+    sort_keys = True
+    compact = None
+
+    def _options(self, indent=False):
+        option = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+        if self.sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        if indent:
+            option |= orjson.OPT_INDENT_2
+        return option
+
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj, default=_default, option=self._options(kwargs.get('indent'))).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        indent = (self.compact is None and self._app.debug) or self.compact is False
+        body = orjson.dumps(obj, default=_default, option=self._options(indent) | orjson.OPT_APPEND_NEWLINE)
+        return self._app.response_class(body, mimetype=self.mimetype)
@@ -0,0 +1,139 @@
+import functools
+import os
+import threading
+import time
+from contextlib import contextmanager
+from flask import request
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Histogram, generate_latest
+from prometheus_client import multiprocess
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+REQUEST_DURATION = Histogram(
+    'http_request_duration_seconds', 'Durata delle richieste HTTP, streaming compreso',
+    ['method', 'blueprint', 'endpoint', 'status']
+)
+REQUEST_STATEMENTS = Histogram(
+    'http_request_sql_statements', 'Statement SQL eseguiti per richiesta',
+    ['blueprint', 'endpoint'], buckets=(0, 1, 2, 3, 5, 10, 20, 50, 100, 250, 1000)
+)
+REQUEST_DB_TIME = Histogram(
+    'http_request_db_seconds', 'Tempo passato nel database per richiesta',
+    ['blueprint', 'endpoint']
+)
+STATEMENTS = Counter('sql_statements_total', 'Statement SQL eseguiti', ['source'])
+STATEMENT_TIME = Counter('sql_statement_seconds_total', 'Tempo totale degli statement SQL', ['source'])
+ANALYTICS_STAGES = Histogram(
+    'analytics_stage_seconds', 'Durata delle fasi dei metodi di SalesAnalytics',
+    ['method', 'stage']
+)
+
+# Stato della richiesta o del metodo analytics in corso nel thread
+_local = threading.local()
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    # Sul contesto dello statement: se l'esecuzione fallisce non resta nulla sulla connessione
+    if context is not None:
+        context._metrics_start = time.perf_counter()
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    start = getattr(context, '_metrics_start', None)
+    if start is None:
+        return
+    elapsed = time.perf_counter() - start
+    if getattr(_local, 'request_start', None) is not None:
+        _local.statements += 1
+        _local.db_time += elapsed
+        source = 'request'
+    else:
+        # Thread in background: email, job dei report, sincronizzazione delle identità
+        source = 'background'
+    STATEMENTS.labels(source).inc()
+    STATEMENT_TIME.labels(source).inc(elapsed)
+
+@contextmanager
+def stage(name):
+    """Misura una fase (query, dataframe) del metodo analytics in corso nel thread"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        stages = getattr(_local, 'stages', None)
+        if stages is not None:
+            stages[name] = stages.get(name, 0.0) + time.perf_counter() - start
+
+def track_stages(func):
+    """Registra query, dataframe e il resto (transform) di un metodo di SalesAnalytics"""
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        outer = getattr(_local, 'stages', None)
+        _local.stages = {}
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            total = time.perf_counter() - start
+            stages, _local.stages = _local.stages, outer
+            stages['transform'] = max(total - sum(stages.values()), 0.0)
+            for name, elapsed in stages.items():
+                ANALYTICS_STAGES.labels(func.__name__, name).observe(elapsed)
+    return wrapper
+
+class RequestMetrics:
+    """Latenza, numero di statement SQL e tempo nel database per endpoint.
+
+    I contatori della richiesta sono in un threading.local aggiornato dagli
+    eventi before/after_cursor_execute; la richiesta è registrata in
+    teardown_request, quindi le risposte in streaming comprendono anche le
+    query eseguite durante la generazione. Sotto gunicorn, con
+    PROMETHEUS_MULTIPROC_DIR, /metrics somma i valori di tutti i worker.
+    """
+
+    _listening = False
+
+    def init_app(self, app):
+        app.extensions['metrics'] = self
+        if not app.config['METRICS_ENABLED']:
+            return
+
+        if not RequestMetrics._listening:
+            event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+            event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+            RequestMetrics._listening = True
+
+        @app.before_request
+        def start_request_metrics():
+            _local.request_start = time.perf_counter()
+            _local.statements = 0
+            _local.db_time = 0.0
+            _local.status = 500
+
+        @app.after_request
+        def status_request_metrics(response):
+            _local.status = response.status_code
+            return response
+
+        @app.teardown_request
+        def record_request_metrics(exc):
+            start = getattr(_local, 'request_start', None)
+            if start is None:
+                return
+            _local.request_start = None
+            blueprint = request.blueprint or ''
+            endpoint = request.endpoint or 'none'
+            REQUEST_DURATION.labels(request.method, blueprint, endpoint, str(_local.status)).observe(
+                time.perf_counter() - start
+            )
+            REQUEST_STATEMENTS.labels(blueprint, endpoint).observe(_local.statements)
+            REQUEST_DB_TIME.labels(blueprint, endpoint).observe(_local.db_time)
+
+    def generate(self):
+        """Metriche in formato testo Prometheus e relativo content type"""
+        if os.getenv('PROMETHEUS_MULTIPROC_DIR'):
+            registry = CollectorRegistry()
+            multiprocess.MultiProcessCollector(registry)
+        else:
+            registry = REGISTRY
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+
+request_metrics = RequestMetrics()
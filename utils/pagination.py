@@ -0,0 +1,87 @@
+import base64
+import json
+from datetime import datetime
+from flask import request
+from sqlalchemy import DateTime, and_, or_
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+def encode_cursor(values):
+    """Codifica i valori della chiave di ordinamento in un cursore opaco"""
+    payload = [value.isoformat() if isinstance(value, datetime) else value for value in values]
+    raw = json.dumps(payload, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+def decode_cursor(cursor, columns):
+    """Decodifica un cursore nei valori della chiave di ordinamento"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        values = json.loads(raw)
+        if not isinstance(values, list) or len(values) != len(columns):
+            raise ValueError
+        return [
+            datetime.fromisoformat(value) if isinstance(column.type, DateTime) else value
+            for column, value in zip(columns, values)
+        ]
+    except (ValueError, TypeError):
+        raise ValueError('Cursore non valido')
+
+def _keyset_filter(columns, values, descending):
+    """Costruisce il predicato (c1, c2, ...) < / > (v1, v2, ...) in forma espansa"""
+    clauses = []
+    for i, column in enumerate(columns):
+        equal_prefix = [c == v for c, v in zip(columns[:i], values[:i])]
+        boundary = column < values[i] if descending else column > values[i]
+        clauses.append(and_(*equal_prefix, boundary))
+    return or_(*clauses)
+
+def _page_args():
+    limit = request.args.get('limit', default=DEFAULT_PAGE_SIZE, type=int)
+    if limit < 1 or limit > MAX_PAGE_SIZE:
+        raise ValueError(f'Il parametro limit deve essere compreso tra 1 e {MAX_PAGE_SIZE}')
+    cursor = request.args.get('cursor')
+    include_total = request.args.get('include_total', 'false').lower() == 'true'
+    return limit, cursor, include_total
+
+def _page_query(query, columns, descending, limit, cursor):
+    """Righe della pagina più una, per sapere se ne esiste un'altra"""
+    if cursor:
+        query = query.filter(_keyset_filter(columns, decode_cursor(cursor, columns), descending))
+
+    order = [column.desc() if descending else column.asc() for column in columns]
+    return query.order_by(*order).limit(limit + 1)
+
+def page_versions(query, columns, version, descending=False):
+    """Chiavi e versione delle righe della pagina che paginate() restituirebbe.
+
+    Legge solo le colonne di ordinamento e l'espressione version, più il
+    totale se richiesto con include_total=true: basta per capire se la
+    pagina è cambiata senza caricare né serializzare le righe.
+    """
+    limit, cursor, include_total = _page_args()
+    rows = _page_query(query.with_entities(*columns, version), columns, descending, limit, cursor).all()
+    total = query.order_by(None).count() if include_total else None
+    return [tuple(row) for row in rows], total
+
+def paginate(query, columns, descending=False, total=None):
+    """Paginazione keyset sulla query filtrata.
+
+    Restituisce gli oggetti della pagina e i metadati (limit, next_cursor e,
+    se richiesto con include_total=true, total). Il costo dipende dalla
+    dimensione della pagina e non dalla dimensione della tabella. total
+    evita di ricontare se il chiamante ha già il totale.
+    """
+    limit, cursor, include_total = _page_args()
+
+    meta = {'limit': limit}
+    if include_total:
+        meta['total'] = query.order_by(None).count() if total is None else total
+
+    rows = _page_query(query, columns, descending, limit, cursor).all()
+
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    meta['next_cursor'] = encode_cursor([getattr(rows[-1], column.key) for column in columns]) if has_more else None
+
+    return rows, meta
@@ -0,0 +1,97 @@
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, TimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from http import HTTPStatus
+from flask import jsonify
+from werkzeug.security import check_password_hash, generate_password_hash
+
+class PasswordHasherBusy(Exception):
+    """Troppe operazioni sulle password già in coda"""
+
+class PasswordHasher:
+    """Hash e verifica delle password in un pool di processi limitato.
+
+    Il calcolo (scrypt o PBKDF2, decine di millisecondi di CPU) non gira
+    nel thread della richiesta, quindi un picco di login non blocca le
+    altre richieste del worker. Al massimo PASSWORD_HASH_QUEUE operazioni
+    per processo sono in corso o in attesa; oltre si solleva subito
+    PasswordHasherBusy, che diventa una risposta 503. Con
+    PASSWORD_HASH_WORKERS=0, o fuori dall'applicazione, il calcolo resta
+    nel thread chiamante. I processi del pool sono avviati con spawn e
+    reimportano il modulo principale: gli script che usano il modello User
+    devono proteggere il codice con if __name__ == '__main__'.
+    """
+
+    def __init__(self):
+        self.workers = 0
+        self.timeout = None
+        self._slots = None
+        self._executor = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self.retry_after = 1
+
+    def init_app(self, app):
+        self.workers = app.config['PASSWORD_HASH_WORKERS']
+        self.timeout = app.config['PASSWORD_HASH_TIMEOUT']
+        self._slots = threading.BoundedSemaphore(app.config['PASSWORD_HASH_QUEUE'])
+        self.retry_after = app.config['PASSWORD_HASH_RETRY_AFTER']
+        app.extensions['password_hasher'] = self
+
+        @app.errorhandler(PasswordHasherBusy)
+        def password_hasher_busy(e):
+            response = jsonify({'error': 'Servizio sovraccarico, riprovare tra poco'})
+            response.headers['Retry-After'] = str(self.retry_after)
+            return response, HTTPStatus.SERVICE_UNAVAILABLE
+
+    def _get_executor(self):
+        # Il pool è creato nel processo che lo usa: i worker gunicorn non ereditano quello del master
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    self._executor = ProcessPoolExecutor(
+                        max_workers=self.workers,
+                        mp_context=multiprocessing.get_context('spawn')
+                    )
+                    self._pid = os.getpid()
+        return self._executor
+
+    def _reset(self, executor):
+        with self._lock:
+            if self._executor is executor:
+                self._pid = None
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    def _run(self, func, *args):
+        if not self.workers:
+            return func(*args)
+        if not self._slots.acquire(blocking=False):
+            raise PasswordHasherBusy()
+        executor = self._get_executor()
+        try:
+            future = executor.submit(func, *args)
+        except BaseException:
+            self._slots.release()
+            raise
+        # Il posto si libera solo quando il lavoro è finito o annullato,
+        # non quando il chiamante smette di attendere
+        future.add_done_callback(lambda _: self._slots.release())
+        try:
+            return future.result(timeout=self.timeout)
+        except TimeoutError:
+            future.cancel()
+            raise PasswordHasherBusy()
+        except BrokenProcessPool:
+            # Un processo del pool è terminato: se ne crea uno nuovo alla prossima chiamata
+            self._reset(executor)
+            raise
+
+    def hash(self, password):
+        return self._run(generate_password_hash, password)
+
+    def check(self, password_hash, password):
+        return self._run(check_password_hash, password_hash, password)
+
+password_hasher = PasswordHasher()
@@ -0,0 +1,296 @@
+import hashlib
+import json
+import os
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import defer
+from analytics.sales_analytics import SalesAnalytics
+from extensions import db
+from models.report_job import ReportJob, ReportJobStatus
+
+class ReportQueueFull(Exception):
+    """Troppi job in coda"""
+
+def _date(value):
+    datetime.strptime(value, '%Y-%m-%d')
+    return value
+
+def _limit(value):
+    value = int(value)
+    if value < 1:
+        raise ValueError('limit deve essere positivo')
+    return value
+
+def _period(value):
+    if value not in ('weekly', 'monthly'):
+        raise ValueError('Periodo non valido. Usare "weekly" o "monthly"')
+    return value
+
+# Nome del report: metodo di SalesAnalytics e parametri accettati
+REPORTS = {
+    'sales_by_company': ('get_sales_by_company', {'start_date': _date, 'end_date': _date}),
+    'inventory': ('get_inventory_analysis', {}),
+    'profit': ('get_profit_analysis', {'start_date': _date, 'end_date': _date}),
+    'sales_trend': ('get_sales_trend', {'start_date': _date, 'end_date': _date}),
+    'top_items': ('get_top_items_analysis', {'start_date': _date, 'end_date': _date, 'limit': _limit}),
+    'dashboard_metrics': ('get_dashboard_metrics', {}),
+    'hourly_profit_sales': ('get_hourly_profit_sales', {}),
+    'sales_by_brand': ('get_sales_by_brand', {}),
+    'brand_popularity': ('get_brand_popularity', {}),
+    'brand_average_sales': ('get_brand_average_sales', {'period': _period})
+}
+
+def parse_report(data):
+    """Report e parametri validati del corpo di POST /analytics/jobs; solleva ValueError"""
+    report = data.get('report')
+    if report not in REPORTS:
+        raise ValueError(f'Report non valido. Disponibili: {", ".join(REPORTS)}')
+    params = data.get('params') or {}
+    if not isinstance(params, dict):
+        raise ValueError('params deve essere un oggetto')
+    allowed = REPORTS[report][1]
+    unknown = [name for name in params if name not in allowed]
+    if unknown:
+        raise ValueError(f'Parametri non validi: {", ".join(unknown)}. Disponibili: {", ".join(allowed) or "nessuno"}')
+    try:
+        params = {name: allowed[name](value) for name, value in params.items() if value is not None}
+    except (TypeError, ValueError) as e:
+        raise ValueError(f'Parametri non validi: {e}')
+    return report, params
+
+def _call(report, params):
+    method, _ = REPORTS[report]
+    kwargs = {
+        name: datetime.strptime(value, '%Y-%m-%d') if name.endswith('_date') else value
+        for name, value in params.items()
+    }
+    return getattr(SalesAnalytics, method)(**kwargs)
+
+class ReportJobRunner:
+    """Pool limitato di thread che esegue i report di SalesAnalytics in background.
+
+    I job sono salvati nella tabella report_jobs, quindi qualsiasi worker
+    può prenderli in carico (SELECT ... FOR UPDATE SKIP LOCKED) e
+    risponderne lo stato. Un job uguale, per report e parametri, già in
+    coda o in esecuzione viene restituito invece di crearne un altro. Il
+    risultato è salvato come JSON e cancellato dopo REPORT_JOB_RESULT_TTL
+    secondi. Un thread per processo aggiorna ogni REPORT_JOB_HEARTBEAT_SECONDS
+    heartbeat_at dei job che il processo sta eseguendo e, con la stessa
+    cadenza, cancella i job scaduti e segna come falliti quelli il cui
+    heartbeat è più vecchio di REPORT_JOB_LEASE_SECONDS, perché il processo
+    che li eseguiva è terminato.
+    """
+
+    def __init__(self):
+        self.app = None
+        self._pid = None
+        self._threads = []
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._running = set()
+        self.completed = 0
+        self.failed = 0
+
+    def init_app(self, app):
+        self.app = app
+        app.extensions['report_jobs'] = self
+
+        @app.before_request
+        def start_report_jobs():
+            self.start()
+
+    def start(self):
+        """Avvia i thread nel processo corrente; dopo un fork vengono riavviati"""
+        if not self.app.config['REPORT_JOB_WORKERS'] or self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._threads = [
+                threading.Thread(target=self._run, name=f'report-jobs-{i}', daemon=True)
+                for i in range(self.app.config['REPORT_JOB_WORKERS'])
+            ]
+            self._threads.append(threading.Thread(target=self._maintain, name='report-jobs-heartbeat', daemon=True))
+            self._running = set()
+            for thread in self._threads:
+                thread.start()
+            self._pid = os.getpid()
+
+    def _run(self):
+        while True:
+            try:
+                with self.app.app_context():
+                    processed = self.process_next()
+            except Exception as e:
+                self.app.logger.exception('Errore nei job dei report: %s', e)
+                processed = False
+            if not processed:
+                self._wakeup.wait(self.app.config['REPORT_JOB_POLL_INTERVAL'])
+                self._wakeup.clear()
+
+    def _maintain(self):
+        while True:
+            time.sleep(self.app.config['REPORT_JOB_HEARTBEAT_SECONDS'])
+            try:
+                with self.app.app_context():
+                    self.heartbeat()
+                    self.expire()
+            except Exception as e:
+                self.app.logger.exception('Errore nella manutenzione dei job dei report: %s', e)
+
+    def heartbeat(self):
+        """Rinnova heartbeat_at dei job in esecuzione in questo processo"""
+        running = list(self._running)
+        if not running:
+            return
+        ReportJob.query.filter(
+            ReportJob.id.in_(running),
+            ReportJob.status == ReportJobStatus.RUNNING
+        ).update({'heartbeat_at': datetime.utcnow()}, synchronize_session=False)
+        db.session.commit()
+
+    def _interrupt_stale(self, *criteria):
+        """Segna come falliti i job in esecuzione senza heartbeat recente"""
+        now = datetime.utcnow()
+        ReportJob.query.filter(
+            ReportJob.status == ReportJobStatus.RUNNING,
+            ReportJob.heartbeat_at < now - timedelta(seconds=current_app.config['REPORT_JOB_LEASE_SECONDS']),
+            *criteria
+        ).update({
+            'status': ReportJobStatus.FAILED,
+            'stage': 'done',
+            'error': 'Job interrotto',
+            'finished_at': now,
+            'expires_at': now + timedelta(seconds=current_app.config['REPORT_JOB_RESULT_TTL'])
+        }, synchronize_session=False)
+
+    def submit(self, report, params):
+        """Job per report e params, creato se non ce n'è uno uguale in corso; restituisce (job, creato)"""
+        key = hashlib.sha256(json.dumps([report, params], sort_keys=True).encode()).hexdigest()
+        # Un job uguale rimasto orfano non deve assorbire le nuove richieste
+        self._interrupt_stale(ReportJob.dedupe_key == key)
+        job = self._in_flight(key)
+        if job is not None:
+            return job, False
+
+        pending = db.session.query(func.count(ReportJob.id)).filter(
+            ReportJob.status == ReportJobStatus.PENDING
+        ).scalar()
+        if pending >= current_app.config['REPORT_JOB_MAX_PENDING']:
+            db.session.rollback()
+            raise ReportQueueFull()
+
+        job = ReportJob(id=uuid.uuid4().hex, report=report, params=params, dedupe_key=key)
+        db.session.add(job)
+        try:
+            db.session.commit()
+        except IntegrityError:
+            # Un'altra richiesta ha creato lo stesso job nel frattempo
+            db.session.rollback()
+            job = self._in_flight(key)
+            if job is None:
+                raise
+            return job, False
+        self._wakeup.set()
+        return job, True
+
+    def _in_flight(self, key):
+        return ReportJob.query.options(defer(ReportJob.result)).filter(
+            ReportJob.dedupe_key == key,
+            ReportJob.status.in_([ReportJobStatus.PENDING, ReportJobStatus.RUNNING])
+        ).first()
+
+    def get(self, job_id, with_result=False):
+        """Job non scaduto, None se non esiste"""
+        query = ReportJob.query if with_result else ReportJob.query.options(defer(ReportJob.result))
+        return query.filter(
+            ReportJob.id == job_id,
+            db.or_(ReportJob.expires_at.is_(None), ReportJob.expires_at > datetime.utcnow())
+        ).first()
+
+    def describe(self, job):
+        """to_dict() del job con posizione in coda e secondi trascorsi"""
+        data = job.to_dict()
+        data['position'] = None
+        if job.status == ReportJobStatus.PENDING:
+            data['position'] = db.session.query(func.count(ReportJob.id)).filter(
+                ReportJob.status == ReportJobStatus.PENDING,
+                ReportJob.created_at < job.created_at
+            ).scalar() + 1
+        started = job.started_at
+        data['elapsed_seconds'] = round(((job.finished_at or datetime.utcnow()) - started).total_seconds(), 1) if started else None
+        return data
+
+    def process_next(self):
+        """Esegue il job in coda più vecchio; False se la coda è vuota"""
+        job = ReportJob.query.options(defer(ReportJob.result)).filter(
+            ReportJob.status == ReportJobStatus.PENDING
+        ).order_by(ReportJob.created_at).limit(1).with_for_update(skip_locked=True).first()
+        if job is None:
+            db.session.rollback()
+            return False
+
+        job_id, report, params = job.id, job.report, job.params
+        job.status = ReportJobStatus.RUNNING
+        job.stage = 'computing'
+        job.started_at = job.heartbeat_at = datetime.utcnow()
+        db.session.commit()
+        self._running.add(job_id)
+
+        ttl = timedelta(seconds=current_app.config['REPORT_JOB_RESULT_TTL'])
+        try:
+            result = _call(report, params)
+            db.session.rollback()
+            self._finish(job_id, stage='storing')
+            body = current_app.json.dumps(result)
+            values = {'status': ReportJobStatus.SUCCEEDED, 'result': body}
+            self.completed += 1
+        except Exception as e:
+            db.session.rollback()
+            current_app.logger.exception('Report %s fallito: %s', job_id, e)
+            values = {'status': ReportJobStatus.FAILED, 'error': str(e)[:1000]}
+            self.failed += 1
+        now = datetime.utcnow()
+        try:
+            self._finish(job_id, stage='done', finished_at=now, expires_at=now + ttl, **values)
+        finally:
+            self._running.discard(job_id)
+        return True
+
+    def _finish(self, job_id, **values):
+        # Solo se nel frattempo expire() non lo ha già segnato come interrotto
+        ReportJob.query.filter(
+            ReportJob.id == job_id,
+            ReportJob.status == ReportJobStatus.RUNNING
+        ).update(values, synchronize_session=False)
+        db.session.commit()
+
+    def expire(self):
+        """Cancella i job scaduti e chiude quelli rimasti senza heartbeat"""
+        ReportJob.query.filter(ReportJob.expires_at <= datetime.utcnow()).delete(synchronize_session=False)
+        self._interrupt_stale()
+        db.session.commit()
+
+    def stats(self):
+        counts = dict(
+            db.session.query(ReportJob.status, func.count(ReportJob.id)).group_by(ReportJob.status).all()
+        )
+        return {
+            'pending': counts.get(ReportJobStatus.PENDING, 0),
+            'running': counts.get(ReportJobStatus.RUNNING, 0),
+            'succeeded': counts.get(ReportJobStatus.SUCCEEDED, 0),
+            'failed': counts.get(ReportJobStatus.FAILED, 0),
+            'worker': {
+                'pid': os.getpid(),
+                'threads': sum(thread.is_alive() for thread in self._threads) if self._pid == os.getpid() else 0,
+                'completed': self.completed,
+                'failed': self.failed
+            }
+        }
+
+report_jobs = ReportJobRunner()
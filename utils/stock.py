@@ -0,0 +1,55 @@
+from sqlalchemy import Integer, column, update, values
+from extensions import db
+from models.item import Item
+
+def lock_items(item_ids, for_update=True):
+    """Carica gli item richiesti con un'unica query.
+
+    Con for_update le righe sono bloccate (SELECT ... FOR UPDATE) in ordine
+    di id, così transazioni concorrenti sugli stessi item non vanno in
+    deadlock.
+    """
+    query = Item.query.filter(Item.id.in_(set(item_ids))).order_by(Item.id)
+    if for_update:
+        query = query.with_for_update()
+    return {item.id: item for item in query.all()}
+
+def quantities_by_item(lines):
+    """Somma le quantità per item; lines è un iterabile di (item_id, quantity)"""
+    quantities = {}
+    for item_id, quantity in lines:
+        quantities[item_id] = quantities.get(item_id, 0) + quantity
+    return quantities
+
+def _apply(quantities, sign):
+    if not quantities:
+        return set()
+
+    items = Item.__table__
+    changes = values(column('id', Integer), column('quantity', Integer), name='changes').data(
+        sorted(quantities.items())
+    )
+    stmt = update(items).where(items.c.id == changes.c.id)
+    if sign < 0:
+        stmt = stmt.where(items.c.stock >= changes.c.quantity)
+    stmt = stmt.values(stock=items.c.stock + sign * changes.c.quantity).returning(items.c.id)
+
+    updated = set(db.session.execute(stmt).scalars())
+    for item_id in updated:
+        item = db.session.identity_map.get(db.session.identity_key(Item, item_id))
+        if item is not None:
+            db.session.expire(item, ['stock'])
+    return updated
+
+def reserve_stock(quantities):
+    """Scala lo stock con un solo UPDATE ... WHERE stock >= quantità.
+
+    Restituisce gli id degli item senza disponibilità sufficiente: se non è
+    vuoto il chiamante deve fare rollback, perché gli altri item sono già
+    stati scalati.
+    """
+    return set(quantities) - _apply(quantities, -1)
+
+def release_stock(quantities):
+    """Restituisce a magazzino le quantità di una vendita annullata"""
+    _apply(quantities, 1)
@@ -0,0 +1,36 @@
+from flask import Response, current_app, request, stream_with_context
+
+STREAM_BATCH_SIZE = 1000
+
+def wants_stream():
+    """True se la richiesta chiede la risposta in streaming con stream=true"""
+    return request.args.get('stream', 'false').lower() == 'true'
+
+def stream_json(query, serialize, batch_size=STREAM_BATCH_SIZE):
+    """Risposta chunked {"data": [...]} con tutte le righe della query.
+
+    La query è letta con un cursore lato server (yield_per attiva
+    stream_results) a blocchi di batch_size righe, e ogni blocco è
+    serializzato e inviato prima di leggere il successivo: la memoria
+    usata non dipende dal numero di righe.
+    """
+    dumps = current_app.json.dumps
+
+    def generate():
+        yield '{"data":['
+        separator = ''
+        batch = []
+        for row in query.yield_per(batch_size):
+            batch.append(dumps(serialize(row)))
+            if len(batch) == batch_size:
+                yield separator + ','.join(batch)
+                separator = ','
+                batch = []
+        if batch:
+            yield separator + ','.join(batch)
+        yield ']}'
+
+    response = Response(stream_with_context(generate()), mimetype='application/json')
+    # Evita che un reverse proxy accumuli tutta la risposta prima di inoltrarla
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response